@@ -11,20 +11,25 @@ st.set_page_config(**PAGE_CONFIG)
 # ── Backend Mock/Imports ───────────────────────────────────────────────────
 try:
     from llm_client import check_server_health
-    from rag_engine import build_rag_index
-    from data_engine import run_auto_insights, answer_question
+    from rag_engine import build_rag_index, get_profile
+    from data_engine import run_auto_insights, stream_answer
+    from dataset_store import load_dataset
 except ImportError:
+    def load_dataset(source, progress=None): return pd.read_csv(source), None
     def check_server_health(): return "online"
-    def build_rag_index(df): pass
-    def run_auto_insights(df):
+    def build_rag_index(df): return None
+    def get_profile(index_id): return None
+    def run_auto_insights(df, index_id=None):
         return [{"question": "Dataset Preview", "answer": "Data loaded and indexed successfully."}]
-    def answer_question(df, question, history):
+    def answer_question(df, question, history, index_id=None):
         return {
             "answer": "Analysis complete. Here are the key findings from your dataset.",
             "code": "df.describe()",
             "explanation": "Summary statistics computed.",
             "chart": None,
         }
+    def stream_answer(df, question, history, index_id=None):
+        yield {"stage": "done", "answer": answer_question(df, question, history, index_id)}
 
 # ── Session Init ───────────────────────────────────────────────────────────
 def _init():
@@ -32,11 +37,59 @@ def _init():
         if k not in st.session_state:
             st.session_state[k] = v
 
+# ── Chat bubbles ───────────────────────────────────────────────────────────
+def _user_bubble(content: str) -> str:
+    content = str(content).replace("<", "&lt;").replace(">", "&gt;")
+    return f"""
+        <div class="msg-u">
+            <div class="bubble-u">{content}</div>
+        </div>
+    """
+
+
+def _assistant_bubble(answer: str) -> str:
+    answer = str(answer).replace("<", "&lt;").replace(">", "&gt;")
+    return f"""
+        <div class="msg-a">
+            <div class="ai-ava">
+                <svg xmlns="http://www.w3.org/2000/svg" width="13" height="13"
+                     viewBox="0 0 24 24" fill="none" stroke="currentColor"
+                     stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                  <polygon points="13 2 3 14 12 14 11 22 21 10 12 10 13 2"/>
+                </svg>
+            </div>
+            <div class="bubble-a">{answer}</div>
+        </div>
+    """
+
+
 # ── Question handler ───────────────────────────────────────────────────────
 def _handle_question(df, question: str):
     st.session_state.chat_history.append({"role": "user", "content": question})
     st.session_state.query_history.append(question)
-    result = answer_question(df, question, list(st.session_state.chat_history))
+    st.markdown(_user_bubble(question), unsafe_allow_html=True)
+
+    # Render each stage as soon as it is ready: result, chart, then the
+    # explanation streamed token by token
+    bubble = st.empty()
+    chart_slot = st.empty()
+    bubble.markdown(_assistant_bubble("Analyzing…"), unsafe_allow_html=True)
+    result, streamed = {}, ""
+    for event in stream_answer(df, question, list(st.session_state.chat_history),
+                               index_id=st.session_state.rag_index_id):
+        stage = event["stage"]
+        if stage == "result":
+            bubble.markdown(_assistant_bubble(f"Result: {event['raw_result']}"),
+                            unsafe_allow_html=True)
+        elif stage == "chart" and event["chart"] is not None:
+            chart_slot.plotly_chart(event["chart"], width="stretch",
+                                    config={"displayModeBar": False})
+        elif stage == "token":
+            streamed += event["text"]
+            bubble.markdown(_assistant_bubble(streamed), unsafe_allow_html=True)
+        elif stage == "done":
+            result = event["answer"]
+
     st.session_state.chat_history.append({
         "role": "assistant",
         "answer":      result.get("answer"),
@@ -93,13 +146,20 @@ def render_left(df):
     if uploaded:
         new_size = round(uploaded.size / 1024, 2)
         if st.session_state.file_size_kb != new_size:
-            df_new = pd.read_csv(uploaded)
+            bar = st.progress(0.0, text="Reading CSV…")
+            df_new, _ = load_dataset(
+                uploaded,
+                progress=lambda done, n: bar.progress(done, text=f"Reading CSV… {n:,} rows"),
+            )
+            bar.empty()
             st.session_state.update({
                 "df": df_new, "file_size_kb": new_size, "rag_indexed": False,
+                "rag_index_id": None,
                 "chat_history": [], "query_history": [], "current_chart": None
             })
-            build_rag_index(df_new)
-            st.session_state.auto_insights = run_auto_insights(df_new)
+            index_id = build_rag_index(df_new)
+            st.session_state.rag_index_id = index_id
+            st.session_state.auto_insights = run_auto_insights(df_new, index_id)
             st.session_state.rag_indexed = True
             st.rerun()
 
@@ -120,7 +180,11 @@ def render_left(df):
     # ── Metrics 2×2 grid (pure HTML) ──────────────────────────────────────
     rows  = f"{len(df):,}"       if df is not None else "—"
     cols  = str(len(df.columns)) if df is not None else "—"
-    nulls = str(df.isnull().sum().sum()) if df is not None else "—"
+    profile = get_profile(st.session_state.rag_index_id) if df is not None else None
+    if profile is not None:
+        nulls = str(profile.nulls)   # Counted while indexing — no rescan
+    else:
+        nulls = str(df.isnull().sum().sum()) if df is not None else "—"
     size_kb = st.session_state.file_size_kb if st.session_state.file_size_kb else "—"
 
     st.markdown(f"""
@@ -295,28 +359,12 @@ def render_center(df):
         """, unsafe_allow_html=True)
     else:
         for msg in st.session_state.chat_history:
-            role = msg["role"]
-            if role == "user":
-                content = str(msg.get("content", "")).replace("<", "&lt;").replace(">", "&gt;")
-                st.markdown(f"""
-                    <div class="msg-u">
-                        <div class="bubble-u">{content}</div>
-                    </div>
-                """, unsafe_allow_html=True)
+            if msg["role"] == "user":
+                st.markdown(_user_bubble(msg.get("content", "")),
+                            unsafe_allow_html=True)
             else:
-                answer = str(msg.get("answer") or "").replace("<", "&lt;").replace(">", "&gt;")
-                st.markdown(f"""
-                    <div class="msg-a">
-                        <div class="ai-ava">
-                            <svg xmlns="http://www.w3.org/2000/svg" width="13" height="13"
-                                 viewBox="0 0 24 24" fill="none" stroke="currentColor"
-                                 stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                              <polygon points="13 2 3 14 12 14 11 22 21 10 12 10 13 2"/>
-                            </svg>
-                        </div>
-                        <div class="bubble-a">{answer}</div>
-                    </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_assistant_bubble(msg.get("answer") or ""),
+                            unsafe_allow_html=True)
 
     # ── Pinned input (native Streamlit widget) ────────────────────────────
     query = st.chat_input(
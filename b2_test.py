@@ -12,11 +12,11 @@ sid = build_rag_index(df)
 print(f'Index built. Session ID: {sid}')
 
 print('\n=== RETRIEVAL TEST 1 ===')
-ctx = retrieve_context('what is the churn rate?')
+ctx = retrieve_context('what is the churn rate?', index_id=sid)
 print(ctx)
 
 print('\n=== RETRIEVAL TEST 2 ===')
-ctx2 = retrieve_context('which contract type has most customers?')
+ctx2 = retrieve_context('which contract type has most customers?', index_id=sid)
 print(ctx2)
 
 print('\nDONE — paste this output in group chat')
\ No newline at end of file
@@ -0,0 +1,84 @@
+# bm25.py — lexical scoring of RAG chunks (exact column names and values)
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+TITLE_WEIGHT = 3
+
+_WORD_RE = re.compile(r'[A-Za-z0-9]+')
+_CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words, with camelCase names also split into parts.
+
+    'TotalCharges' → ['totalcharges', 'total', 'charges'], so both the
+    exact column name and a spelled-out question match it.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        tokens.append(word.lower())
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts)
+    return tokens
+
+
+@dataclass
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents."""
+    postings: dict[str, list[tuple[int, int]]]   # term → [(doc, term freq)]
+    idf: dict[str, float]
+    lengths: np.ndarray
+    k1: float = 1.2
+    b: float = 0.75
+
+    @classmethod
+    def build(cls, docs: list[str], titles: list[str] | None = None,
+              title_weight: int = TITLE_WEIGHT) -> 'BM25Index':
+        """Index docs; a doc's title (e.g. its column name) counts
+        title_weight extra times, so the chunk *about* a column outranks
+        chunks that merely mention it."""
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = np.zeros(len(docs), dtype=np.float64)
+        titles = titles or [''] * len(docs)
+        for i, (doc, title) in enumerate(zip(docs, titles)):
+            counts = Counter(tokenize(doc))
+            for term in tokenize(title):
+                counts[term] += title_weight
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((i, tf))
+        n = len(docs)
+        idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+               for t, p in postings.items()}
+        return cls(postings, idf, lengths)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (0 = no shared term)."""
+        out = np.zeros(len(self.lengths), dtype=np.float64)
+        if not len(out):
+            return out
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.lengths.mean(), 1))
+        for term in set(tokenize(query)):
+            for doc, tf in self.postings.get(term, ()):
+                out[doc] += self.idf[term] * tf * (self.k1 + 1) / (tf + norm[doc])
+        return out
+
+
+def rrf(score_lists: list[np.ndarray], k: int = 60) -> np.ndarray:
+    """Reciprocal-rank fusion: sum of 1 / (k + rank) over each scoring.
+
+    Equal scores share a rank, so a scorer that can't tell documents
+    apart doesn't impose an arbitrary order; NaN means "not ranked".
+    """
+    fused = np.zeros(len(score_lists[0]), dtype=np.float64)
+    for scores in score_lists:
+        ranked = ~np.isnan(scores)
+        desc = -np.sort(scores[ranked])[::-1]
+        rank = np.searchsorted(desc, -scores[ranked], side='left') + 1
+        fused[ranked] += 1.0 / (k + rank)
+    return fused
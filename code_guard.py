@@ -0,0 +1,421 @@
+# code_guard.py — catch slow patterns in generated pandas code before it runs
+import ast
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from config import CODE_GUARD_MAX_SECONDS, EXEC_MEMORY_MB
+
+# Rough per-row costs in seconds, measured on pandas 3 (a laptop core);
+# only the order of magnitude matters
+_COST = {
+    "iterrows":   35e-6,   # Builds a Series per row
+    "itertuples": 1e-6,
+    "items":      0.3e-6,  # Iterating a column's values
+    "range":      0.1e-6,  # for i in range(len(df))
+    "columns":    20e-6,   # for name, s in df.items()
+    "apply":      8e-6,    # df.apply(f, axis=1)
+    "indexer":    25e-6,   # df.loc[i, c] / df.iloc[i] inside a loop
+    "scalar":     5e-6,    # df.at[i, c] / df.iat[i, j] inside a loop
+    "call":       20e-6,   # Fixed overhead of one pandas call
+    "scan":       5e-9,    # Per row, of a vectorized pass over the frame
+    "merge":      0.1e-6,  # Per output row of a merge
+}
+
+# Methods whose result has (at most) as many rows as their receiver
+_ROW_PRESERVING = {
+    "copy", "dropna", "fillna", "sort_values", "sort_index", "reset_index",
+    "set_index", "assign", "query", "astype", "rename", "drop", "where",
+    "mask", "abs", "round", "reindex", "drop_duplicates", "sample",
+}
+_ROW_ATTRS = {"index", "values", "T"}
+
+_VECTOR_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_VECTOR_CMP = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+@dataclass
+class Cost:
+    """Estimated run time and peak memory of a snippet on one dataframe."""
+    seconds: float = 0.0
+    bytes: int = 0
+    reasons: list[tuple[float, str]] = field(default_factory=list)
+
+    def add(self, seconds: float, reason: str, nbytes: int = 0) -> None:
+        self.seconds += seconds
+        self.bytes += nbytes
+        self.reasons.append((seconds, reason))
+
+    @property
+    def worst(self) -> str | None:
+        return max(self.reasons)[1] if self.reasons else None
+
+
+def _has_axis1(call: ast.Call) -> bool:
+    args = [kw.value for kw in call.keywords if kw.arg == "axis"]
+    if len(call.args) >= 2:   # df.apply(func, 1)
+        args.append(call.args[1])
+    return any(isinstance(a, ast.Constant) and a.value in (1, "columns")
+               for a in args)
+
+
+def _boxed(dtype) -> str | None:
+    """The wider dtype a row-wise apply really computes a column in.
+
+    apply hands the lambda Python ints and floats, so r['tenure'] * 30
+    can't overflow there; the same expression on an int8 column can.
+    None when the column's own dtype is already that wide.
+    """
+    if not isinstance(dtype, np.dtype):
+        return None
+    if dtype.kind == "b" or (dtype.kind in "iu" and dtype.itemsize < 8):
+        return "int64"
+    if dtype.kind == "f" and dtype.itemsize < 8:
+        return "float64"
+    return None
+
+
+# ── Rewriting ─────────────────────────────────────────────────────────────
+class _RowLambda(ast.NodeTransformer):
+    """Turn the body of `lambda r: ...` into the same expression over
+    whole columns of `frame`, or raise ValueError if it can't be."""
+
+    def __init__(self, row: str, frame: ast.expr, dtypes: dict):
+        self.row, self.frame, self.dtypes = row, frame, dtypes
+        self.reads = 0   # Row fields replaced by columns
+
+    def _column(self, name: str) -> ast.expr:
+        self.reads += 1
+        column = ast.Subscript(self.frame, ast.Constant(name), ast.Load())
+        wide = _boxed(self.dtypes.get(name))
+        if wide is None:
+            return column
+        return ast.Call(ast.Attribute(column, "astype", ast.Load()),
+                        [ast.Constant(wide)], [])
+
+    def visit_Subscript(self, node):
+        if (isinstance(node.value, ast.Name) and node.value.id == self.row
+                and isinstance(node.slice, ast.Constant)
+                and isinstance(node.slice.value, str)):
+            return self._column(node.slice.value)
+        raise ValueError("unsupported subscript")
+
+    def visit_Attribute(self, node):
+        if (isinstance(node.value, ast.Name) and node.value.id == self.row
+                and node.attr in self.dtypes):
+            return self._column(node.attr)
+        raise ValueError("unsupported attribute")
+
+    def visit_Name(self, node):
+        if node.id == self.row:
+            raise ValueError("row used as a whole")
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _VECTOR_OPS):
+            raise ValueError("unsupported operator")
+        return self.generic_visit(node)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, (ast.USub, ast.UAdd)):
+            raise ValueError("unsupported operator")
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        if len(node.ops) != 1 or not isinstance(node.ops[0], _VECTOR_CMP):
+            raise ValueError("unsupported comparison")
+        return self.generic_visit(node)
+
+    def visit_BoolOp(self, node):
+        # `a and b` only equals `a & b` when both sides are booleans
+        if not all(isinstance(v, ast.Compare) for v in node.values):
+            raise ValueError("unsupported boolean")
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self.visit(v) for v in node.values]
+        out = values[0]
+        for v in values[1:]:
+            out = ast.BinOp(out, op, v)
+        return out
+
+    def visit_IfExp(self, node):
+        # pd.Series(np.where(test, a, b), index=frame.index)
+        where = ast.Call(
+            ast.Attribute(ast.Name("np", ast.Load()), "where", ast.Load()),
+            [self.visit(node.test), self.visit(node.body), self.visit(node.orelse)], [])
+        index = ast.Attribute(self.frame, "index", ast.Load())
+        return ast.Call(ast.Attribute(ast.Name("pd", ast.Load()), "Series", ast.Load()),
+                        [where], [ast.keyword("index", index)])
+
+    def visit_Constant(self, node):
+        return node
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Compare,
+                                 ast.operator, ast.unaryop, ast.cmpop,
+                                 ast.expr_context)):
+            raise ValueError(f"unsupported {type(node).__name__}")
+        return super().generic_visit(node)
+
+
+def _simple_frame(node: ast.expr) -> bool:
+    """df, or df[...] with a constant column selection — safe to repeat."""
+    if isinstance(node, ast.Name):
+        return True
+    return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and all(isinstance(e, ast.Constant)
+                    for e in (node.slice.elts if isinstance(node.slice, ast.List)
+                              else [node.slice])))
+
+
+class _Vectorize(ast.NodeTransformer):
+    def __init__(self, dtypes: dict):
+        self.dtypes = dtypes   # Column name → dtype
+        self.rewrites = 0
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and func.attr == "apply"
+                and _has_axis1(node) and node.args
+                and isinstance(node.args[0], ast.Lambda)
+                and _simple_frame(func.value)):
+            return node
+        fn = node.args[0]
+        if (len(fn.args.args) != 1 or fn.args.vararg or fn.args.kwarg
+                or fn.args.kwonlyargs or fn.args.defaults):
+            return node
+        rewriter = _RowLambda(fn.args.args[0].arg, func.value, self.dtypes)
+        try:
+            body = rewriter.visit(fn.body)
+        except ValueError:
+            return node
+        if not rewriter.reads:
+            return node   # e.g. lambda r: 1 — would become a scalar, not a Series
+        self.rewrites += 1
+        return body
+
+
+def vectorize(code: str, df: pd.DataFrame) -> str:
+    """Rewrite `X.apply(lambda r: <arithmetic on r[...]>, axis=1)` as the
+    same expression on whole columns; other code is returned unchanged."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    rewriter = _Vectorize({str(c): t for c, t in df.dtypes.items()})
+    tree = rewriter.visit(tree)
+    if not rewriter.rewrites:
+        return code
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+# ── Cost estimation ───────────────────────────────────────────────────────
+class _Estimator(ast.NodeVisitor):
+    """Walk the code once, multiplying costs inside loops over df."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.rows = len(df)
+        self.frames = {"df"}   # Names bound to df-sized frames
+        self.scale = 1         # Iterations of the enclosing loops over df
+        self.cost = Cost()
+
+    def _sized(self, node: ast.expr) -> bool:
+        """Does node evaluate to something with one entry per row of df?"""
+        if isinstance(node, ast.Name):
+            return node.id in self.frames
+        if isinstance(node, ast.Subscript):
+            return (self._sized(node.value)
+                    and not (isinstance(node.value, ast.Attribute)
+                             and node.value.attr in ("at", "iat")))
+        if isinstance(node, ast.Attribute):
+            return node.attr in _ROW_ATTRS | {"loc", "iloc"} and self._sized(node.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return node.func.attr in _ROW_PRESERVING and self._sized(node.func.value)
+        return False
+
+    def _series(self, node: ast.expr) -> bool:
+        """df['col'] — a single df-sized column."""
+        return (isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant)
+                and isinstance(node.slice.value, str) and self._sized(node))
+
+    def _iterations(self, it: ast.expr) -> tuple[str, int] | None:
+        """(kind, count) of the iterations `for ... in it` performs, if it
+        walks df's rows or columns."""
+        if isinstance(it, ast.Call):
+            f = it.func
+            if isinstance(f, ast.Attribute) and self._sized(f.value):
+                if f.attr in ("iterrows", "itertuples"):
+                    return f.attr, self.rows
+                if f.attr in ("tolist", "to_list"):
+                    return "items", self.rows
+                if f.attr in ("items", "iteritems"):
+                    # A column's (index, value) pairs; a frame's (name, column) pairs
+                    if self._series(f.value):
+                        return "items", self.rows
+                    return "columns", len(self.df.columns)
+            if isinstance(f, ast.Name) and f.id == "range" and it.args:
+                n = it.args[-1] if len(it.args) <= 2 else it.args[1]
+                if (isinstance(n, ast.Call) and isinstance(n.func, ast.Name)
+                        and n.func.id == "len" and n.args and self._sized(n.args[0])):
+                    return "range", self.rows
+            if isinstance(f, ast.Name) and f.id in ("zip", "enumerate") and it.args:
+                return self._iterations(it.args[0])
+            return None
+        if self._series(it):
+            return "items", self.rows   # for v in df['col']
+        if isinstance(it, ast.Attribute) and self._sized(it.value):
+            if it.attr in _ROW_ATTRS:
+                return "items", self.rows
+            if it.attr == "columns":
+                return "columns", len(self.df.columns)
+        return None
+
+    def _loop(self, it: ast.expr, body: Callable[[], None]) -> None:
+        loop = self._iterations(it)
+        if loop is None:
+            self.visit(it)
+            body()
+            return
+        self.generic_visit(it)   # Counted here, not again by visit_Call
+        kind, n = loop
+        what = "columns" if kind == "columns" else f"rows ({kind})"
+        self.cost.add(self.scale * n * _COST[kind], f"a Python loop over {what}")
+        outer, self.scale = self.scale, self.scale * n
+        body()
+        self.scale = outer
+
+    def visit_For(self, node):
+        self._loop(node.iter, lambda: [self.visit(n) for n in node.body + node.orelse])
+
+    def _comprehension(self, node):
+        elts = [node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]
+
+        def nest(i: int) -> None:
+            if i == len(node.generators):
+                for e in elts:
+                    self.visit(e)
+                return
+            gen = node.generators[i]
+            self._loop(gen.iter, lambda: ([self.visit(c) for c in gen.ifs], nest(i + 1)))
+        nest(0)
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _comprehension
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        sized = self._sized(node.value)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                (self.frames.add if sized else self.frames.discard)(target.id)
+            else:
+                self.visit(target)
+
+    def visit_Subscript(self, node):
+        if self.scale > 1:
+            base = node.value
+            if isinstance(base, ast.Attribute) and self._sized(base.value):
+                if base.attr in ("loc", "iloc"):
+                    self.cost.add(self.scale * _COST["indexer"],
+                                  f".{base.attr}[] lookups inside a loop")
+                elif base.attr in ("at", "iat"):
+                    self.cost.add(self.scale * _COST["scalar"],
+                                  f".{base.attr}[] lookups inside a loop")
+            elif self._sized(base) and not isinstance(node.slice, ast.Constant):
+                self.cost.add(self.scale * (_COST["call"] + self.rows * _COST["scan"]),
+                              "filtering the whole frame inside a loop")
+        self.generic_visit(node)
+
+    def _elementwise(self, node, operands):
+        if self.scale > 1 and any(self._sized(o) for o in operands):
+            self.cost.add(self.scale * self.rows * _COST["scan"],
+                          "whole-column arithmetic inside a loop")
+        self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        self._elementwise(node, [node.left, *node.comparators])
+
+    def visit_BinOp(self, node):
+        self._elementwise(node, [node.left, node.right])
+
+    def visit_Call(self, node):
+        f = node.func
+        if isinstance(f, ast.Attribute):
+            receiver = self._sized(f.value)
+            if f.attr == "apply" and receiver and _has_axis1(node):
+                self.cost.add(self.scale * self.rows * _COST["apply"],
+                              "a row-wise apply(axis=1)")
+            elif f.attr in ("iterrows", "itertuples") and receiver:
+                self.cost.add(self.scale * self.rows * _COST[f.attr],
+                              f"{f.attr}() over every row")
+            elif f.attr == "merge" and isinstance(f.value, ast.Name) and f.value.id == "pd":
+                self._merge(node, *(node.args[:2] + [None, None])[:2])
+            elif f.attr in ("merge", "join"):
+                self._merge(node, f.value, node.args[0] if node.args else None)
+            elif (self.scale > 1 and receiver
+                  and f.attr not in ("iterrows", "itertuples", "items")):
+                self.cost.add(self.scale * (_COST["call"] + self.rows * _COST["scan"]),
+                              f"df.{f.attr}() on the whole frame inside a loop")
+        self.generic_visit(node)
+
+    def _merge(self, node: ast.Call, left: ast.expr | None,
+               right: ast.expr | None) -> None:
+        """Estimate rows produced by a self- or cross-join of df-sized frames.
+
+        Merges with derived frames (aggregates, lookups) are usually small
+        and their size can't be known statically, so they're not counted.
+        """
+        kw = {k.arg: k.value for k in node.keywords}
+        left = left if left is not None else kw.get("left")
+        right = right if right is not None else kw.get("right")
+        if left is None or right is None or not (self._sized(left) and self._sized(right)):
+            return
+        how = kw.get("how")
+        if isinstance(how, ast.Constant) and how.value == "cross":
+            out = self.rows * self.rows
+        else:
+            on = kw.get("on")
+            keys = ([on.value] if isinstance(on, ast.Constant)
+                    else [e.value for e in on.elts if isinstance(e, ast.Constant)]
+                    if isinstance(on, (ast.List, ast.Tuple)) else None)
+            if not keys or not set(keys) <= set(self.df.columns):
+                return
+            # Rows of a self-join: each key value pairs with every copy of itself
+            counts = self.df.groupby(keys, dropna=False, observed=True).size()
+            out = int((counts.astype("float64") ** 2).sum())
+        width = 2 * len(self.df.columns)
+        self.cost.add(self.scale * out * _COST["merge"],
+                      f"a join producing ~{out:,} rows", out * width * 8)
+
+
+def estimate(code: str, df: pd.DataFrame) -> Cost:
+    """Static estimate of how long code takes on df (zero if unparsable)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return Cost()
+    est = _Estimator(df)
+    est.visit(tree)
+    return est.cost
+
+
+def review(code: str, df: pd.DataFrame,
+           max_seconds: float = CODE_GUARD_MAX_SECONDS) -> tuple[str, str | None]:
+    """Vectorize what can be, then reject what is still too slow.
+
+    Returns (code to run, None) or (code, error) where the error tells
+    the model which pattern to avoid when it regenerates.
+    """
+    code = vectorize(code, df)
+    cost = estimate(code, df)
+    limit = EXEC_MEMORY_MB * 1024 * 1024
+    if cost.bytes > limit:
+        return code, (f"This code would need ~{cost.bytes / 2**30:.1f} GB of memory "
+                      f"({cost.worst}). Aggregate before joining, or avoid the join.")
+    if cost.seconds > max_seconds:
+        return code, (f"This code would take ~{cost.seconds:.0f}s on {len(df):,} rows "
+                      f"because of {cost.worst}. Use vectorized pandas operations "
+                      f"(column arithmetic, groupby, boolean masks) instead.")
+    return code, None
@@ -4,9 +4,83 @@ LM_STUDIO_URL   = "http://10.149.95.50:1234/v1"
 REASONING_MODEL = "qwen2.5-coder-7b-instruct"
 EMBEDDING_MODEL = "text-embedding-all-minilm-l6-v2-embedding"
 CHROMA_DIR      = "./chroma_store"
+EMBED_CACHE_PATH        = f"{CHROMA_DIR}/embed_cache.sqlite3"
+EMBED_CACHE_MAX_ENTRIES = 50_000   # LRU-evicted beyond this many vectors
+QUERY_CACHE_SIZE        = 512      # In-memory question embeddings
+QUERY_CACHE_SPILL       = True     # Also persist question embeddings to disk
+RAG_MAX_INDEXES         = 8        # Warm per-dataset indexes kept in memory
+RAG_RRF_K               = 60       # Rank-fusion damping for vector + BM25 results
+ROW_INDEX_ENABLED       = False    # Also embed individual rows (one call per 64 rows)
+ROW_INDEX_DIR           = f"{CHROMA_DIR}/rows"
+ROW_INDEX_MAX_ROWS      = 200_000  # Larger tables are sampled down to this
+ROW_INDEX_NPROBE        = 16       # IVF lists scanned per query (recall vs speed)
+ROW_INDEX_TOP_K         = 5        # Matching rows added to the RAG context
+ROW_INDEX_RETRY_SECONDS = 60.0     # Wait before retrying a failed row-index build
+PROFILE_DIGEST_COMPRESSION = 1000  # Quantile-sketch centroids (accuracy vs size)
+PROFILE_HLL_PRECISION      = 14    # 16384 HyperLogLog registers (~0.8% error)
+PROFILE_EXACT_DISTINCT     = 20_000  # Distinct values counted exactly up to this
+ANSWER_CACHE_THRESHOLD   = 0.97    # Cosine similarity to reuse an answer
+ANSWER_CACHE_TTL         = 3600    # Seconds a cached answer stays valid
+ANSWER_CACHE_MAX_ENTRIES = 256
+CODE_CACHE_MAX_ENTRIES   = 512     # Generated code per (schema, question)
+DATASET_DIR             = f"{CHROMA_DIR}/datasets"   # Typed columnar copies of uploads
+DATASET_STORE_MAX_FILES = 20       # Oldest-used dataset files deleted beyond this
+DATASET_MEMORY_MAX      = 4        # Loaded datasets shared in memory across sessions
 MAX_TOKENS      = 1024
+EMBED_BATCH_SIZE = 64   # Texts per embeddings request when indexing
+
+# HTTP connection pool shared by embeddings, completions and health checks
+LLM_MAX_CONNECTIONS  = 20
+LLM_MAX_KEEPALIVE    = 10
+LLM_KEEPALIVE_EXPIRY = 30.0    # Seconds an idle connection stays open
+LLM_CONNECT_TIMEOUT  = 5.0
+LLM_READ_TIMEOUT     = 120.0
+LLM_HTTP2            = True    # Only takes effect if the h2 package is installed
+
+# Deadlines (seconds, retries included), retries and circuit breaker
+LLM_DEADLINE_CODE    = 90.0
+LLM_DEADLINE_EXPLAIN = 60.0
+LLM_DEADLINE_EMBED   = 30.0
+LLM_RETRIES          = 3       # Extra attempts after a transient failure
+LLM_BACKOFF_BASE     = 0.5     # Doubles per retry, with full jitter
+LLM_BACKOFF_MAX      = 8.0
+BREAKER_FAILURES     = 5       # Consecutive failures that open the circuit
+BREAKER_COOLDOWN     = 30.0    # Seconds open before a trial call is allowed
+
+# OpenAI-compatible model servers. "pools" is the traffic each one serves
+# ("reasoning" = code + explanations, "embedding"); "weight" scales its share.
+LLM_BACKENDS = [
+    {"url": LM_STUDIO_URL, "weight": 1.0, "pools": ["reasoning", "embedding"]},
+]
+LLM_ROUTING         = "least_outstanding"   # or "weighted"
+LLM_HEALTH_INTERVAL = 15.0    # Seconds between background health probes
+
+# LLM calls admitted at once, overall and per priority class
+# (interactive chat > auto-insights > reindex embeddings)
+LLM_MAX_CONCURRENCY = 4
+LLM_CLASS_BUDGET    = {"interactive": 4, "insights": 2, "reindex": 1}
 TEMP_CODE       = 0.1   # Low = deterministic code
 TEMP_EXPLAIN    = 0.3   # Slightly higher for explanations
+PROMPT_CONTEXT_CHUNKS = 6    # RAG chunks considered for the code prompt
+PROMPT_TOKEN_BUDGET   = 900  # Max tokens of RAG context in the code prompt
+RETRY_TOKEN_BUDGET    = 450  # Max tokens of RAG context in the retry prompt
+INGEST_CHUNK_ROWS     = 100_000  # CSV rows parsed (and downcast) at a time
+INGEST_ENGINE         = "c"      # or "pyarrow" (falls back to "c" if missing)
+INGEST_CATEGORY_MAX   = 1_000    # Text columns with more distinct values stay str
+INGEST_CATEGORY_RATIO = 0.5      # ...as do columns that are mostly unique
+EXEC_ISOLATED        = True    # Run generated code in sandbox processes
+EXEC_WORKERS         = 2       # Pre-started sandbox processes
+EXEC_TIMEOUT         = 30.0    # Wall-clock seconds before a query is killed
+EXEC_CPU_SECONDS     = 30      # CPU seconds allowed per query
+EXEC_MEMORY_MB       = 4096    # Address-space limit per sandbox process
+EXEC_WORKER_DATASETS = 2       # Datasets each sandbox keeps loaded
+EXEC_SHARED_MEMORY   = True    # Hand datasets to sandboxes via shared memory
+SHM_MAX_DATASETS     = 4       # Datasets kept published in shared memory
+CODE_GUARD_MAX_SECONDS = 10.0  # Estimated run time above which code is regenerated
+AUTO_INSIGHT_WORKERS = LLM_CLASS_BUDGET["insights"]  # Auto-insight questions answered concurrently
+# Seconds per auto-insight question, counted from when its worker starts:
+# code, one retry and the explanation, each at its own LLM deadline
+AUTO_INSIGHT_TIMEOUT = 2 * LLM_DEADLINE_CODE + LLM_DEADLINE_EXPLAIN
 
 # Aliases for any code using the newer names
 CHROMA_PERSIST_DIR = CHROMA_DIR
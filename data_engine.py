@@ -1,9 +1,22 @@
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import pandas as pd
-from llm_client import generate_code, generate_explanation
-from rag_engine import retrieve_context
+from llm_client import generate_code, generate_explanation, stream_explanation, priority
+import query_cache
+from code_guard import review
+from prompt_builder import build_context, count_tokens
+from executor import execute
+from rag_engine import (
+    _hash, build_rag_index, embed_question, get_index, get_profile, retrieve_chunks,
+)
 from visualizer import auto_chart
-from config     import AUTO_QUESTIONS
+from config     import (
+    AUTO_QUESTIONS, AUTO_INSIGHT_WORKERS, AUTO_INSIGHT_TIMEOUT,
+    PROMPT_CONTEXT_CHUNKS, PROMPT_TOKEN_BUDGET, RETRY_TOKEN_BUDGET,
+)
 
 
 def _extract_code(raw: str) -> str:
@@ -13,42 +26,122 @@ def _extract_code(raw: str) -> str:
     return "\n".join(lines).strip()
 
 
-# Safe subset of builtins — enough for pandas code, no file/network access
-_SAFE_BUILTINS = {
-    "len": len, "str": str, "int": int, "float": float, "bool": bool,
-    "list": list, "dict": dict, "tuple": tuple, "set": set,
-    "range": range, "enumerate": enumerate, "zip": zip, "map": map,
-    "filter": filter, "sorted": sorted, "reversed": reversed,
-    "min": min, "max": max, "sum": sum, "abs": abs, "round": round,
-    "any": any, "all": all, "isinstance": isinstance, "type": type,
-    "print": print, "repr": repr, "hasattr": hasattr, "getattr": getattr,
-    "ValueError": ValueError, "TypeError": TypeError, "KeyError": KeyError,
-    "True": True, "False": False, "None": None,
-}
+def _safe_exec(code: str, df: pd.DataFrame, dataset_id: str | None = None):
+    """Run generated code in a sandboxed worker → (result, error).
 
+    dataset_id (the RAG index id) lets workers keep df loaded between calls.
+    """
+    return execute(code, df, dataset_id or _hash(df))
 
-def _safe_exec(code: str, df: pd.DataFrame):
-    import numpy as np
-    local = {"df": df, "pd": pd, "np": np}
-    try:
-        exec(code, {"__builtins__": _SAFE_BUILTINS}, local)
-        if "result" in local:
-            return local["result"], None
-        user_vars = [k for k in local if k not in ("df", "pd", "np")]
-        if user_vars:
-            return local[user_vars[-1]], None
-        return None, "No result variable found"
-    except Exception as e:
-        return None, str(e)
 
+def _guarded_exec(code: str, df: pd.DataFrame, dataset_id: str | None = None):
+    """Vectorize or reject slow code, then run it → (code run, result, error).
 
-def answer_question(df: pd.DataFrame,
-                    question: str,
-                    history: list) -> dict:
+    Code whose estimated cost on df is too high never reaches a worker;
+    its error names the slow pattern so the retry prompt can avoid it.
+    """
+    code, error = review(code, df)
+    if error:
+        return code, None, error
+    result, error = _safe_exec(code, df, dataset_id)
+    return code, result, error
+
+
+# Charts are built off-thread so Plotly work overlaps the explanation call
+_CHART_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chart")
+
+
+def _timed(fn, *args):
+    """Run fn(*args) and return (result, elapsed seconds)."""
+    t = time.perf_counter()
+    return fn(*args), time.perf_counter() - t
+
+
+class Abandoned(Exception):
+    """The caller stopped waiting for this answer."""
+
+
+def _check(cancel: threading.Event | None) -> None:
+    # Called before each LLM call, sandbox run and cache write so a
+    # question nobody is waiting for stops using slots and workers
+    if cancel is not None and cancel.is_set():
+        raise Abandoned()
+
+
+_EXPLAIN_SYSTEM = "You are a data analyst explaining results to a business manager. Be concise, use plain English, and include specific numbers from the result."
 
-    context = retrieve_context(question)
 
-    prompt = f"""
+def stream_answer(df: pd.DataFrame,
+                  question: str,
+                  history: list,
+                  index_id: str | None = None,
+                  stream: bool = True,
+                  cancel: threading.Event | None = None):
+    """Answer a question as a sequence of stage events.
+
+    Yields dicts with a "stage" key: "context" (skipped when cached code
+    for the same schema and question is reused), "code", "result", then
+    "chart" and the "token" events carrying the explanation text, and
+    finally "done" with the same dict that answer_question returns. The
+    chart is built while the explanation is generated, so "chart" may
+    arrive between or after the tokens. A failed computation jumps
+    straight to "done"; a cached answer for a near-identical question
+    replays "result", "chart", "token" and "done". With stream=False the
+    explanation arrives as a single "token" event. Once cancel is set the
+    generator raises Abandoned at its next step instead of doing more
+    work or writing to the caches.
+
+    The final answer carries "timings" (seconds per stage) and
+    "prompt_tokens" (approximate size of each LLM prompt sent).
+    """
+    timings: dict[str, float] = {}
+    prompt_tokens: dict[str, int] = {}
+    started = time.perf_counter()
+
+    # Index may be missing (never built or evicted) — rebuild it for this df
+    if index_id is None or get_index(index_id) is None:
+        index_id = build_rag_index(df)
+
+    # Near-identical question already answered on this dataset → replay it
+    t = time.perf_counter()
+    try:
+        q_vec = embed_question(question)
+    except Exception:
+        q_vec = None
+    if q_vec is not None:
+        cached = query_cache.lookup_answer(index_id, question, q_vec)
+        if cached is not None:
+            timings["lookup"] = timings["total"] = time.perf_counter() - t
+            yield {"stage": "result", "raw_result": cached["raw_result"]}
+            yield {"stage": "chart",  "chart": cached["chart"]}
+            yield {"stage": "token",  "text": cached["explanation"]}
+            yield {"stage": "done",   "answer": {**cached, "timings": timings}}
+            return
+
+    # Same schema + question as before → re-run the cached code first
+    schema = query_cache.schema_fingerprint(df)
+    code   = query_cache.lookup_code(schema, question)
+    timings["lookup"] = time.perf_counter() - t
+    if code is not None:
+        _check(cancel)
+        t = time.perf_counter()
+        code, result, error = _guarded_exec(code, df, index_id)
+        timings["exec"] = time.perf_counter() - t
+        if error or result is None:
+            code = None
+
+    if code is None:
+        # Most relevant chunks first, trimmed to the prompt token budget
+        t = time.perf_counter()
+        try:
+            chunks = retrieve_chunks(question, PROMPT_CONTEXT_CHUNKS, index_id)
+        except Exception as e:
+            chunks = [f"[RAG error: could not embed question — {e}]"]
+        context, _ = build_context(chunks, PROMPT_TOKEN_BUDGET)
+        timings["context"] = time.perf_counter() - t
+        yield {"stage": "context", "context": context}
+
+        prompt = f"""
 Dataset context — use these EXACT column names:
 {context}
 
@@ -62,80 +155,225 @@ Rules:
 - Max 6 lines
 - Return ONLY code
 """
-    raw  = generate_code(
-        system="Return only Python pandas code. No markdown.",
-        user=prompt
-    )
-    code = _extract_code(raw)
+        prompt_tokens["code"] = count_tokens(prompt)
+        _check(cancel)
+        t = time.perf_counter()
+        raw  = generate_code(
+            system="Return only Python pandas code. No markdown.",
+            user=prompt
+        )
+        code = _extract_code(raw)
+        timings["codegen"] = time.perf_counter() - t
 
-    result, error = _safe_exec(code, df)
+        _check(cancel)
+        t = time.perf_counter()
+        code, result, error = _guarded_exec(code, df, index_id)
+        timings["exec"] = timings.get("exec", 0.0) + time.perf_counter() - t
+
+        if error:
+            # Compact retry: tighter context + the failing code, not the
+            # whole first prompt again
+            retry_context, _ = build_context(chunks, RETRY_TOKEN_BUDGET)
+            retry = f"""
+Dataset context — use these EXACT column names:
+{retry_context}
+
+DataFrame is loaded as variable df.
+Question: "{question}"
+
+This code failed:
+{code}
+Error: {str(error)[:300]}
 
-    if error:
-        retry = f"""
-{prompt}
-Previous attempt failed: {error}
 Column names are case-sensitive. Use exact names from context.
-Write simpler corrected code.
+Write simpler corrected code. Store the answer in result. No imports.
+Return ONLY code.
 """
-        raw           = generate_code(
-            system="Return only Python code. Fix the error.",
-            user=retry
-        )
-        code          = _extract_code(raw)
-        result, error = _safe_exec(code, df)
+            prompt_tokens["retry"] = count_tokens(retry)
+            _check(cancel)
+            t = time.perf_counter()
+            raw           = generate_code(
+                system="Return only Python code. Fix the error.",
+                user=retry
+            )
+            code          = _extract_code(raw)
+            timings["codegen"] += time.perf_counter() - t
+
+            _check(cancel)
+            t = time.perf_counter()
+            code, result, error = _guarded_exec(code, df, index_id)
+            timings["exec"] += time.perf_counter() - t
+
+        if not error and result is not None:
+            _check(cancel)
+            query_cache.store_code(schema, question, code)
+
+    yield {"stage": "code", "code": code}
 
     if error or result is None:
-        return {
+        timings["total"] = time.perf_counter() - started
+        yield {"stage": "done", "answer": {
             "answer"      : "I wasn't able to compute an answer for that question. Could you try rephrasing it?",
             "raw_result"  : None,
             "code"        : code,
             "explanation" : f"Error: {error}",
-            "chart"       : None
-        }
+            "chart"       : None,
+            "timings"     : timings,
+            "prompt_tokens": prompt_tokens,
+        }}
+        return
+
+    t = time.perf_counter()
+    result_text = str(result)
+    raw_result  = result_text[:300]
+    timings["serialize"] = time.perf_counter() - t
+    yield {"stage": "result", "raw_result": raw_result}
 
-    explain = generate_explanation(
-        system="You are a data analyst explaining results to a business manager. Be concise, use plain English, and include specific numbers from the result.",
-        user=f"""
+    # Build the chart (CPU-bound Plotly work) while the LLM explains
+    chart_future = _CHART_POOL.submit(_timed, auto_chart, question, result, df,
+                                      get_profile(index_id))
+    chart_sent   = False
+
+    explain_user = f"""
 Question: "{question}"
 Pandas code that ran: {code}
-Raw result: {str(result)[:500]}
+Raw result: {result_text[:500]}
 
 Write 2-3 sentences explaining this finding in natural language.
 Include actual numbers and percentages from the result.
 Do NOT mention code, pandas, or DataFrames — speak as if you analyzed it yourself.
 """
-    )
+    prompt_tokens["explain"] = count_tokens(explain_user)
+    _check(cancel)
+    t = time.perf_counter()
+    if stream:
+        pieces = []
+        for text in stream_explanation(system=_EXPLAIN_SYSTEM, user=explain_user):
+            if not chart_sent and chart_future.done():
+                chart, timings["chart"] = chart_future.result()
+                chart_sent = True
+                yield {"stage": "chart", "chart": chart}
+            pieces.append(text)
+            yield {"stage": "token", "text": text}
+        explain = "".join(pieces).strip()
+    else:
+        explain = generate_explanation(system=_EXPLAIN_SYSTEM, user=explain_user)
+        yield {"stage": "token", "text": explain}
+    timings["explain"] = time.perf_counter() - t
 
-    return {
+    if not chart_sent:
+        chart, timings["chart"] = chart_future.result()
+        yield {"stage": "chart", "chart": chart}
+
+    timings["total"] = time.perf_counter() - started
+    answer = {
         "answer"      : explain,
-        "raw_result"  : str(result)[:300],
+        "raw_result"  : raw_result,
         "code"        : code,
         "explanation" : explain,
-        "chart"       : auto_chart(question, result, df)
+        "chart"       : chart,
+        "timings"     : timings,
+        "prompt_tokens": prompt_tokens,
+    }
+    if q_vec is not None:
+        _check(cancel)
+        query_cache.store_answer(index_id, question, q_vec, answer)
+    yield {"stage": "done", "answer": answer}
+
+
+def answer_question(df: pd.DataFrame,
+                    question: str,
+                    history: list,
+                    index_id: str | None = None,
+                    cancel: threading.Event | None = None) -> dict:
+    answer = None
+    for event in stream_answer(df, question, history, index_id, stream=False,
+                               cancel=cancel):
+        if event["stage"] == "done":
+            answer = event["answer"]
+    return answer
+
+
+def _auto_insight(df: pd.DataFrame, question: str, icon: str,
+                  index_id: str | None, cancel: threading.Event) -> dict:
+    # Background work — yields LLM slots to live chat questions
+    with priority("insights"):
+        out = answer_question(df, question, [], index_id=index_id, cancel=cancel)
+    return {
+        "icon"       : icon,
+        "question"   : question,
+        "answer"     : str(out["answer"])[:120],
+        "explanation": str(out["explanation"])[:160],
+        "code"       : out.get("code", ""),
+        "chart"      : out.get("chart"),
+    }
+
+
+def _failed_insight(icon: str, question: str, error: str) -> dict:
+    return {
+        "icon"       : icon,
+        "question"   : question,
+        "answer"     : "Could not compute",
+        "explanation": error[:100],
+        "code"       : "",
+        "chart"      : None,
     }
 
 
-def run_auto_insights(df: pd.DataFrame) -> list:
+def run_auto_insights(df: pd.DataFrame, index_id: str | None = None) -> list:
     ICONS    = ["📊", "⚠️", "📈", "🔗", "💡"]
     insights = []
-    for i, q in enumerate(AUTO_QUESTIONS):
-        try:
-            out = answer_question(df, q, [])
-            insights.append({
-                "icon"       : ICONS[i],
-                "question"   : q,
-                "answer"     : str(out["answer"])[:120],
-                "explanation": str(out["explanation"])[:160],
-                "code"       : out.get("code", ""),
-                "chart"      : out.get("chart"),
-            })
-        except Exception as e:
-            insights.append({
-                "icon"       : ICONS[i],
-                "question"   : q,
-                "answer"     : "Could not compute",
-                "explanation": str(e)[:100],
-                "code"       : "",
-                "chart"      : None,
-            })
-    return insights
\ No newline at end of file
+
+    # Index once up front so the workers don't all race to build it
+    if index_id is None or get_index(index_id) is None:
+        index_id = build_rag_index(df)
+
+    # Each question gets AUTO_INSIGHT_TIMEOUT from when a worker picks it
+    # up; the panel as a whole waits at most as long as the queue needs
+    n       = len(AUTO_QUESTIONS)
+    rounds  = -(-n // AUTO_INSIGHT_WORKERS)
+    started: dict[int, float] = {}
+    cancels = [threading.Event() for _ in AUTO_QUESTIONS]
+
+    def task(i: int, q: str) -> dict:
+        started[i] = time.monotonic()
+        return _auto_insight(df, q, ICONS[i], index_id, cancels[i])
+
+    pool      = ThreadPoolExecutor(max_workers=AUTO_INSIGHT_WORKERS,
+                                   thread_name_prefix="auto-insight")
+    futures   = [pool.submit(task, i, q) for i, q in enumerate(AUTO_QUESTIONS)]
+    panel_end = time.monotonic() + rounds * AUTO_INSIGHT_TIMEOUT
+    try:
+        while True:
+            now  = time.monotonic()
+            live = []
+            for i, fut in enumerate(futures):
+                if fut.done() or cancels[i].is_set():
+                    continue
+                if i in started and now - started[i] >= AUTO_INSIGHT_TIMEOUT:
+                    cancels[i].set()
+                else:
+                    live.append(fut)
+            if not live or now >= panel_end:
+                break
+            # Wake on a completion, the next per-question deadline, or
+            # shortly after, to pick up start times of queued questions
+            due = [started[i] + AUTO_INSIGHT_TIMEOUT
+                   for i in started if not cancels[i].is_set()]
+            wait(live, timeout=min([*due, panel_end, now + 0.5]) - now,
+                 return_when=FIRST_COMPLETED)
+    finally:
+        # Stragglers stop at their next step and never write to the caches
+        for ev in cancels:
+            ev.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    # Collect in submission order so the panel order is unchanged
+    for i, (q, fut) in enumerate(zip(AUTO_QUESTIONS, futures)):
+        if not fut.done() or fut.cancelled() or isinstance(fut.exception(), Abandoned):
+            insights.append(_failed_insight(
+                ICONS[i], q, f"Timed out after {AUTO_INSIGHT_TIMEOUT:g}s"))
+        elif fut.exception() is not None:
+            insights.append(_failed_insight(ICONS[i], q, str(fut.exception())))
+        else:
+            insights.append(fut.result())
+    return insights
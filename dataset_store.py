@@ -0,0 +1,147 @@
+# dataset_store.py — typed columnar copies of uploads, keyed by content hash
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_object_dtype, is_string_dtype
+
+from config import DATASET_DIR, DATASET_STORE_MAX_FILES, DATASET_MEMORY_MAX
+from ingest import Progress, read_csv_chunked
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:   # No pyarrow: fall back to pickles (still typed, not mmapped)
+    pa = None
+
+_EXT = ".arrow" if pa is not None else ".pkl"
+
+# content hash → DataFrame, shared by every session in this process
+_frames: OrderedDict[str, pd.DataFrame] = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_hash(source, block: int = 1 << 20) -> str:
+    """sha256 of a file-like upload, read in blocks; rewinds the source."""
+    h = hashlib.sha256()
+    source.seek(0)
+    while data := source.read(block):
+        h.update(data)
+    source.seek(0)
+    return h.hexdigest()[:16]
+
+
+def _path(key: str) -> str:
+    return os.path.join(DATASET_DIR, key + _EXT)
+
+
+def coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert text columns that hold only numbers (and blanks) to numeric.
+
+    e.g. TotalCharges in the Telco file, where a few rows are " ".
+    Blank strings become NaN; columns with any other text are left alone.
+    Whole numbers become int64 (int8 for 0/1 flags, as in ingest).
+    """
+    for col in df.columns:
+        s = df[col]
+        if not (is_object_dtype(s) or is_string_dtype(s)
+                or isinstance(s.dtype, pd.CategoricalDtype)):
+            continue
+        text = s.astype("string").str.strip()
+        present = text.notna() & text.ne("")
+        if not present.any():
+            continue
+        num = pd.to_numeric(text.where(present), errors="coerce")
+        if num[present].notna().all():
+            values = pd.Series(num.to_numpy("float64", na_value=np.nan),
+                               index=df.index)
+            if present.all() and (values % 1 == 0).all():
+                values = values.astype("int8" if values.between(0, 1).all()
+                                       else "int64")
+            df[col] = values
+    return df
+
+
+def _save(key: str, df: pd.DataFrame) -> None:
+    """Write atomically so a concurrent reader never sees a partial file."""
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    tmp = _path(key) + ".tmp"
+    if pa is not None:
+        # Uncompressed Arrow IPC so later loads can memory-map it
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, tmp, compression="uncompressed")
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, _path(key))
+    _evict_files()
+
+
+def _load(key: str) -> pd.DataFrame | None:
+    path = _path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        if pa is not None:
+            table = feather.read_table(path, memory_map=True)
+            df = table.to_pandas(split_blocks=True)
+        else:
+            df = pd.read_pickle(path)
+    except Exception:
+        return None   # Corrupt or from another format version — re-ingest
+    os.utime(path)    # Mark as recently used for eviction
+    return df
+
+
+def _evict_files() -> None:
+    """Keep at most DATASET_STORE_MAX_FILES, dropping least recently used."""
+    try:
+        names = [n for n in os.listdir(DATASET_DIR) if n.endswith(_EXT)]
+    except OSError:
+        return
+    if len(names) <= DATASET_STORE_MAX_FILES:
+        return
+    paths = sorted((os.path.join(DATASET_DIR, n) for n in names),
+                   key=os.path.getmtime)
+    for path in paths[:len(paths) - DATASET_STORE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _remember(key: str, df: pd.DataFrame) -> None:
+    with _lock:
+        _frames[key] = df
+        _frames.move_to_end(key)
+        while len(_frames) > DATASET_MEMORY_MAX:
+            _frames.popitem(last=False)
+
+
+def load_dataset(source, progress: Progress | None = None) -> tuple[pd.DataFrame, str]:
+    """Return (DataFrame, content hash) for an uploaded CSV.
+
+    An upload seen before is served from memory or its stored columnar
+    copy; a new one is parsed once, typed, and stored for next time.
+    Every caller gets its own shallow copy: the column data is shared,
+    but with copy-on-write one session's edits never reach another's.
+    """
+    key = content_hash(source)
+    with _lock:
+        df = _frames.get(key)
+        if df is not None:
+            _frames.move_to_end(key)
+    if df is None:
+        df = _load(key)
+        if df is None:
+            df = coerce_numeric(read_csv_chunked(source, progress=progress))
+            try:
+                _save(key, df)
+            except (OSError, ValueError, TypeError):
+                pass   # Store is best-effort; the parsed frame is still good
+        _remember(key, df)
+    if progress is not None:
+        progress(1.0, len(df))
+    return df.copy(deep=False), key
@@ -0,0 +1,176 @@
+# embed_cache.py — persistent content-addressed embedding cache (SQLite)
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_SPILL,
+)
+
+_path: str = EMBED_CACHE_PATH
+_max_entries: int = EMBED_CACHE_MAX_ENTRIES
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+_query_size: int = QUERY_CACHE_SIZE
+_query_spill: bool = QUERY_CACHE_SPILL
+_query_lru: OrderedDict[str, np.ndarray] = OrderedDict()
+_query_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+_query_lock = threading.Lock()
+
+
+def _key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """Content address of a text under a given embedding model."""
+    return hashlib.sha256(f'{model}\x00{text}'.encode('utf-8')).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open (once) the cache database, creating the table if needed."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            ' key  TEXT PRIMARY KEY,'
+            ' vec  BLOB NOT NULL,'
+            ' used REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings(used)'
+        )
+        _conn = conn
+    return _conn
+
+
+def get_many(texts: list[str]) -> dict[int, np.ndarray]:
+    """Look up cached vectors. Returns {position in texts: vector} for hits."""
+    if not texts:
+        return {}
+    keys = [_key(t) for t in texts]
+    found: dict[str, np.ndarray] = {}
+    try:
+        with _lock:
+            conn = _connect()
+            for start in range(0, len(keys), 500):   # SQLite variable limit
+                batch = keys[start:start + 500]
+                marks = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT key, vec FROM embeddings WHERE key IN ({marks})',
+                    batch,
+                ).fetchall()
+                for k, blob in rows:
+                    found[k] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    'UPDATE embeddings SET used = ? WHERE key = ?',
+                    [(now, k) for k in found],
+                )
+                conn.commit()
+    except sqlite3.Error:
+        return {}   # Cache is best-effort — fall back to embedding
+    return {i: found[k] for i, k in enumerate(keys) if k in found}
+
+
+def put_many(texts: list[str], vectors: np.ndarray) -> None:
+    """Store vectors for texts, then evict least-recently-used overflow."""
+    if not texts:
+        return
+    now = time.time()
+    rows = [
+        (_key(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+        for t, v in zip(texts, vectors)
+    ]
+    try:
+        with _lock:
+            conn = _connect()
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vec, used) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+            _evict(conn)
+            conn.commit()
+    except sqlite3.Error:
+        pass
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    """Trim to ~90% of the size bound, dropping the least recently used."""
+    (count,) = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+    if count <= _max_entries:
+        return
+    excess = count - int(_max_entries * 0.9)
+    conn.execute(
+        'DELETE FROM embeddings WHERE key IN ('
+        ' SELECT key FROM embeddings ORDER BY used ASC LIMIT ?)',
+        (excess,),
+    )
+
+
+# ── Question embeddings: in-process LRU with optional disk spill ──────────
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form used as the cache key."""
+    return ' '.join(question.lower().split())
+
+
+def get_query(question: str) -> np.ndarray | None:
+    """Cached embedding for a question, or None on a miss."""
+    key = f'{EMBEDDING_MODEL}\x00{normalize_question(question)}'
+    with _query_lock:
+        vec = _query_lru.get(key)
+        if vec is not None:
+            _query_lru.move_to_end(key)
+            _query_stats['hits'] += 1
+            return vec
+
+    if _query_spill:
+        vec = get_many([_spill_text(question)]).get(0)
+        if vec is not None:
+            with _query_lock:
+                _query_stats['disk_hits'] += 1
+                _remember_query(key, vec)
+            return vec
+
+    with _query_lock:
+        _query_stats['misses'] += 1
+    return None
+
+
+def put_query(question: str, vector) -> None:
+    """Remember a question embedding (and spill it to disk if enabled)."""
+    vec = np.asarray(vector, dtype=np.float32)
+    key = f'{EMBEDDING_MODEL}\x00{normalize_question(question)}'
+    with _query_lock:
+        _remember_query(key, vec)
+    if _query_spill:
+        put_many([_spill_text(question)], vec[None, :])
+
+
+def query_stats() -> dict:
+    """Hit/miss counters and current size of the question cache."""
+    with _query_lock:
+        return {**_query_stats, 'size': len(_query_lru)}
+
+
+def _remember_query(key: str, vec: np.ndarray) -> None:
+    _query_lru[key] = vec
+    _query_lru.move_to_end(key)
+    while len(_query_lru) > _query_size:
+        _query_lru.popitem(last=False)
+
+
+def _spill_text(question: str) -> str:
+    """Disk key namespace for questions, distinct from chunk texts."""
+    return f'query:{normalize_question(question)}'
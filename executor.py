@@ -0,0 +1,272 @@
+# executor.py — run generated pandas code in sandboxed worker processes
+import atexit
+import multiprocessing as mp
+import queue
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import shm_store
+from config import (
+    EXEC_ISOLATED,
+    EXEC_SHARED_MEMORY,
+    EXEC_WORKERS,
+    EXEC_TIMEOUT,
+    EXEC_CPU_SECONDS,
+    EXEC_MEMORY_MB,
+    EXEC_WORKER_DATASETS,
+)
+
+try:
+    import resource
+except ImportError:   # Not on Windows — workers still run, just without rlimits
+    resource = None
+
+# Safe subset of builtins — enough for pandas code, no file/network access
+_SAFE_BUILTINS = {
+    "len": len, "str": str, "int": int, "float": float, "bool": bool,
+    "list": list, "dict": dict, "tuple": tuple, "set": set,
+    "range": range, "enumerate": enumerate, "zip": zip, "map": map,
+    "filter": filter, "sorted": sorted, "reversed": reversed,
+    "min": min, "max": max, "sum": sum, "abs": abs, "round": round,
+    "any": any, "all": all, "isinstance": isinstance, "type": type,
+    "print": print, "repr": repr, "hasattr": hasattr, "getattr": getattr,
+    "ValueError": ValueError, "TypeError": TypeError, "KeyError": KeyError,
+    "True": True, "False": False, "None": None,
+}
+
+
+def run_code(code: str, df: pd.DataFrame):
+    """exec code against df with restricted builtins → (result, error)."""
+    local = {"df": df, "pd": pd, "np": np}
+    try:
+        exec(code, {"__builtins__": _SAFE_BUILTINS}, local)
+        if "result" in local:
+            return local["result"], None
+        user_vars = [k for k in local if k not in ("df", "pd", "np")]
+        if user_vars:
+            return local[user_vars[-1]], None
+        return None, "No result variable found"
+    except MemoryError:
+        return None, f"Query needed more than {EXEC_MEMORY_MB} MB of memory"
+    except Exception as e:
+        return None, str(e)
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    """df as generated code expects it: plain strings, int64 integers.
+
+    Ingest stores repetitive text as category and 0/1 flags as int8; on
+    those, .map({...}).mean() raises and arithmetic can overflow.
+    """
+    narrow = [c for c in df.columns
+              if isinstance(df[c].dtype, pd.CategoricalDtype)
+              or (isinstance(df[c].dtype, np.dtype) and df[c].dtype.kind in "iu"
+                  and df[c].dtype.itemsize < 8)]
+    if not narrow:
+        return df
+    df = df.copy(deep=False)
+    for col in narrow:
+        s = df[col]
+        df[col] = (s.astype(s.cat.categories.dtype)
+                   if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("int64"))
+    return df
+
+
+# ── Worker process ────────────────────────────────────────────────────────
+def _limit_cpu(seconds: float) -> None:
+    """Allow this task `seconds` more CPU time; SIGXCPU kills us beyond it."""
+    if resource is None or not seconds:
+        return
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    spent = used.ru_utime + used.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(spent + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+_NOT_LOADED = "Dataset is not loaded in the worker"
+
+
+def _load(payload):
+    """(DataFrame, shared segment or None) from a DataFrame or a Manifest."""
+    if isinstance(payload, shm_store.Manifest):
+        df, shm = shm_store.attach(payload)
+        return _plain(df), shm
+    return _plain(payload), None
+
+
+def _drop(entry) -> None:
+    _, shm = entry
+    if shm is not None:
+        try:
+            shm.close()
+        except BufferError:
+            pass   # Still referenced — closed when garbage-collected
+
+
+def _worker_main(conn, memory_mb: int, cpu_seconds: float, keep: int) -> None:
+    """Serve (dataset id, code, payload) requests until the pipe closes.
+
+    The payload (a shared-memory manifest, or the pickled DataFrame) is
+    only sent the first time this worker sees a dataset; the last `keep`
+    datasets stay loaded.
+    """
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    frames: OrderedDict[str, tuple] = OrderedDict()
+    while True:
+        try:
+            key, code, payload = conn.recv()
+        except (EOFError, OSError):
+            return
+        if payload is not None:
+            try:
+                frames[key] = _load(payload)
+            except (OSError, ValueError):
+                pass   # Segment already released by the server
+        if key not in frames:
+            conn.send((None, _NOT_LOADED))
+            continue
+        frames.move_to_end(key)
+        while len(frames) > keep:
+            _drop(frames.popitem(last=False)[1])
+        _limit_cpu(cpu_seconds)
+        # Shallow copy: with copy-on-write (always on since pandas 3, which
+        # requirements.txt pins) writes by the generated code never touch
+        # the shared (read-only) buffers or the cached frame
+        result, error = run_code(code, frames[key][0].copy(deep=False))
+        try:
+            conn.send((result, error))
+        except Exception as e:   # Unpicklable result, e.g. a generator
+            conn.send((None, f"Result could not be returned: {e}"))
+
+
+class _Worker:
+    """One pre-started sandbox process and the datasets it holds."""
+
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child, EXEC_MEMORY_MB, EXEC_CPU_SECONDS, EXEC_WORKER_DATASETS),
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        # Mirror of the worker's dataset LRU, to know when df must be sent
+        self.datasets: OrderedDict[str, None] = OrderedDict()
+
+    def run(self, key: str, code: str, df: pd.DataFrame, timeout: float):
+        payload = None if key in self.datasets else _payload(key, df)
+        result, error = self._send(key, code, payload, timeout)
+        if error == _NOT_LOADED:
+            # Shared segment was gone before the worker attached — send df
+            result, error = self._send(key, code, df, timeout)
+        return result, error
+
+    def _send(self, key: str, code: str, payload, timeout: float):
+        if payload is not None:
+            self.datasets[key] = None
+        self.datasets.move_to_end(key)
+        while len(self.datasets) > EXEC_WORKER_DATASETS:
+            self.datasets.popitem(last=False)
+        try:
+            self.conn.send((key, code, payload))
+            if not self.conn.poll(timeout):
+                self.kill()
+                return None, f"Query took longer than {timeout:.0f}s and was stopped"
+            result, error = self.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            self.kill()
+            return None, "Query was stopped for exceeding its CPU or memory limit"
+        if error == _NOT_LOADED:
+            self.datasets.pop(key, None)
+        return result, error
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+def _payload(key: str, df: pd.DataFrame):
+    """What to send a worker that doesn't hold this dataset yet: a small
+    shared-memory manifest when possible, else the DataFrame itself."""
+    if EXEC_SHARED_MEMORY:
+        try:
+            return shm_store.publish(key, df)
+        except (OSError, TypeError, ValueError):
+            pass   # No /dev/shm, too small, or unhashable cell values
+    return df
+
+
+class ExecutorPool:
+    """Fixed set of worker processes; a killed worker is replaced."""
+
+    def __init__(self, size: int = EXEC_WORKERS):
+        methods = mp.get_all_start_methods()
+        # Never fork the (multi-threaded) server process itself
+        self._ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        for _ in range(size):
+            self._idle.put(_Worker(self._ctx))
+
+    def execute(self, key: str, code: str, df: pd.DataFrame,
+                timeout: float = EXEC_TIMEOUT):
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return None, f"Sandbox is busy; no worker was free within {timeout:.0f}s"
+        try:
+            return worker.run(key, code, df, timeout)
+        finally:
+            if not worker.alive:
+                worker = _Worker(self._ctx)
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_pool: ExecutorPool | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ExecutorPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExecutorPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def execute(code: str, df: pd.DataFrame, key: str,
+            timeout: float = EXEC_TIMEOUT):
+    """Run generated code against df → (result, error).
+
+    key identifies df's content (the RAG index id) so workers can keep it
+    loaded between calls. With EXEC_ISOLATED off, runs in this process.
+    """
+    if not EXEC_ISOLATED:
+        return run_code(code, _plain(df))
+    return _get_pool().execute(key, code, df, timeout)
@@ -0,0 +1,177 @@
+# ingest.py — streaming, memory-bounded CSV loading with dtype downcasting
+import io
+from typing import Callable, Iterator
+
+import pandas as pd
+from pandas.api.types import (
+    is_float_dtype,
+    is_integer_dtype,
+    is_object_dtype,
+    is_string_dtype,
+    union_categoricals,
+)
+
+from config import (
+    INGEST_CHUNK_ROWS,
+    INGEST_ENGINE,
+    INGEST_CATEGORY_MAX,
+    INGEST_CATEGORY_RATIO,
+)
+
+# progress(fraction of bytes read in [0, 1], rows read so far)
+Progress = Callable[[float, int], None]
+
+
+def _size(source) -> int | None:
+    """Total bytes in a seekable file-like source (None if unknown)."""
+    try:
+        pos = source.tell()
+        source.seek(0, io.SEEK_END)
+        size = source.tell()
+        source.seek(pos)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _tell(source) -> int | None:
+    try:
+        return source.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _is_text(s: pd.Series) -> bool:
+    return ((is_object_dtype(s) or is_string_dtype(s))
+            and not isinstance(s.dtype, pd.CategoricalDtype))
+
+
+def _iter_chunks(source, chunksize: int, engine: str) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of about chunksize rows each."""
+    if engine == "pyarrow":
+        try:
+            from pyarrow import csv as pa_csv
+        except ImportError:
+            engine = "c"   # pyarrow not installed — fall back to pandas' parser
+        else:
+            # pyarrow reads in byte blocks; ~200 bytes per row is a fair guess
+            opts = pa_csv.ReadOptions(block_size=max(chunksize * 200, 1 << 20))
+            for batch in pa_csv.open_csv(source, read_options=opts):
+                yield batch.to_pandas()
+            return
+    yield from pd.read_csv(source, chunksize=chunksize, engine=engine)
+
+
+def _downcast(chunk: pd.DataFrame, distinct: dict[str, set | None]) -> pd.DataFrame:
+    """Shrink one chunk: int8 for 0/1 flags, category for repetitive text.
+
+    Other integers stay int64 so arithmetic in generated code cannot
+    overflow (e.g. tenure * 12 on an int8 column). distinct tracks each text column's values seen so far; it is set to
+    None once a column has too many distinct values to be a category.
+    """
+    for col in chunk.columns:
+        s = chunk[col]
+        if is_integer_dtype(s):
+            if s.between(0, 1).all():
+                chunk[col] = s.astype("int8")
+        elif _is_text(s):
+            seen = distinct.setdefault(col, set())
+            if seen is None:
+                continue
+            seen.update(s.dropna().unique())
+            if len(seen) > INGEST_CATEGORY_MAX:
+                distinct[col] = None
+            else:
+                chunk[col] = s.astype("category")
+    return chunk
+
+
+def _as_text(part: pd.Series, dtype) -> pd.Series:
+    """A chunk's column as text, for columns other chunks parsed as text.
+
+    Best effort when the file can't be re-read: "1.50" comes back as "1.5".
+    """
+    if is_float_dtype(part) and (part.dropna() % 1 == 0).all():
+        part = part.astype("Int64")   # 12345.0 (ints with blanks) → "12345"
+    return part.astype(dtype)
+
+
+def _combine(chunks: list[pd.DataFrame], distinct: dict[str, set | None],
+             text_dtypes: dict[str, object]) -> pd.DataFrame:
+    """Concatenate downcast chunks, merging categoricals per column.
+
+    text_dtypes holds the parser's original dtype for text columns, used
+    to turn categoricals that didn't pay off back into plain strings.
+    """
+    if len(chunks) == 1:
+        df = chunks[0]
+    else:
+        columns = {}
+        for col in chunks[0].columns:
+            parts = [c[col] for c in chunks]
+            if distinct.get(col) is not None and all(
+                    isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+                columns[col] = pd.Series(union_categoricals(parts), name=col)
+            elif col in text_dtypes:
+                # Outgrew the category limit part-way, or some chunks parsed
+                # as numbers (e.g. 12345 before A1B2C, or all-empty as
+                # float): make every part text, as one read_csv would
+                columns[col] = pd.concat(
+                    [p if _is_text(p) else _as_text(p, text_dtypes[col])
+                     for p in parts],
+                    ignore_index=True,
+                )
+            else:
+                columns[col] = pd.concat(parts, ignore_index=True)
+        df = pd.DataFrame(columns)
+
+    # Mostly-unique text (IDs, free text) is cheaper as plain strings
+    for col, seen in distinct.items():
+        if seen is not None and len(df) and len(seen) / len(df) > INGEST_CATEGORY_RATIO:
+            df[col] = df[col].astype(text_dtypes[col])
+    return df
+
+
+def read_csv_chunked(source, chunksize: int = INGEST_CHUNK_ROWS,
+                     engine: str = INGEST_ENGINE,
+                     progress: Progress | None = None) -> pd.DataFrame:
+    """Load a CSV in chunks of rows, downcasting each before the next is read.
+
+    Peak memory stays near the size of the final (compact) DataFrame
+    rather than pandas' default object-heavy parse of the whole file.
+    Columns that only some chunks parsed as numbers are read again as
+    text, so they hold exactly what a single read_csv would.
+    """
+    total = _size(source)
+    start = _tell(source)
+    numeric: set[str] = set()
+    distinct: dict[str, set | None] = {}
+    text_dtypes: dict[str, object] = {}
+    chunks: list[pd.DataFrame] = []
+    rows = 0
+    for chunk in _iter_chunks(source, chunksize, engine):
+        for col in chunk.columns:
+            if not _is_text(chunk[col]):
+                if chunk[col].notna().any():
+                    numeric.add(col)
+            elif col not in text_dtypes:
+                text_dtypes[col] = chunk[col].dtype
+        chunks.append(_downcast(chunk, distinct))
+        rows += len(chunk)
+        if progress is not None:
+            try:
+                done = min(source.tell() / total, 1.0) if total else 0.0
+            except (AttributeError, OSError, ValueError):
+                done = 0.0
+            progress(done, rows)
+    df = _combine(chunks, distinct, text_dtypes)
+    mixed = [col for col in df.columns if col in numeric and col in text_dtypes]
+    if mixed and start is not None:
+        source.seek(start)
+        text = pd.read_csv(source, usecols=mixed, dtype=str,
+                           engine="c" if engine == "pyarrow" else engine)
+        for col in mixed:
+            df[col] = text[col].to_numpy()
+    if progress is not None:
+        progress(1.0, rows)
+    return df
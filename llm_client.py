@@ -1,44 +1,500 @@
-import requests
-from openai import OpenAI
+import hashlib
+import importlib.util
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+from openai import (
+    OpenAI,
+    DefaultHttpxClient,
+    DEFAULT_CONNECTION_LIMITS,
+    Timeout,
+    APIConnectionError,
+    APIStatusError,
+)
 from config import (
-    LM_STUDIO_URL,
     REASONING_MODEL,
     EMBEDDING_MODEL,
+    EMBED_BATCH_SIZE,
     MAX_TOKENS,
     TEMP_CODE,
-    TEMP_EXPLAIN
+    TEMP_EXPLAIN,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_HTTP2,
+    LLM_DEADLINE_CODE,
+    LLM_DEADLINE_EXPLAIN,
+    LLM_DEADLINE_EMBED,
+    LLM_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    BREAKER_FAILURES,
+    BREAKER_COOLDOWN,
+    LLM_BACKENDS,
+    LLM_ROUTING,
+    LLM_HEALTH_INTERVAL,
+    LLM_MAX_CONCURRENCY,
+    LLM_CLASS_BUDGET,
 )
 
-client = OpenAI(
-    base_url = LM_STUDIO_URL,
-    api_key  = "lm-studio"
+# ── Pooled keep-alive transport shared by every call below ────────────────
+_Limits = type(DEFAULT_CONNECTION_LIMITS)   # httpx.Limits, via openai
+_HTTP2  = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+_requests_sent = 0
+_stats_lock    = threading.Lock()
+
+
+def _count_request(request) -> None:
+    global _requests_sent
+    with _stats_lock:
+        _requests_sent += 1
+
+
+http_client = DefaultHttpxClient(
+    limits      = _Limits(
+        max_connections           = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections = LLM_MAX_KEEPALIVE,
+        keepalive_expiry          = LLM_KEEPALIVE_EXPIRY,
+    ),
+    timeout     = Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    http2       = _HTTP2,
+    event_hooks = {"request": [_count_request]},
 )
 
 
-def check_server_health() -> dict:
+# ── Failure isolation: deadlines, jittered retries, circuit breaker ───────
+class LLMUnavailableError(RuntimeError):
+    """The model server is failing and calls are being rejected fast."""
+
+
+class CircuitBreaker:
+    """Opens after N consecutive failures; lets one trial call through
+    once the cooldown has passed, closing again if it succeeds."""
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures  = failures
+        self.cooldown  = cooldown
+        self._count    = 0
+        self._opened   = 0.0
+        self._state    = "closed"
+        self._lock     = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (self._state == "open"
+                    and time.monotonic() - self._opened >= self.cooldown):
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if (self._state == "open"
+                    and time.monotonic() - self._opened >= self.cooldown):
+                self._state = "half_open"   # This caller is the trial
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._state = "closed"
+
+    def release(self) -> None:
+        """End a trial call whose outcome says nothing about the server
+        (e.g. the request failed locally); the next caller gets a new trial."""
+        with self._lock:
+            if self._state == "half_open":
+                self._state = "open"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._count += 1
+            if self._state == "half_open" or self._count >= self.failures:
+                self._state  = "open"
+                self._opened = time.monotonic()
+
+
+def _is_transient(e: Exception) -> bool:
+    """Connection problems, timeouts, rate limits and 5xx are worth retrying."""
+    if isinstance(e, APIConnectionError):       # Includes APITimeoutError
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code in (408, 429) or e.status_code >= 500
+    return False
+
+
+# ── Priority scheduling: interactive > insights > reindex ─────────────────
+PRIORITIES = ("interactive", "insights", "reindex")
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+@contextmanager
+def priority(cls: str):
+    """Run the LLM calls made inside this block at the given priority.
+
+    Context variables don't follow work into thread pools, so set this
+    inside the worker function.
+    """
+    if cls not in PRIORITIES:
+        raise ValueError(f"Unknown priority {cls!r}; expected one of {PRIORITIES}")
+    token = _priority.set(cls)
     try:
-        r = requests.get(
-            f"{LM_STUDIO_URL}/models",
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Scheduler:
+    """Admits calls within a global budget and per-class budgets; a free
+    slot goes to the highest-priority class that is waiting and may run."""
+
+    def __init__(self, total: int, budgets: dict):
+        self.total    = total
+        self.budgets  = {c: budgets.get(c, total) for c in PRIORITIES}
+        self._running = {c: 0 for c in PRIORITIES}
+        self._waiting = {c: 0 for c in PRIORITIES}
+        self._cond    = threading.Condition()
+
+    def _may_run(self, cls: str) -> bool:
+        if sum(self._running.values()) >= self.total:
+            return False
+        if self._running[cls] >= self.budgets[cls]:
+            return False
+        for higher in PRIORITIES[:PRIORITIES.index(cls)]:
+            if self._waiting[higher] and self._running[higher] < self.budgets[higher]:
+                return False
+        return True
+
+    @contextmanager
+    def slot(self, cls: str, timeout: float):
+        with self._cond:
+            self._waiting[cls] += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self._may_run(cls), timeout)
+            finally:
+                self._waiting[cls] -= 1
+            if not admitted:
+                self._cond.notify_all()
+                raise LLMUnavailableError(
+                    f"Timed out waiting for an LLM slot ({cls} priority)")
+            self._running[cls] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[cls] -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {c: {"running": self._running[c], "waiting": self._waiting[c],
+                        "budget": self.budgets[c]} for c in PRIORITIES}
+
+
+_scheduler = _Scheduler(LLM_MAX_CONCURRENCY, LLM_CLASS_BUDGET)
+
+
+# ── Backends and routing ──────────────────────────────────────────────────
+class Backend:
+    """One OpenAI-compatible server: its client, breaker and current load."""
+
+    def __init__(self, url: str, weight: float = 1.0,
+                 pools=("reasoning", "embedding"), client=None):
+        if not float(weight) > 0:
+            raise ValueError(f"Backend {url} needs a positive weight, got {weight!r}")
+        self.url         = url.rstrip("/")
+        self.weight      = float(weight)
+        self.pools       = set(pools)
+        self.client      = client or OpenAI(
+            base_url    = self.url,
+            api_key     = "lm-studio",
+            http_client = http_client,
+            max_retries = 0,        # Retries are handled by _call below
+        )
+        self.breaker     = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self.healthy     = True     # Cleared by a failed health probe
+        self.outstanding = 0
+        self._lock       = threading.Lock()
+
+    def begin(self) -> None:
+        with self._lock:
+            self.outstanding += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.outstanding -= 1
+
+
+_backends: list[Backend] = [Backend(**b) for b in LLM_BACKENDS]
+_last_probe = time.monotonic()
+_probing    = threading.Lock()
+
+
+def _pick(pool: str) -> Backend:
+    """Choose a backend for a pool, skipping ejected and open-circuit ones."""
+    _maybe_probe()
+    members = [b for b in _backends if pool in b.pools]
+    if not members:
+        raise LLMUnavailableError(f"No LLM backend serves the {pool} pool")
+    # If every member failed its health probe, let the breakers decide
+    live = [b for b in members if b.healthy] or members
+    if LLM_ROUTING == "weighted":
+        # Weighted random order (Efraimidis–Spirakis keys)
+        order = sorted(live, key=lambda b: random.random() ** (1 / b.weight),
+                       reverse=True)
+    else:
+        order = sorted(live, key=lambda b: (b.outstanding / b.weight, -b.weight))
+    for backend in order:
+        if backend.breaker.allow():
+            return backend
+    raise LLMUnavailableError(
+        f"All {pool} backends are failing; "
+        f"retrying in up to {BREAKER_COOLDOWN:.0f}s"
+    )
+
+
+def _endpoint(backend: Backend, pool: str):
+    if pool == "embedding":
+        return backend.client.embeddings.create
+    return backend.client.chat.completions.create
+
+
+def _call(pool: str, deadline: float, **kwargs):
+    """Run an API call on a routed backend under a deadline, with retries
+    (each may land on a different backend) and per-backend breakers.
+
+    Each attempt holds a scheduler slot of the caller's priority; backoff
+    sleeps don't. With stream=True the slot, the backend's outstanding
+    count and the breaker outcome last until the returned stream is
+    exhausted or closed, not just until the response headers arrive.
+    """
+    end = time.monotonic() + deadline
+    for attempt in range(LLM_RETRIES + 1):
+        with ExitStack() as held:
+            held.enter_context(
+                _scheduler.slot(_priority.get(), end - time.monotonic()))
+            backend = _pick(pool)
+            backend.begin()
+            held.callback(backend.end)
+            try:
+                resp = _endpoint(backend, pool)(
+                    timeout=end - time.monotonic(), **kwargs)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+                if kwargs.get("stream"):
+                    return _held_stream(resp, backend, held.pop_all())
+
+        if error is None:
+            backend.breaker.record_success()
+            return resp
+        if not _is_transient(error):
+            if isinstance(error, APIStatusError):
+                backend.breaker.record_success()  # Server answered; bad request
+            else:
+                backend.breaker.release()   # Never reached the server
+            raise error
+        backend.breaker.record_failure()
+        backoff = random.uniform(
+            0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        if attempt == LLM_RETRIES or time.monotonic() + backoff >= end:
+            raise error
+        time.sleep(backoff)
+
+
+def _held_stream(stream, backend: Backend, held: ExitStack):
+    """Iterate an open stream, then release what _call held for it."""
+    with held:
+        try:
+            yield from stream
+        except GeneratorExit:
+            backend.breaker.record_success()    # Caller stopped reading
+            raise
+        except Exception as e:
+            if _is_transient(e):
+                backend.breaker.record_failure()
+            else:
+                backend.breaker.record_success()
+            raise
+        backend.breaker.record_success()
+
+
+# ── Single-flight: identical concurrent requests share one HTTP call ──────
+class _SingleFlight:
+    """Callers with the same key while a call is in flight wait for it
+    and receive its result (or exception) instead of issuing their own."""
+
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, fn):
+        with self._lock:
+            fut    = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+_single_flight = _SingleFlight()
+
+
+def _shared_call(pool: str, deadline: float, **kwargs):
+    """_call, coalesced with any identical request already in flight.
+
+    The key is the request body (model, input/messages, temperature, ...),
+    which also tells embedding and chat requests apart, plus the caller's
+    priority — a follower waits on the leader's scheduler slot, so an
+    interactive call must not queue behind a reindex one.
+    """
+    body = json.dumps(kwargs, sort_keys=True, default=str)
+    key = hashlib.sha256(f"{_priority.get()}\n{body}".encode("utf-8")).hexdigest()
+    return _single_flight.do(key, lambda: _call(pool, deadline, **kwargs))
+
+
+def pool_stats() -> dict:
+    """Connection-pool configuration and current usage."""
+    pool  = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    conns = list(getattr(pool, "connections", []))
+    idle  = sum(1 for c in conns if c.is_idle())
+    with _stats_lock:
+        sent = _requests_sent
+    return {
+        "max_connections"   : LLM_MAX_CONNECTIONS,
+        "max_keepalive"     : LLM_MAX_KEEPALIVE,
+        "http2"             : _HTTP2,
+        "requests_sent"     : sent,
+        "open_connections"  : len(conns),
+        "active_connections": len(conns) - idle,
+        "idle_connections"  : idle,
+        "coalesced_calls"   : _single_flight.coalesced,
+        "scheduler"         : _scheduler.stats(),
+    }
+
+
+def _probe(backend: Backend) -> dict:
+    """Health-check one backend and eject/readmit it accordingly."""
+    report = {"url": backend.url, "circuit": backend.breaker.state,
+              "outstanding": backend.outstanding}
+    try:
+        r = http_client.get(
+            f"{backend.url}/models",
             timeout=5
         )
         if r.status_code == 200:
+            backend.healthy = True
             models = [m["id"] for m in r.json().get("data", [])]
-            return {"status": "online", "models": models}
-        return {"status": "error", "models": []}
+            return {**report, "status": "online", "models": models}
+        backend.healthy = False
+        return {**report, "status": "error", "models": []}
     except Exception as e:
-        return {"status": "offline", "error": str(e)}
+        backend.healthy = False
+        return {**report, "status": "offline", "models": [], "error": str(e)}
+
+
+def _maybe_probe() -> None:
+    """Re-probe backends in the background every LLM_HEALTH_INTERVAL.
+
+    Only useful with several backends — a single one relies on its breaker.
+    """
+    if (len(_backends) < 2
+            or time.monotonic() - _last_probe < LLM_HEALTH_INTERVAL
+            or not _probing.acquire(blocking=False)):
+        return
+
+    def run():
+        try:
+            check_server_health()
+        finally:
+            _probing.release()
+
+    threading.Thread(target=run, name="llm-health", daemon=True).start()
+
+
+def check_server_health() -> dict:
+    global _last_probe
+    _last_probe = time.monotonic()
+    reports = [_probe(b) for b in _backends]
+    online  = [r for r in reports if r["status"] == "online"]
+    states  = {r["circuit"] for r in reports}
+    circuit = ("closed" if "closed" in states
+               else "half_open" if "half_open" in states else "open")
+    models  = list(dict.fromkeys(m for r in online for m in r["models"]))
+
+    if online:
+        return {"status": "online", "models": models, "circuit": circuit,
+                "backends": reports, "pool": pool_stats()}
+    if any(r["status"] == "error" for r in reports):
+        return {"status": "error", "models": [], "circuit": circuit,
+                "backends": reports}
+    return {"status": "offline", "circuit": circuit, "backends": reports,
+            "error": "; ".join(r["error"] for r in reports)}
 
 
 def get_embedding(text: str) -> list:
-    resp = client.embeddings.create(
+    resp = _shared_call(
+        "embedding", LLM_DEADLINE_EMBED,
         model = EMBEDDING_MODEL,
         input = text[:2000]
     )
     return resp.data[0].embedding
 
 
+def get_embeddings(texts: list[str],
+                   batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed many texts in a few batched requests.
+
+    Returns a float32 matrix with one row per input text, in input order.
+    """
+    rows: list[list[float]] = []
+    for start in range(0, len(texts), batch_size):
+        batch = [t[:2000] for t in texts[start:start + batch_size]]
+        resp = _shared_call(
+            "embedding", LLM_DEADLINE_EMBED,
+            model = EMBEDDING_MODEL,
+            input = batch
+        )
+        # The server may answer out of order — each item carries its index
+        items = sorted(resp.data, key=lambda d: d.index)
+        rows.extend(d.embedding for d in items)
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(rows, dtype=np.float32)
+
+
 def generate_code(system: str, user: str) -> str:
-    resp = client.chat.completions.create(
+    resp = _shared_call(
+        "reasoning", LLM_DEADLINE_CODE,
         model       = REASONING_MODEL,
         messages    = [
             {"role": "system", "content": system},
@@ -51,7 +507,27 @@ def generate_code(system: str, user: str) -> str:
 
 
 def generate_explanation(system: str, user: str) -> str:
-    resp = client.chat.completions.create(
+    resp = _shared_call(
+        "reasoning", LLM_DEADLINE_EXPLAIN,
+        model       = REASONING_MODEL,
+        messages    = [
+            {"role": "system", "content": system},
+            {"role": "user",   "content": user}
+        ],
+        temperature = TEMP_EXPLAIN,
+        max_tokens  = 512,
+    )
+    return resp.choices[0].message.content.strip()
+
+
+def stream_explanation(system: str, user: str):
+    """Yield the explanation text piece by piece as the model produces it.
+
+    Retries cover opening the stream, not a broken stream. The LLM slot is
+    held until the stream ends or the generator is closed.
+    """
+    stream = _call(
+        "reasoning", LLM_DEADLINE_EXPLAIN,
         model       = REASONING_MODEL,
         messages    = [
             {"role": "system", "content": system},
@@ -59,5 +535,11 @@ def generate_explanation(system: str, user: str) -> str:
         ],
         temperature = TEMP_EXPLAIN,
         max_tokens  = 512,
+        stream      = True,
     )
-    return resp.choices[0].message.content.strip()
\ No newline at end of file
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
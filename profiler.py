@@ -0,0 +1,308 @@
+# profiler.py — mergeable per-column statistics for incremental re-indexing
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    PROFILE_DIGEST_COMPRESSION,
+    PROFILE_HLL_PRECISION,
+    PROFILE_EXACT_DISTINCT,
+)
+
+SAMPLE_VALUES = 6   # Distinct example values kept per categorical column
+
+
+# ── Quantile sketch: merging t-digest ─────────────────────────────────────
+@dataclass
+class QuantileSketch:
+    """Weighted centroids, small at the tails and coarse in the middle."""
+    means: np.ndarray = field(default_factory=lambda: np.empty(0))
+    weights: np.ndarray = field(default_factory=lambda: np.empty(0))
+    compression: int = PROFILE_DIGEST_COMPRESSION
+
+    @classmethod
+    def from_values(cls, values: np.ndarray,
+                    compression: int = PROFILE_DIGEST_COMPRESSION) -> 'QuantileSketch':
+        values = np.sort(np.asarray(values, dtype=np.float64))
+        n = len(values)
+        if n <= compression:
+            return cls(values, np.ones(n), compression)
+        # Unit weights: the centroid boundaries are fixed ranks, so the
+        # arcsine scale is evaluated per centroid rather than per value
+        half = compression / 4
+        k = np.arange(math.floor(-half) + 1, math.ceil(half))
+        q = (np.sin(k * 2 * math.pi / compression) + 1) / 2
+        starts = np.unique(np.r_[0, np.ceil(q * n).astype(np.intp)])
+        starts = starts[starts < n]
+        weights = np.diff(np.r_[starts, n]).astype(np.float64)
+        return cls(np.add.reduceat(values, starts) / weights, weights, compression)
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        means = np.concatenate([self.means, other.means])
+        order = np.argsort(means, kind='stable')
+        merged = QuantileSketch(means[order],
+                                np.concatenate([self.weights, other.weights])[order],
+                                self.compression)
+        merged._compress()
+        return merged
+
+    def _compress(self) -> None:
+        """Group sorted centroids so each spans at most 1 unit of the
+        arcsine scale — vectorized instead of the usual per-point loop."""
+        total = self.weights.sum()
+        if len(self.means) <= self.compression or total == 0:
+            return
+        q = (np.cumsum(self.weights) - self.weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k - k[0]).astype(np.intp)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        weights = np.add.reduceat(self.weights, starts)
+        self.means = np.add.reduceat(self.means * self.weights, starts) / weights
+        self.weights = weights
+
+    def quantile(self, q: float, lo: float, hi: float) -> float:
+        """Approximate q-quantile; lo/hi are the exact min and max."""
+        total = self.weights.sum()
+        if total == 0:
+            return float('nan')
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.r_[0.0, centers, total],
+                               np.r_[lo, self.means, hi]))
+
+
+# ── Distinct count: exact set, then HyperLogLog ───────────────────────────
+@dataclass
+class DistinctCounter:
+    """Exact while small; HyperLogLog registers are kept all along so the
+    switch-over loses nothing."""
+    registers: np.ndarray = field(
+        default_factory=lambda: np.zeros(1 << PROFILE_HLL_PRECISION, dtype=np.uint8))
+    exact: set | None = field(default_factory=set)
+
+    @classmethod
+    def from_hashes(cls, hashes: np.ndarray) -> 'DistinctCounter':
+        counter = cls()
+        counter._add(np.asarray(hashes, dtype=np.uint64))
+        return counter
+
+    def _add(self, hashes: np.ndarray) -> None:
+        p = PROFILE_HLL_PRECISION
+        idx = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes << np.uint64(p)
+        # Position of the leftmost 1 bit in the remaining 64 - p bits
+        _, exp = np.frexp(rest.astype(np.float64))
+        rho = np.clip(65 - exp, 1, 64 - p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+        if self.exact is not None:
+            self.exact.update(np.unique(hashes).tolist())
+            if len(self.exact) > PROFILE_EXACT_DISTINCT:
+                self.exact = None
+
+    def merge(self, other: 'DistinctCounter') -> 'DistinctCounter':
+        exact = None
+        if self.exact is not None and other.exact is not None:
+            exact = self.exact | other.exact
+            if len(exact) > PROFILE_EXACT_DISTINCT:
+                exact = None
+        return DistinctCounter(np.maximum(self.registers, other.registers), exact)
+
+    def count(self) -> int:
+        if self.exact is not None:
+            return len(self.exact)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)   # Linear counting for small sets
+        return int(round(estimate))
+
+
+# ── Per-column and whole-frame profiles ───────────────────────────────────
+@dataclass
+class ColumnProfile:
+    name: str
+    dtype: str
+    numeric: bool
+    count: int = 0            # Non-null values
+    nulls: int = 0
+    mean: float = 0.0
+    m2: float = 0.0           # Sum of squared deviations from the mean
+    min: float = float('nan')
+    max: float = float('nan')
+    sketch: QuantileSketch | None = None
+    distinct: DistinctCounter | None = None
+    sample: list = field(default_factory=list)
+
+    @classmethod
+    def from_series(cls, s: pd.Series) -> 'ColumnProfile':
+        if _is_numeric(s):
+            return Profile.from_frame(s.to_frame(), '').columns[str(s.name)]
+        col = cls(str(s.name), str(s.dtype), False)
+        present = s.dropna()
+        col.count = len(present)
+        col.nulls = len(s) - col.count
+        col.distinct = DistinctCounter.from_hashes(
+            pd.util.hash_pandas_object(present, index=False).to_numpy())
+        col.sample = present.unique()[:SAMPLE_VALUES].tolist()
+        return col
+
+    def merge(self, other: 'ColumnProfile') -> 'ColumnProfile':
+        """Combine with the profile of later rows of the same column."""
+        out = ColumnProfile(self.name, other.dtype, self.numeric,
+                            self.count + other.count, self.nulls + other.nulls)
+        if self.numeric:
+            n = out.count
+            if n:
+                delta = other.mean - self.mean
+                out.mean = self.mean + delta * other.count / n
+                out.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / n
+            out.min = float(np.nanmin([self.min, other.min])) if n else float('nan')
+            out.max = float(np.nanmax([self.max, other.max])) if n else float('nan')
+            out.sketch = self.sketch.merge(other.sketch)
+        else:
+            out.distinct = self.distinct.merge(other.distinct)
+            out.sample = list(self.sample)
+            for v in other.sample:
+                if len(out.sample) >= SAMPLE_VALUES:
+                    break
+                if v not in out.sample:
+                    out.sample.append(v)
+        return out
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+    @property
+    def median(self) -> float:
+        return self.sketch.quantile(0.5, self.min, self.max)
+
+    @property
+    def unique(self) -> int:
+        return self.distinct.count()
+
+
+@dataclass
+class Profile:
+    """Mergeable statistics for a whole DataFrame.
+
+    Correlations come from pairwise co-moment sums over a fixed per-column
+    shift (the first chunk's means), so they merge by plain addition.
+    """
+    rows: int
+    columns: dict[str, ColumnProfile]
+    digest: str               # Hash of the per-row hashes this profile covers
+    numeric: list[str]
+    shift: np.ndarray
+    pair_n: np.ndarray        # rows where both columns are present
+    pair_sx: np.ndarray       # [i, j]: sum of x_i over those rows
+    pair_sxx: np.ndarray      # [i, j]: sum of x_i² over those rows
+    pair_sxy: np.ndarray      # [i, j]: sum of x_i·x_j
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, digest: str,
+                   shift: np.ndarray | None = None) -> 'Profile':
+        """Profile df in one pass over its numeric block.
+
+        Counts, means, variances and correlations all fall out of the same
+        co-moment matrix products; only the quantile sketches need a
+        per-column sort, and text columns a per-column hash.
+        """
+        numeric = [c for c in df.columns if _is_numeric(df[c])]
+        x = df[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        mask = ~np.isnan(x)
+        counts = mask.sum(axis=0)
+        complete = bool(counts.min(initial=len(df)) == len(df))
+        if shift is None:
+            filled = x if complete else np.where(mask, x, 0.0)
+            shift = filled.sum(axis=0) / np.maximum(counts, 1)
+        if complete:
+            # No missing values: every pair covers every row, so a single
+            # matrix product gives all co-moments
+            xs = x - shift
+            pair_sxy = xs.T @ xs
+            k = len(numeric)
+            pair_n = np.full((k, k), float(len(df)))
+            pair_sx = np.repeat(xs.sum(axis=0)[:, None], k, axis=1)
+            pair_sxx = np.repeat(np.diag(pair_sxy)[:, None], k, axis=1)
+            lo, hi = x.min(axis=0, initial=np.inf), x.max(axis=0, initial=-np.inf)
+        else:
+            xs = np.where(mask, x - shift, 0.0)
+            m = mask.astype(np.float64)
+            pair_n, pair_sx = m.T @ m, xs.T @ m
+            pair_sxx, pair_sxy = (xs * xs).T @ m, xs.T @ xs
+            lo = np.where(mask, x, np.inf).min(axis=0, initial=np.inf)
+            hi = np.where(mask, x, -np.inf).max(axis=0, initial=-np.inf)
+
+        # Per-column moments are the diagonals — no further scans needed
+        sx, sxx = np.diag(pair_sx), np.diag(pair_sxx)
+        n = np.maximum(counts, 1)
+        means = shift + sx / n
+        m2 = np.maximum(sxx - sx * sx / n, 0.0)
+
+        columns: dict[str, ColumnProfile] = {}
+        position = {c: i for i, c in enumerate(numeric)}
+        for c in df.columns:
+            i = position.get(c)
+            if i is None:
+                columns[str(c)] = ColumnProfile.from_series(df[c])
+                continue
+            present = bool(counts[i])
+            columns[str(c)] = ColumnProfile(
+                str(c), str(df[c].dtype), True,
+                count=int(counts[i]), nulls=len(df) - int(counts[i]),
+                mean=float(means[i]) if present else 0.0,
+                m2=float(m2[i]),
+                min=float(lo[i]) if present else float('nan'),
+                max=float(hi[i]) if present else float('nan'),
+                sketch=QuantileSketch.from_values(x[:, i] if complete
+                                                  else x[mask[:, i], i]),
+            )
+        return cls(len(df), columns, digest, [str(c) for c in numeric], shift,
+                   pair_n, pair_sx, pair_sxx, pair_sxy)
+
+    def merge(self, other: 'Profile', digest: str) -> 'Profile':
+        """Profile of these rows followed by other's (built with our shift)."""
+        return Profile(
+            self.rows + other.rows,
+            {name: col.merge(other.columns[name]) for name, col in self.columns.items()},
+            digest, self.numeric, self.shift,
+            self.pair_n + other.pair_n, self.pair_sx + other.pair_sx,
+            self.pair_sxx + other.pair_sxx, self.pair_sxy + other.pair_sxy,
+        )
+
+    def corr(self) -> pd.DataFrame:
+        """Pairwise-complete Pearson correlations, as DataFrame.corr()."""
+        n = self.pair_n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mx, my = self.pair_sx / n, self.pair_sx.T / n
+            cov = self.pair_sxy / n - mx * my
+            vx = self.pair_sxx / n - mx ** 2
+            vy = self.pair_sxx.T / n - my ** 2
+            r = np.clip(cov / np.sqrt(vx * vy), -1.0, 1.0)
+        np.fill_diagonal(r, 1.0)
+        r[n < 2] = np.nan
+        return pd.DataFrame(r, index=self.numeric, columns=self.numeric)
+
+    def schema(self) -> list[tuple[str, str]]:
+        return [(c.name, c.dtype) for c in self.columns.values()]
+
+    @property
+    def nulls(self) -> int:
+        """Missing cells across the whole frame."""
+        return sum(c.nulls for c in self.columns.values())
+
+    def column(self, name: str) -> ColumnProfile | None:
+        return self.columns.get(str(name))
+
+
+def _is_numeric(s: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One uint64 per row (index included), for change and append checks."""
+    return pd.util.hash_pandas_object(df).to_numpy()
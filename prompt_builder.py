@@ -0,0 +1,58 @@
+# prompt_builder.py — token counting and budgeted context assembly
+import math
+import re
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count without loading a tokenizer.
+
+    Words and punctuation each count as one token, and long runs of
+    characters at least one per four characters — close enough to the
+    7B model's tokenizer for budgeting.
+    """
+    return max(len(_TOKEN_RE.findall(text)), math.ceil(len(text) / 4))
+
+
+def _truncate(chunk: str, budget: int) -> str:
+    """Cut a chunk to fit budget tokens, keeping whole lines if possible."""
+    lines = chunk.splitlines()
+    if len(lines) > 1:
+        kept = []
+        for line in lines:
+            if count_tokens('\n'.join(kept + [line, '…'])) > budget:
+                break
+            kept.append(line)
+        if kept:
+            return '\n'.join(kept + ['…'])
+    # Single long line (e.g. a wide column list): cut by characters
+    text = chunk[:budget * 4]
+    while text and count_tokens(text + ' …') > budget:
+        text = text[:int(len(text) * 0.9)]
+    return text + ' …' if text else ''
+
+
+def build_context(chunks: list[str], budget: int,
+                  min_chunk: int = 24) -> tuple[str, int]:
+    """Join chunks (most relevant first) into at most budget tokens.
+
+    Whole chunks are kept in order while they fit; the first one that
+    doesn't is truncated if at least min_chunk tokens remain, and the
+    rest are dropped. Returns (context text, token count).
+    """
+    kept: list[str] = []
+    used = 0
+    for chunk in chunks:
+        cost = count_tokens(chunk) + 1          # +1 for the separator
+        if used + cost <= budget:
+            kept.append(chunk)
+            used += cost
+            continue
+        if budget - used >= min_chunk:
+            cut = _truncate(chunk, budget - used - 1)
+            if cut:
+                kept.append(cut)
+        break
+    text = '\n\n'.join(kept)
+    return text, count_tokens(text)
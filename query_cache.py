@@ -0,0 +1,128 @@
+# query_cache.py — semantic answer cache + generated-code cache
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_MAX_ENTRIES,
+    CODE_CACHE_MAX_ENTRIES,
+)
+from embed_cache import normalize_question
+
+
+@dataclass
+class _Answer:
+    index_id: str
+    question: str           # normalized
+    vector: np.ndarray      # L2-normalized question embedding
+    answer: dict
+    created: float
+
+
+# (index id, normalized question) → answer, least recently used first
+_answers: OrderedDict[tuple[str, str], _Answer] = OrderedDict()
+# (schema fingerprint, normalized question) → pandas code that ran cleanly
+_code: OrderedDict[tuple[str, str], str] = OrderedDict()
+_lock = threading.Lock()
+
+# Embeddings barely move when only a number or a negation changes
+# ("top 5" vs "top 10", "with" vs "without"), so those must match exactly
+_NEGATIONS = frozenset({"no", "non", "none", "nor", "not", "never",
+                        "without", "except", "excluding"})
+
+
+def _qualifiers(question: str) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Numbers (in order) and negation words (sorted) of a normalized question."""
+    numbers = tuple(re.findall(r"\d+(?:\.\d+)?", question))
+    words   = ("not" if w.endswith("n't") else w
+               for w in re.findall(r"[a-z']+", question))
+    return numbers, tuple(sorted(w for w in words if w in _NEGATIONS))
+
+
+def lookup_answer(index_id: str, question: str,
+                  vector: np.ndarray) -> dict | None:
+    """Previous answer on the same dataset for a near-identical question.
+
+    vector must be L2-normalized; a hit needs cosine >= ANSWER_CACHE_THRESHOLD
+    and the same numbers and negation words as the cached question.
+    """
+    now        = time.time()
+    normalized = normalize_question(question)
+    qualifiers = _qualifiers(normalized)
+    with _lock:
+        exact = _answers.get((index_id, normalized))
+        if exact is not None and now - exact.created <= ANSWER_CACHE_TTL:
+            best = exact
+        else:
+            keys, vecs = [], []
+            for key, entry in list(_answers.items()):
+                if now - entry.created > ANSWER_CACHE_TTL:
+                    del _answers[key]
+                elif (entry.index_id == index_id
+                      and _qualifiers(entry.question) == qualifiers):
+                    keys.append(key)
+                    vecs.append(entry.vector)
+            if not vecs:
+                return None
+            scores = np.vstack(vecs) @ vector
+            i = int(np.argmax(scores))
+            if scores[i] < ANSWER_CACHE_THRESHOLD:
+                return None
+            best = _answers[keys[i]]
+        _answers.move_to_end((best.index_id, best.question))
+        return best.answer
+
+
+def store_answer(index_id: str, question: str,
+                 vector: np.ndarray, answer: dict) -> None:
+    """Remember a successful answer, evicting the least recently used."""
+    key = (index_id, normalize_question(question))
+    with _lock:
+        _answers[key] = _Answer(index_id, key[1],
+                                np.asarray(vector, dtype=np.float32),
+                                answer, time.time())
+        _answers.move_to_end(key)
+        while len(_answers) > ANSWER_CACHE_MAX_ENTRIES:
+            _answers.popitem(last=False)
+
+
+def invalidate(index_id: str) -> None:
+    """Drop every cached answer for a dataset (e.g. its index was evicted)."""
+    with _lock:
+        for key in [k for k in _answers if k[0] == index_id]:
+            del _answers[key]
+
+
+# ── Generated code: valid for any data with the same schema ───────────────
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Hash of column names and dtypes — independent of the row values."""
+    sig = '|'.join(f'{c}:{t}' for c, t in df.dtypes.items())
+    return hashlib.md5(sig.encode('utf-8')).hexdigest()[:10]
+
+
+def lookup_code(schema: str, question: str) -> str | None:
+    """Code that previously answered this question on the same schema."""
+    key = (schema, normalize_question(question))
+    with _lock:
+        code = _code.get(key)
+        if code is not None:
+            _code.move_to_end(key)
+        return code
+
+
+def store_code(schema: str, question: str, code: str) -> None:
+    """Remember code that executed successfully, evicting the LRU entry."""
+    key = (schema, normalize_question(question))
+    with _lock:
+        _code[key] = code
+        _code.move_to_end(key)
+        while len(_code) > CODE_CACHE_MAX_ENTRIES:
+            _code.popitem(last=False)
@@ -1,40 +1,121 @@
 # rag_engine.py — RAG indexing & retrieval (ChromaDB-free for Py 3.14 compat)
 import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
 import numpy as np
 import pandas as pd
 
-from llm_client import get_embedding
+import embed_cache
+import query_cache
+from bm25 import BM25Index, rrf
+from config import RAG_MAX_INDEXES, RAG_RRF_K, ROW_INDEX_ENABLED, ROW_INDEX_TOP_K
+from llm_client import get_embedding, get_embeddings, priority
+from profiler import Profile, row_hashes
+from row_index import build_row_index, get_row_index
+
+
+@dataclass
+class RagIndex:
+    """Chunks of one dataset and their L2-normalized float32 embeddings."""
+    docs: list[str]
+    embeddings: np.ndarray
+    profile: Profile | None = None   # Reused when rows are appended later
+    lexical: BM25Index | None = None  # Exact-term matches on the same docs
+
 
-_docs: list[str] = []
-_embeddings: list[list[float]] = []
-_last_hash: str | None = None
+# Registry of warm indexes keyed by dataframe hash, least recently used first
+_indexes: OrderedDict[str, RagIndex] = OrderedDict()
+_lock = threading.Lock()
 
 
 def _hash(df: pd.DataFrame) -> str:
     """Short hash to detect if CSV content changed."""
-    return hashlib.md5(pd.util.hash_pandas_object(df).values).hexdigest()[:10]
+    return _digest(row_hashes(df))
+
+
+def _digest(hashes: np.ndarray) -> str:
+    return hashlib.md5(hashes).hexdigest()[:10]
+
+
+def _profile(df: pd.DataFrame, hashes: np.ndarray) -> Profile:
+    """Profile df, extending a warm index's profile if df only appends rows.
+
+    An earlier profile covering n rows is reused when df has the same
+    columns and its first n row hashes match — then only the new rows
+    are scanned.
+    """
+    with _lock:
+        bases = [ix.profile for ix in _indexes.values() if ix.profile is not None]
+    digest = _digest(hashes)
+    for base in sorted(bases, key=lambda p: p.rows, reverse=True):
+        if (base.rows >= len(df)
+                or list(base.columns) != [str(c) for c in df.columns]
+                or _digest(hashes[:base.rows]) != base.digest):
+            continue
+        tail = Profile.from_frame(df.iloc[base.rows:], '', base.shift)
+        if all(tail.columns[c].numeric == base.columns[c].numeric for c in base.columns):
+            return base.merge(tail, digest)
+    return Profile.from_frame(df, digest)
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (or a single vector) so dot product == cosine."""
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+def _embed_docs(docs: list[str]) -> np.ndarray:
+    """Embed chunks, reusing vectors from the on-disk cache where possible."""
+    vectors = embed_cache.get_many(docs)
+    missing = [i for i in range(len(docs)) if i not in vectors]
+    if missing:
+        texts = [docs[i] for i in missing]
+        with priority("reindex"):
+            fresh = get_embeddings(texts)
+        embed_cache.put_many(texts, fresh)
+        vectors.update(zip(missing, fresh))
+    return np.vstack([vectors[i] for i in range(len(docs))])
 
 
-def _cosine_similarity(a: list[float], b: list[float]) -> float:
-    """Compute cosine similarity between two vectors."""
-    a_np = np.array(a, dtype=np.float32)
-    b_np = np.array(b, dtype=np.float32)
-    dot = np.dot(a_np, b_np)
-    norm = np.linalg.norm(a_np) * np.linalg.norm(b_np)
-    if norm == 0:
-        return 0.0
-    return float(dot / norm)
+def _embed_rows(texts: list[str]) -> np.ndarray:
+    """Embed row texts directly: they'd flood the chunk cache, and the
+    row index's own .npz file already persists them."""
+    with priority("reindex"):
+        return _normalize(get_embeddings(texts))
 
 
 def build_rag_index(df: pd.DataFrame) -> str:
-    """Index the entire CSV schema into an in-memory vector store."""
-    global _docs, _embeddings, _last_hash
+    """Index the entire CSV schema into an in-memory vector store.
 
-    h = _hash(df)
-    if h == _last_hash:
+    Returns the index id (dataframe hash) to pass to retrieve_context.
+    """
+    hashes = row_hashes(df)
+    h = _digest(hashes)
+    with _lock:
+        warm = h in _indexes
+        if warm:
+            _indexes.move_to_end(h)
+    if warm:
+        if ROW_INDEX_ENABLED:
+            build_row_index(h, df, _embed_rows)   # No-op unless a build failed
         return h  # Same file — skip rebuild
 
-    _last_hash = h
     new_docs: list[str] = []
 
     # ── Chunk 1: Overall schema summary ──────────────────────
@@ -44,32 +125,30 @@ def build_rag_index(df: pd.DataFrame) -> str:
     )
 
     # ── Chunk per column: name + type + stats ────────────────
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        nulls = int(df[col].isnull().sum())
-        null_pct = f'{nulls / len(df) * 100:.1f}%'
+    profile = _profile(df, hashes)
+    for col in profile.columns.values():
+        null_pct = f'{col.nulls / len(df) * 100:.1f}%'
 
-        if pd.api.types.is_numeric_dtype(df[col]):
+        if col.numeric:
+            mean = col.mean if col.count else float('nan')
             chunk = (
-                f'Column {col}: numeric ({dtype}), '
-                f'min={df[col].min():.4g}, max={df[col].max():.4g}, '
-                f'mean={df[col].mean():.4g}, std={df[col].std():.4g}, '
-                f'median={df[col].median():.4g}, '
-                f'nulls={nulls} ({null_pct})'
+                f'Column {col.name}: numeric ({col.dtype}), '
+                f'min={col.min:.4g}, max={col.max:.4g}, '
+                f'mean={mean:.4g}, std={col.std:.4g}, '
+                f'median={col.median:.4g}, '
+                f'nulls={col.nulls} ({null_pct})'
             )
         else:
-            vals = df[col].dropna().unique()[:6].tolist()
             chunk = (
-                f'Column {col}: categorical ({dtype}), '
-                f'unique={df[col].nunique()}, sample={vals}, '
-                f'nulls={nulls} ({null_pct})'
+                f'Column {col.name}: categorical ({col.dtype}), '
+                f'unique={col.unique}, sample={col.sample}, '
+                f'nulls={col.nulls} ({null_pct})'
             )
         new_docs.append(chunk)
 
     # ── Chunk: Top correlations (numeric columns only) ───────
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    if len(numeric_cols) >= 2:
-        corr = df[numeric_cols].corr().unstack()
+    if len(profile.numeric) >= 2:
+        corr = profile.corr().unstack()
         top = corr[corr.abs() < 1].abs().nlargest(6)
         corr_str = 'Top correlations: ' + ', '.join(
             f'{a}↔{b}={v:.2f}' for (a, b), v in top.items()
@@ -79,33 +158,100 @@ def build_rag_index(df: pd.DataFrame) -> str:
     # ── Chunk: Sample rows ───────────────────────────────────
     new_docs.append('Sample data rows:\n' + df.head(4).to_string(index=False))
 
-    # ── Embed all chunks ─────────────────────────────────────
-    new_embeddings: list[list[float]] = []
-    for d in new_docs:
-        new_embeddings.append(get_embedding(d))
+    # ── Embed chunks (cached/batched, stored pre-normalized) ─
+    # Chunks whose text didn't change after an append hit the cache
+    new_embeddings = _normalize(_embed_docs(new_docs))
 
-    _docs = new_docs
-    _embeddings = new_embeddings
+    # ── Lexical index: column chunks titled by their column name ─
+    titles = [''] * len(new_docs)
+    for i, col in enumerate(profile.columns.values(), start=1):
+        titles[i] = col.name
+    lexical = BM25Index.build(new_docs, titles)
+
+    with _lock:
+        _indexes[h] = RagIndex(new_docs, new_embeddings, profile, lexical)
+        _indexes.move_to_end(h)
+        while len(_indexes) > RAG_MAX_INDEXES:
+            evicted, _ = _indexes.popitem(last=False)
+            query_cache.invalidate(evicted)
+
+    if ROW_INDEX_ENABLED:
+        # Rows are embedded in the background; retrieval uses them once ready
+        build_row_index(h, df, _embed_rows)
     return h
 
 
-def retrieve_context(question: str, n: int = 4) -> str:
-    """Find top-n most relevant chunks by cosine similarity."""
-    if not _docs:
+def get_index(index_id: str | None) -> RagIndex | None:
+    """Look up a warm index by id (None if unknown, evicted or no id).
+
+    Indexes are shared by every session in the process, so there is no
+    "current" one — each caller passes the id build_rag_index gave it.
+    """
+    if index_id is None:
+        return None
+    with _lock:
+        index = _indexes.get(index_id)
+        if index is not None:
+            _indexes.move_to_end(index_id)
+        return index
+
+
+def get_profile(index_id: str | None) -> Profile | None:
+    """Column statistics computed while indexing, for reuse elsewhere
+    (None without an id — callers fall back to scanning their own df)."""
+    index = get_index(index_id)
+    return index.profile if index is not None else None
+
+
+def embed_question(question: str) -> np.ndarray:
+    """Normalized question embedding, served from the query cache if possible."""
+    vec = embed_cache.get_query(question)
+    if vec is None:
+        vec = _normalize(get_embedding(question))
+        embed_cache.put_query(question, vec)
+    return vec
+
+
+def retrieve_chunks(question: str, n: int = 4,
+                    index_id: str | None = None) -> list[str]:
+    """Top-n chunks of an index, most relevant first ([] if no index).
+
+    Raises if the question can't be embedded.
+    """
+    index = get_index(index_id)
+    if index is None:
+        return []
+    # One mat-vec product over the normalized matrix ...
+    query = embed_question(question)
+    scores = index.embeddings @ query
+    if index.lexical is None:
+        top = _top_k(scores, n)
+    else:
+        # ... fused with BM25 so exact column names / values rank first
+        lexical = index.lexical.scores(question)
+        fused = rrf([scores.astype(np.float64),
+                     np.where(lexical > 0, lexical, np.nan)], RAG_RRF_K)
+        top = np.lexsort((-scores, -fused))[:n]   # Ties go to the closer vector
+    chunks = [index.docs[i] for i in top]
+
+    rows = get_row_index(index_id)
+    if rows is not None:
+        matches = rows.search(query, ROW_INDEX_TOP_K)
+        if matches:
+            # Rank the rows chunk among the schema chunks by its best match
+            at = int(np.sum(scores[top] >= matches[0][1]))
+            chunks.insert(at, 'Matching rows:\n' + '\n'.join(t for t, _ in matches))
+    return chunks
+
+
+def retrieve_context(question: str, n: int = 4,
+                     index_id: str | None = None) -> str:
+    """Find top-n most relevant chunks of an index (vector + BM25 fused)."""
+    if get_index(index_id) is None:
         return 'No dataset loaded yet.'
 
     try:
-        q_emb = get_embedding(question)
+        chunks = retrieve_chunks(question, n, index_id)
     except Exception as e:
         return f'[RAG error: could not embed question — {e}]'
-
-    # Compute similarities and pick top-n
-    scores = [
-        (i, _cosine_similarity(q_emb, emb))
-        for i, emb in enumerate(_embeddings)
-    ]
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top = scores[:min(n, len(scores))]
-
-    chunks = [_docs[i] for i, _ in top]
     return '\n\n'.join(chunks)
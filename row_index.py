@@ -0,0 +1,212 @@
+# row_index.py — optional row-level embeddings with an IVF nearest-neighbour index
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    RAG_MAX_INDEXES,
+    ROW_INDEX_DIR,
+    ROW_INDEX_MAX_ROWS,
+    ROW_INDEX_NPROBE,
+    ROW_INDEX_RETRY_SECONDS,
+)
+
+log = logging.getLogger(__name__)
+
+_KMEANS_SAMPLE = 20_000   # Vectors used to train the coarse centroids
+_KMEANS_ITERS = 10
+
+
+@dataclass
+class IVFIndex:
+    """Inverted-file index over L2-normalized vectors.
+
+    Vectors are grouped by their nearest of ~√N centroids and stored
+    contiguously per list; a query scans only the nprobe closest lists.
+    """
+    centroids: np.ndarray    # (nlist, dim)
+    vectors: np.ndarray      # (N, dim), ordered by list
+    ids: np.ndarray          # Original row position of each stored vector
+    offsets: np.ndarray      # List i is vectors[offsets[i]:offsets[i + 1]]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None = None,
+              seed: int = 0) -> 'IVFIndex':
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        nlist = nlist or max(1, min(n, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(n, _KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(_KMEANS_ITERS):   # Spherical k-means on the sample
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        assign = np.concatenate([
+            np.argmax(vectors[i:i + 65536] @ centroids.T, axis=1)
+            for i in range(0, n, 65536)
+        ])
+        order = np.argsort(assign, kind='stable')
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+        return cls(centroids.astype(np.float32), vectors[order], order, offsets)
+
+    def search(self, query: np.ndarray, k: int,
+               nprobe: int = ROW_INDEX_NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        """(row ids, scores) of the k best matches, best first."""
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        spans = [np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists]
+        candidates = np.concatenate(spans) if spans else np.zeros(0, dtype=np.intp)
+        if not len(candidates):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32)
+        scores = self.vectors[candidates] @ query
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return self.ids[candidates[best]], scores[best]
+
+
+@dataclass
+class RowIndex:
+    texts: list[str]
+    ivf: IVFIndex
+
+    def search(self, query: np.ndarray, k: int) -> list[tuple[str, float]]:
+        ids, scores = self.ivf.search(query, k)
+        return [(self.texts[i], float(s)) for i, s in zip(ids, scores)]
+
+
+# index id → RowIndex, least recently used first; builds run one at a time
+_rows: OrderedDict[str, RowIndex] = OrderedDict()
+_pending: dict[str, Future] = {}
+# Failed builds (when, df, embed), retried after ROW_INDEX_RETRY_SECONDS
+_failed: OrderedDict[str, tuple[float, pd.DataFrame, Callable]] = OrderedDict()
+_lock = threading.Lock()
+_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='row-index')
+
+
+def row_texts(df: pd.DataFrame) -> list[str]:
+    """'col=value, ...' per row, skipping missing values."""
+    parts = [
+        (f'{col}=' + df[col].astype(str)).where(df[col].notna(), '')
+        for col in df.columns
+    ]
+    joined = parts[0].str.cat(parts[1:], sep=', ') if len(parts) > 1 else parts[0]
+    return joined.str.replace(r'(, )+', ', ', regex=True).str.strip(', ').tolist()
+
+
+def _path(index_id: str) -> str:
+    return os.path.join(ROW_INDEX_DIR, f'{index_id}.npz')
+
+
+def _save(index_id: str, index: RowIndex) -> None:
+    os.makedirs(ROW_INDEX_DIR, exist_ok=True)
+    encoded = [t.encode('utf-8') for t in index.texts]
+    bounds = np.cumsum([0] + [len(b) for b in encoded])
+    tmp = _path(index_id) + '.tmp.npz'
+    np.savez(tmp, centroids=index.ivf.centroids, vectors=index.ivf.vectors,
+             ids=index.ivf.ids, offsets=index.ivf.offsets,
+             text=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+             text_bounds=bounds)
+    os.replace(tmp, _path(index_id))
+
+
+def _load(index_id: str) -> RowIndex | None:
+    try:
+        with np.load(_path(index_id)) as f:
+            blob, bounds = f['text'].tobytes(), f['text_bounds']
+            texts = [blob[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+            ivf = IVFIndex(f['centroids'], f['vectors'], f['ids'], f['offsets'])
+    except (OSError, KeyError, ValueError):
+        return None
+    return RowIndex(texts, ivf)
+
+
+def _remember(index_id: str, index: RowIndex) -> None:
+    with _lock:
+        _rows[index_id] = index
+        _rows.move_to_end(index_id)
+        while len(_rows) > RAG_MAX_INDEXES:
+            _rows.popitem(last=False)
+
+
+def _build(index_id: str, df: pd.DataFrame,
+           embed: Callable[[list[str]], np.ndarray]) -> None:
+    try:
+        index = _load(index_id)
+        if index is None:
+            rows = df
+            if len(rows) > ROW_INDEX_MAX_ROWS:
+                rows = rows.sample(ROW_INDEX_MAX_ROWS, random_state=0).sort_index()
+            texts = row_texts(rows)
+            index = RowIndex(texts, IVFIndex.build(embed(texts)))
+            try:
+                _save(index_id, index)
+            except OSError:
+                pass   # Persistence is best-effort
+        _remember(index_id, index)
+    except Exception:
+        # Nobody waits on the future — log, and let a later call retry
+        log.exception("Row index build for %s failed; will retry", index_id)
+        with _lock:
+            _failed[index_id] = (time.monotonic(), df, embed)
+            while len(_failed) > RAG_MAX_INDEXES:
+                _failed.popitem(last=False)
+    finally:
+        with _lock:
+            _pending.pop(index_id, None)
+
+
+def _submit(index_id: str, df: pd.DataFrame,
+            embed: Callable[[list[str]], np.ndarray]) -> Future:
+    """Queue a build; caller holds _lock."""
+    _failed.pop(index_id, None)
+    future = _POOL.submit(_build, index_id, df, embed)
+    _pending[index_id] = future
+    return future
+
+
+def build_row_index(index_id: str, df: pd.DataFrame,
+                    embed: Callable[[list[str]], np.ndarray]) -> Future | None:
+    """Start indexing df's rows in the background (or load them from disk).
+
+    embed must return L2-normalized float32 vectors, one per text.
+    Returns the build future, or None if already built or building.
+    A build that failed earlier is retried.
+    """
+    if df.empty:
+        return None
+    with _lock:
+        if index_id in _rows or index_id in _pending:
+            return None
+        return _submit(index_id, df, embed)
+
+
+def get_row_index(index_id: str | None) -> RowIndex | None:
+    """A ready row index, or None while it's still building (or disabled).
+
+    A failed build is resubmitted once ROW_INDEX_RETRY_SECONDS have passed.
+    """
+    if index_id is None:
+        return None
+    with _lock:
+        index = _rows.get(index_id)
+        if index is not None:
+            _rows.move_to_end(index_id)
+            return index
+        failed = _failed.get(index_id)
+        if (failed is not None and index_id not in _pending
+                and time.monotonic() - failed[0] >= ROW_INDEX_RETRY_SECONDS):
+            _submit(index_id, *failed[1:])
+        return None
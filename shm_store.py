@@ -0,0 +1,160 @@
+# shm_store.py — publish dataframes once in shared memory for sandbox workers
+import atexit
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import SHM_MAX_DATASETS
+
+_ALIGN = 64
+
+
+@dataclass
+class _Column:
+    name: object
+    kind: str              # "array" (raw values) or "text" (codes + labels)
+    dtype: str             # dtype of the stored buffer
+    original: object       # dtype to restore in the worker
+    offset: int
+    length: int
+    labels: object = None  # Distinct values of a "text" column
+
+
+@dataclass
+class Manifest:
+    """Where each column lives in one shared-memory segment.
+
+    Small enough to send to a worker once; the column data is never copied
+    through the pipe.
+    """
+    name: str
+    rows: int
+    columns: list[_Column] = field(default_factory=list)
+    index: object = None   # RangeIndex args, or a pickled index
+
+
+def _plan(df: pd.DataFrame) -> tuple[list[tuple[_Column, np.ndarray]], int]:
+    """Decide each column's buffer and its offset in the segment."""
+    plan, offset = [], 0
+    for name in df.columns:
+        s = df[name]
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in 'biufmM':
+            values = s.to_numpy()
+            col = _Column(name, 'array', values.dtype.str, s.dtype, offset, len(values))
+        else:
+            # Text / categorical: int32 codes in shared memory, labels in the manifest
+            codes, labels = pd.factorize(s, use_na_sentinel=True)
+            values = codes.astype(np.int32)
+            col = _Column(name, 'text', values.dtype.str, s.dtype, offset, len(values),
+                          labels)
+        plan.append((col, values))
+        offset += -(-values.nbytes // _ALIGN) * _ALIGN
+    return plan, max(offset, 1)
+
+
+def _fits(size: int) -> bool:
+    """Writing past /dev/shm's free space would SIGBUS the server."""
+    try:
+        st = os.statvfs('/dev/shm')
+    except (OSError, AttributeError):
+        return True   # Not Linux tmpfs — shared_memory reports errors normally
+    return size < st.f_bavail * st.f_frsize * 0.8
+
+
+def _create(key: str, df: pd.DataFrame) -> tuple[shared_memory.SharedMemory, Manifest]:
+    plan, size = _plan(df)
+    if not _fits(size):
+        raise OSError('not enough shared memory for this dataset')
+    shm = shared_memory.SharedMemory(name=f'cdi_{key}_{os.getpid()}',
+                                     create=True, size=size)
+    for col, values in plan:
+        view = np.ndarray(values.shape, dtype=values.dtype,
+                          buffer=shm.buf, offset=col.offset)
+        view[:] = values
+    if isinstance(df.index, pd.RangeIndex):
+        index = ('range', df.index.start, df.index.stop, df.index.step)
+    else:
+        index = ('pickle', pickle.dumps(df.index))
+    return shm, Manifest(shm.name, len(df), [c for c, _ in plan], index)
+
+
+# key (rag_engine._hash) → (segment, manifest); owned by the server process
+_segments: OrderedDict[str, tuple[shared_memory.SharedMemory, Manifest]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def publish(key: str, df: pd.DataFrame) -> Manifest:
+    """Copy df into shared memory once per key; later calls are free.
+
+    Raises OSError if shared memory is unavailable or too small.
+    """
+    with _lock:
+        entry = _segments.get(key)
+        if entry is None:
+            entry = _create(key, df)
+            _segments[key] = entry
+        _segments.move_to_end(key)
+        while len(_segments) > SHM_MAX_DATASETS:
+            _, (old, _) = _segments.popitem(last=False)
+            _release(old)
+        return entry[1]
+
+
+def _release(shm: shared_memory.SharedMemory) -> None:
+    # Workers already attached keep their mapping until they drop it
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@atexit.register
+def release_all() -> None:
+    with _lock:
+        while _segments:
+            _, (shm, _) = _segments.popitem()
+            _release(shm)
+
+
+# ── Worker side ───────────────────────────────────────────────────────────
+def _open(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment the server owns (and will unlink)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers; workers share the server's
+        # resource tracker, so this only repeats the server's registration
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach(manifest: Manifest) -> tuple[pd.DataFrame, shared_memory.SharedMemory]:
+    """Rebuild the DataFrame over the shared buffers.
+
+    Numeric columns are read-only views (no copy); text columns are
+    decoded from their codes once. Keep the returned segment referenced
+    for as long as the frame is in use.
+    """
+    shm = _open(manifest.name)
+    if manifest.index[0] == 'range':
+        index = pd.RangeIndex(*manifest.index[1:])
+    else:
+        index = pickle.loads(manifest.index[1])
+    data = {}
+    for col in manifest.columns:
+        values = np.ndarray((col.length,), dtype=np.dtype(col.dtype),
+                            buffer=shm.buf, offset=col.offset)
+        values.flags.writeable = False
+        if col.kind == 'array':
+            data[col.name] = values
+        else:
+            labels = pd.Index(col.labels)
+            decoded = labels.take(values, allow_fill=True, fill_value=np.nan)
+            data[col.name] = pd.Series(decoded, index=index).astype(col.original)
+    return pd.DataFrame(data, index=index, copy=False), shm
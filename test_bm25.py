@@ -0,0 +1,70 @@
+"""Tests for bm25.py — lexical scoring and rank fusion."""
+import unittest
+
+import numpy as np
+
+from bm25 import BM25Index, rrf, tokenize
+
+
+class TestTokenize(unittest.TestCase):
+    """Word splitting used for both documents and queries."""
+
+    def test_camel_case_split(self) -> None:
+        """camelCase names should yield the whole word and its parts."""
+        self.assertEqual(tokenize('TotalCharges'), ['totalcharges', 'total', 'charges'])
+
+    def test_acronyms_and_digits(self) -> None:
+        """Acronyms and digits should be separate parts."""
+        self.assertEqual(tokenize('customerID'), ['customerid', 'customer', 'id'])
+        self.assertEqual(tokenize('PhoneService2'), ['phoneservice2', 'phone', 'service', '2'])
+
+    def test_punctuation_dropped(self) -> None:
+        """Quotes, brackets and commas should not become tokens."""
+        self.assertEqual(tokenize("['Fiber optic', 'DSL']"), ['fiber', 'optic', 'dsl'])
+
+
+class TestBM25(unittest.TestCase):
+    """BM25 ranking over schema chunks and reciprocal-rank fusion."""
+
+    def setUp(self) -> None:
+        self.docs = [
+            "Dataset has 3 columns. Column names: ['tenure', 'InternetService', 'TotalCharges']",
+            'Column tenure: numeric (int64), min=0, max=72',
+            "Column InternetService: categorical (str), sample=['DSL', 'Fiber optic', 'No']",
+            'Column TotalCharges: numeric (float64), min=18.8, max=8685',
+        ]
+        self.titles = ['', 'tenure', 'InternetService', 'TotalCharges']
+
+    def test_column_name_ranks_its_chunk_first(self) -> None:
+        """A column's own chunk should outrank chunks that mention it."""
+        index = BM25Index.build(self.docs, self.titles)
+        self.assertEqual(int(np.argmax(index.scores('total charges by contract'))), 3)
+        self.assertEqual(int(np.argmax(index.scores('TotalCharges'))), 3)
+
+    def test_values_match(self) -> None:
+        """Category values in a question should find their column."""
+        index = BM25Index.build(self.docs, self.titles)
+        self.assertEqual(int(np.argmax(index.scores('customers on fiber optic'))), 2)
+
+    def test_no_shared_terms_scores_zero(self) -> None:
+        """A query with no known terms should score every chunk 0."""
+        index = BM25Index.build(self.docs)
+        self.assertFalse(index.scores('zzz').any())
+
+    def test_rrf(self) -> None:
+        """Fused scores should sum 1 / (k + rank), skipping unranked NaNs."""
+        fused = rrf([np.array([0.9, 0.5, 0.7]),
+                     np.array([np.nan, np.nan, 3.0])], k=60)
+        self.assertEqual(int(np.argmax(fused)), 2)
+        self.assertAlmostEqual(fused[0], 1 / 61)
+        self.assertAlmostEqual(fused[2], 1 / 62 + 1 / 61)
+
+    def test_rrf_ties_share_rank(self) -> None:
+        """Equal scores should share a rank."""
+        fused = rrf([np.array([0.5, 0.5, 0.1])], k=60)
+        self.assertEqual(fused[0], fused[1])
+        self.assertAlmostEqual(fused[2], 1 / 63)
+
+
+if __name__ == '__main__':
+    unittest.main()
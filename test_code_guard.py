@@ -0,0 +1,154 @@
+"""Tests for code_guard.py — rewriting and pricing generated code."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import code_guard
+from executor import run_code
+
+
+class TestVectorize(unittest.TestCase):
+    """Row-wise apply lambdas rewritten over whole columns."""
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({
+            'a': rng.integers(0, 10, 50),
+            'b': rng.random(50),
+            'c': rng.choice(['x', 'y'], 50),
+        })
+
+    def _same_result(self, code: str) -> None:
+        """Rewritten code should drop apply and compute the same values."""
+        rewritten = code_guard.vectorize(code, self.df)
+        self.assertNotIn('apply', rewritten)
+        expected, _ = run_code(code, self.df.copy())
+        actual, error = run_code(rewritten, self.df.copy())
+        self.assertIsNone(error)
+        np.testing.assert_allclose(np.asarray(actual, dtype=float),
+                                   np.asarray(expected, dtype=float))
+
+    def test_arithmetic(self) -> None:
+        """Arithmetic on row fields should become column arithmetic."""
+        self._same_result("result = df.apply(lambda r: r['a'] * r['b'] - 1, axis=1)")
+
+    def test_attribute_access_and_comparison(self) -> None:
+        """row.col access and comparisons should be rewritten."""
+        self._same_result("result = df.apply(lambda row: row.a > 5, axis='columns').sum()")
+
+    def test_conditional(self) -> None:
+        """if/else with and should become np.where over a mask."""
+        code = ("df['t'] = df.apply(lambda r: 1 if r['b'] > 0.5 and r['a'] < 5 else 0, axis=1)\n"
+                "result = df['t']")
+        self._same_result(code)
+
+    def test_narrow_integers_widened(self) -> None:
+        """An int8 column should not overflow where apply would not."""
+        self.df['a'] = (self.df['a'] * 10).astype('int8')
+        code = "result = df.apply(lambda r: r['a'] * 30, axis=1).max()"
+        self.assertIn("astype('int64')", code_guard.vectorize(code, self.df))
+        self._same_result(code)
+
+    def test_unsupported_lambda_left_alone(self) -> None:
+        """Lambdas that can't be vectorized should be left as they are."""
+        for code in ["result = df.apply(lambda r: r['c'].upper(), axis=1)",
+                     "result = df.apply(lambda r: r.sum(), axis=1)",
+                     "result = df.apply(lambda r: r['a'] in (1, 2), axis=1)",
+                     "result = df[df['a'] > 1].apply(lambda r: r['a'] + 1, axis=1)",
+                     "result = df.apply(lambda c: c.max())",
+                     "result = df.apply(lambda r: 1, axis=1)",
+                     "result = df.apply(lambda r: 'x' if 1 > 0 else 'y', axis=1)",
+                     "result = ("]:
+            self.assertEqual(code_guard.vectorize(code, self.df), code)
+
+
+class TestEstimate(unittest.TestCase):
+    """Static cost estimates from the dataframe's shape."""
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'a': np.arange(1_000_000), 'c': ['x', 'y'] * 500_000})
+
+    def test_vectorized_code_is_free(self) -> None:
+        """Plain vectorized code should have no estimated cost."""
+        self.assertEqual(code_guard.estimate("result = df.groupby('c')['a'].sum()",
+                                             self.df).seconds, 0)
+
+    def test_row_loops(self) -> None:
+        """iterrows should cost far more than itertuples."""
+        slow = code_guard.estimate(
+            "t = 0\nfor i, r in df.iterrows():\n    t += r['a']\nresult = t", self.df)
+        fast = code_guard.estimate("result = [r.a for r in df.itertuples()]", self.df)
+        self.assertGreater(slow.seconds, 10 * fast.seconds)
+        self.assertIn('iterrows', slow.worst)
+
+    def test_column_loops_are_cheap(self) -> None:
+        """df.items() walks columns, so it should pass on a large frame."""
+        code = ("out = {}\nfor col, s in df.items():\n"
+                "    out[col] = df[col].isna().sum()\nresult = out")
+        cost = code_guard.estimate(code, self.df)
+        self.assertLess(cost.seconds, 1.0)
+        self.assertEqual(code_guard.review(code, self.df), (code, None))
+
+    def test_series_items_is_a_row_loop(self) -> None:
+        """A column's items() walks every row."""
+        cost = code_guard.estimate(
+            "result = [df.loc[i, 'a'] for i, v in df['a'].items()]", self.df)
+        self.assertGreater(cost.seconds, 10)
+
+    def test_lookups_inside_loop(self) -> None:
+        """.loc lookups inside a row loop should be the main cost."""
+        cost = code_guard.estimate(
+            "result = sum(df.loc[i, 'a'] for i in range(len(df)))", self.df)
+        self.assertIn('.loc', cost.worst)
+
+    def test_nested_loop_is_quadratic(self) -> None:
+        """Whole-column work inside a row loop should grow quadratically."""
+        code = "result = [(df['a'] == v).sum() for v in df['a']]"
+        small = code_guard.estimate(code, self.df.head(1000)).seconds
+        self.assertGreater(code_guard.estimate(code, self.df.head(10_000)).seconds,
+                           50 * small)
+
+    def test_self_join_rows(self) -> None:
+        """A self-join's size should come from its key's value counts."""
+        cost = code_guard.estimate("result = df.merge(df, on='c')", self.df.head(100))
+        self.assertIn('5,000 rows', cost.worst)   # 2 keys × 50²
+
+    def test_join_with_aggregate_not_counted(self) -> None:
+        """Joins with derived frames should not be priced."""
+        code = "g = df.groupby('c')['a'].mean().reset_index()\nresult = df.merge(g, on='c')"
+        self.assertEqual(code_guard.estimate(code, self.df).seconds, 0)
+
+
+class TestReview(unittest.TestCase):
+    """Accepting, rewriting or rejecting code before it runs."""
+
+    def test_small_frames_pass(self) -> None:
+        """Slow patterns on small frames should be allowed."""
+        df = pd.DataFrame({'a': range(100)})
+        code = "t = 0\nfor i, r in df.iterrows():\n    t += r['a']\nresult = t"
+        self.assertEqual(code_guard.review(code, df), (code, None))
+
+    def test_slow_code_rejected(self) -> None:
+        """Code over the time budget should be rejected with advice."""
+        df = pd.DataFrame({'a': range(1_000_000)})
+        code = "t = 0\nfor i, r in df.iterrows():\n    t += r['a']\nresult = t"
+        _, error = code_guard.review(code, df)
+        self.assertIn('vectorized', error)
+
+    def test_cross_join_rejected_for_memory(self) -> None:
+        """A cross join that can't fit in memory should be rejected."""
+        df = pd.DataFrame({'a': range(100_000)})
+        _, error = code_guard.review("result = pd.merge(df, df, how='cross')", df)
+        self.assertIn('memory', error)
+
+    def test_rewritten_code_returned(self) -> None:
+        """review() should return the vectorized code."""
+        df = pd.DataFrame({'a': range(10)})
+        code, error = code_guard.review("result = df.apply(lambda r: r['a'] * 2, axis=1)", df)
+        self.assertIsNone(error)
+        self.assertEqual(code, "result = df['a'] * 2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -40,6 +40,12 @@ class TestConfigConstants(unittest.TestCase):
             self.assertGreaterEqual(t, 0.0)
             self.assertLessEqual(t, 2.0)
 
+    def test_backend_weights_positive(self) -> None:
+        """Every LLM backend needs a positive routing weight."""
+        from config import LLM_BACKENDS
+        for backend in LLM_BACKENDS:
+            self.assertGreater(backend.get('weight', 1.0), 0)
+
     def test_auto_questions_non_empty(self) -> None:
         """AUTO_QUESTIONS should be a non-empty list of strings."""
         from config import AUTO_QUESTIONS
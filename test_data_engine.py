@@ -0,0 +1,236 @@
+"""Tests for data_engine.py — LLM and RAG calls mocked."""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import data_engine
+
+
+def _fake_answer(df, question, history, index_id=None, cancel=None) -> dict:
+    """Answer with the question text, slower for earlier questions."""
+    delay = 0.05 * (5 - data_engine.AUTO_QUESTIONS.index(question))
+    time.sleep(delay)
+    return {"answer": question, "explanation": "ok", "code": "", "chart": None}
+
+
+class TestStreamAnswer(unittest.TestCase):
+    """Stage events emitted by stream_answer."""
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'a': [1, 2, 3]})
+        self.enterContext(patch('data_engine.get_index', return_value=object()))
+        self.enterContext(patch('data_engine.retrieve_chunks', return_value=['Column a']))
+        self.enterContext(patch('data_engine.generate_code',
+                                return_value='result = df["a"].sum()'))
+        self.enterContext(patch('data_engine.stream_explanation',
+                                return_value=iter(['The ', 'total ', 'is 6.'])))
+        self.enterContext(patch('data_engine.generate_explanation',
+                                return_value='The total is 6.'))
+        self.enterContext(patch('data_engine.auto_chart', return_value='fig'))
+        self.enterContext(patch('data_engine.embed_question',
+                                return_value=np.array([1.0, 0.0], dtype=np.float32)))
+        self.enterContext(patch.object(data_engine.query_cache, '_answers',
+                                       data_engine.query_cache.OrderedDict()))
+        self.enterContext(patch.object(data_engine.query_cache, '_code',
+                                       data_engine.query_cache.OrderedDict()))
+
+    def test_stage_order_and_tokens(self) -> None:
+        """The result should arrive before the explanation and chart."""
+        events = list(data_engine.stream_answer(self.df, 'total of a?', [], 'h'))
+        stages = [e['stage'] for e in events]
+        self.assertEqual(stages[:3], ['context', 'code', 'result'])
+        self.assertEqual(sorted(stages[3:-1]), ['chart'] + ['token'] * 3)
+        self.assertEqual(stages[-1], 'done')
+        self.assertEqual(events[2]['raw_result'], '6')
+        self.assertEqual(events[-1]['answer']['answer'], 'The total is 6.')
+        self.assertEqual(events[-1]['answer']['chart'], 'fig')
+
+    def test_answer_question_returns_final_answer(self) -> None:
+        """answer_question should return the "done" payload unstreamed."""
+        out = data_engine.answer_question(self.df, 'total of a?', [], 'h')
+        self.assertEqual(out['answer'], 'The total is 6.')
+        self.assertEqual(out['raw_result'], '6')
+        data_engine.stream_explanation.assert_not_called()
+
+    def test_failed_exec_goes_straight_to_done(self) -> None:
+        """A computation that fails twice should skip result/chart/tokens."""
+        with patch('data_engine.generate_code', return_value='result = df["zz"]'):
+            events = list(data_engine.stream_answer(self.df, 'q', [], 'h'))
+        self.assertEqual([e['stage'] for e in events], ['context', 'code', 'done'])
+        self.assertIsNone(events[-1]['answer']['raw_result'])
+
+    def test_slow_code_regenerated_without_running(self) -> None:
+        """Code estimated to be too slow should go to the retry prompt."""
+        slow = 'out = 0\nfor i, r in df.iterrows():\n    out += r["a"]\nresult = out'
+        with patch('data_engine.generate_code',
+                   side_effect=[slow, 'result = df["a"].sum()']) as gen, \
+             patch('data_engine._safe_exec', wraps=data_engine._safe_exec) as run, \
+             patch.dict('code_guard._COST', iterrows=100.0):   # 3 rows → 300s
+            out = data_engine.answer_question(self.df, 'sum a', [], 'h')
+        self.assertIn('iterrows', gen.call_args.kwargs['user'])
+        run.assert_called_once()
+        self.assertEqual(out['raw_result'], '6')
+
+    def test_repeat_question_served_from_cache(self) -> None:
+        """The second identical question should skip code generation."""
+        first = data_engine.answer_question(self.df, 'total of a?', [], 'h')
+        data_engine.generate_code.reset_mock()
+        events = list(data_engine.stream_answer(self.df, 'Total of a? ', [], 'h'))
+        data_engine.generate_code.assert_not_called()
+        self.assertEqual([e['stage'] for e in events],
+                         ['result', 'chart', 'token', 'done'])
+        self.assertEqual(events[-1]['answer']['answer'], first['answer'])
+
+    def test_same_schema_reuses_generated_code(self) -> None:
+        """New rows with the same schema should skip the code-gen call."""
+        data_engine.answer_question(self.df, 'total of a?', [], 'h')
+        data_engine.generate_code.reset_mock()
+        out = data_engine.answer_question(
+            pd.DataFrame({'a': [10, 20]}), 'total of a?', [], 'h2')
+        data_engine.generate_code.assert_not_called()
+        self.assertEqual(out['raw_result'], '30')
+
+    def test_failing_cached_code_falls_back_to_generation(self) -> None:
+        """Cached code that errors on new data should be regenerated."""
+        schema = data_engine.query_cache.schema_fingerprint(self.df)
+        data_engine.query_cache.store_code(schema, 'total of a?', 'result = df["zz"]')
+        out = data_engine.answer_question(self.df, 'total of a?', [], 'h')
+        data_engine.generate_code.assert_called_once()
+        self.assertEqual(out['code'], 'result = df["a"].sum()')
+        self.assertEqual(data_engine.query_cache.lookup_code(schema, 'total of a?'),
+                         'result = df["a"].sum()')
+
+    def test_chart_overlaps_explanation(self) -> None:
+        """Chart building should run while the explanation is generated."""
+        def slow_chart(question, result, df, profile=None):
+            time.sleep(0.2)
+            return 'fig'
+
+        def slow_explanation(system, user):
+            time.sleep(0.2)
+            return 'The total is 6.'
+
+        with patch('data_engine.auto_chart', side_effect=slow_chart), \
+             patch('data_engine.generate_explanation', side_effect=slow_explanation):
+            out = data_engine.answer_question(self.df, 'total of a?', [], 'h')
+        timings = out['timings']
+        self.assertEqual(out['chart'], 'fig')
+        self.assertGreaterEqual(timings['chart'], 0.2)
+        self.assertGreaterEqual(timings['explain'], 0.2)
+        self.assertLess(timings['total'], 0.35)
+        for stage in ('lookup', 'context', 'codegen', 'exec', 'serialize'):
+            self.assertIn(stage, timings)
+        self.assertEqual(sorted(out['prompt_tokens']), ['code', 'explain'])
+
+
+class TestRunAutoInsights(unittest.TestCase):
+    """Concurrent auto-insights keep order and isolate failures."""
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'a': [1, 2, 3]})
+        self.enterContext(patch('data_engine.get_index', return_value=object()))
+        self.enterContext(patch('data_engine.build_rag_index', return_value='h'))
+
+    @patch('data_engine.answer_question', side_effect=_fake_answer)
+    def test_preserves_question_order(self, _mock) -> None:
+        """Results should follow AUTO_QUESTIONS order, not finish order."""
+        insights = data_engine.run_auto_insights(self.df, 'h')
+        self.assertEqual([i['answer'] for i in insights],
+                         data_engine.AUTO_QUESTIONS)
+
+    def test_runs_concurrently(self) -> None:
+        """More than one question should be in flight at once."""
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow(df, question, history, index_id=None, cancel=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return {"answer": question, "explanation": "", "chart": None}
+
+        with patch('data_engine.answer_question', side_effect=slow):
+            data_engine.run_auto_insights(self.df, 'h')
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], data_engine.AUTO_INSIGHT_WORKERS)
+
+    def test_failure_and_timeout_are_isolated(self) -> None:
+        """One failing and one hanging question should not sink the rest."""
+        hang = threading.Event()
+
+        def flaky(df, question, history, index_id=None, cancel=None):
+            i = data_engine.AUTO_QUESTIONS.index(question)
+            if i == 0:
+                raise ValueError('boom')
+            if i == 1:
+                hang.wait(2)
+            return {"answer": question, "explanation": "", "chart": None}
+
+        with patch('data_engine.answer_question', side_effect=flaky), \
+             patch('data_engine.AUTO_INSIGHT_TIMEOUT', 0.2):
+            insights = data_engine.run_auto_insights(self.df, 'h')
+        hang.set()
+        self.assertEqual(insights[0]['answer'], 'Could not compute')
+        self.assertIn('boom', insights[0]['explanation'])
+        self.assertIn('Timed out', insights[1]['explanation'])
+        self.assertEqual(insights[2]['answer'], data_engine.AUTO_QUESTIONS[2])
+
+    def test_timeout_counts_from_question_start(self) -> None:
+        """Queued questions should not burn their timeout while waiting."""
+        def steady(df, question, history, index_id=None, cancel=None):
+            time.sleep(0.2)
+            return {"answer": question, "explanation": "", "chart": None}
+
+        with patch('data_engine.answer_question', side_effect=steady), \
+             patch('data_engine.AUTO_INSIGHT_TIMEOUT', 0.5):
+            insights = data_engine.run_auto_insights(self.df, 'h')
+        self.assertEqual([i['answer'] for i in insights],
+                         data_engine.AUTO_QUESTIONS)
+
+    def test_hanging_panel_is_bounded(self) -> None:
+        """Hanging questions time out once their own deadline passes."""
+        def hanging(df, question, history, index_id=None, cancel=None):
+            cancel.wait(2)
+            data_engine._check(cancel)
+
+        rounds = -(-len(data_engine.AUTO_QUESTIONS) // data_engine.AUTO_INSIGHT_WORKERS)
+        start = time.monotonic()
+        with patch('data_engine.answer_question', side_effect=hanging), \
+             patch('data_engine.AUTO_INSIGHT_TIMEOUT', 0.2):
+            insights = data_engine.run_auto_insights(self.df, 'h')
+        self.assertLess(time.monotonic() - start, rounds * 0.2 + 0.5)
+        self.assertTrue(all('Timed out' in i['explanation'] for i in insights))
+
+    def test_straggler_does_not_run_or_cache(self) -> None:
+        """A question still generating at the deadline should stop there."""
+        release = threading.Event()
+
+        def slow_code(**kwargs):
+            release.wait(2)
+            return 'result = df["a"].sum()'
+
+        with patch('data_engine.AUTO_QUESTIONS', ['What is the total of a?']), \
+             patch('data_engine.AUTO_INSIGHT_TIMEOUT', 0.1), \
+             patch('data_engine.embed_question', return_value=None), \
+             patch('data_engine.retrieve_chunks', return_value=['Column a']), \
+             patch('data_engine.generate_code', side_effect=slow_code), \
+             patch('data_engine._guarded_exec') as run, \
+             patch.object(data_engine.query_cache, 'store_code') as store:
+            insights = data_engine.run_auto_insights(self.df, 'h')
+            release.set()
+            for t in threading.enumerate():
+                if t.name.startswith('auto-insight'):
+                    t.join(2)
+        self.assertIn('Timed out', insights[0]['explanation'])
+        run.assert_not_called()
+        store.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
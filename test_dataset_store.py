@@ -0,0 +1,117 @@
+"""Tests for dataset_store.py — uses a throwaway store directory."""
+import io
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import dataset_store
+
+CSV = (
+    'customerID,SeniorCitizen,Contract,TotalCharges\n'
+    '0001,0,Month-to-month,29.85\n'
+    '0002,1,One year, \n'
+    '0003,0,Two year,1889.5\n'
+).encode('utf-8')
+
+
+class TestCoerceNumeric(unittest.TestCase):
+    """Numeric text columns converted after parsing."""
+
+    def test_blank_strings_become_nan(self) -> None:
+        """Blank cells in a numeric column should become NaN."""
+        df = pd.DataFrame({'TotalCharges': ['29.85', ' ', '1889.5']})
+        out = dataset_store.coerce_numeric(df)
+        self.assertTrue(pd.api.types.is_float_dtype(out['TotalCharges']))
+        self.assertTrue(pd.isna(out['TotalCharges'][1]))
+        self.assertEqual(out['TotalCharges'][2], 1889.5)
+
+    def test_real_text_left_alone(self) -> None:
+        """Columns with genuine text should keep their values."""
+        df = pd.DataFrame({'Contract': ['One year', '12', 'Two year']})
+        out = dataset_store.coerce_numeric(df)
+        self.assertEqual(out['Contract'].tolist(), ['One year', '12', 'Two year'])
+
+    def test_categorical_numbers(self) -> None:
+        """Categorical columns of numbers should become numeric."""
+        df = pd.DataFrame({'n': pd.Series(['1', '2', '1']).astype('category')})
+        out = dataset_store.coerce_numeric(df)
+        self.assertEqual(out['n'].tolist(), [1, 2, 1])
+
+    def test_whole_numbers_not_narrowed(self) -> None:
+        """Only 0/1 flags should be narrowed, so arithmetic can't overflow."""
+        df = pd.DataFrame({'tenure': ['72', '100', '1'], 'flag': ['0', '1', '1']})
+        out = dataset_store.coerce_numeric(df)
+        self.assertEqual(out['tenure'].dtype, 'int64')
+        self.assertEqual((out['tenure'] * 12).max(), 1200)
+        self.assertEqual(out['flag'].dtype, 'int8')
+
+
+class TestLoadDataset(unittest.TestCase):
+    """Content-keyed loading, the stored copy and its eviction."""
+
+    def setUp(self) -> None:
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(patch.object(dataset_store, 'DATASET_DIR', self.tmp))
+        self.enterContext(patch.object(dataset_store, '_frames', OrderedDict()))
+
+    def test_first_load_parses_types_and_stores(self) -> None:
+        """A new upload should be typed and written to the store."""
+        df, key = dataset_store.load_dataset(io.BytesIO(CSV))
+        self.assertEqual(len(df), 3)
+        self.assertTrue(pd.api.types.is_float_dtype(df['TotalCharges']))
+        self.assertTrue(os.path.exists(dataset_store._path(key)))
+
+    def test_same_content_same_key(self) -> None:
+        """The key should depend only on the uploaded bytes."""
+        _, a = dataset_store.load_dataset(io.BytesIO(CSV))
+        _, b = dataset_store.load_dataset(io.BytesIO(CSV))
+        c = dataset_store.content_hash(io.BytesIO(CSV + b'0004,0,One year,5\n'))
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_reload_shares_frame_without_parsing(self) -> None:
+        """A repeat upload should reuse the parsed frame without re-parsing."""
+        first, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        with patch('dataset_store.read_csv_chunked') as parse:
+            again, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        parse.assert_not_called()
+        self.assertIsNot(again, first)
+        self.assertTrue(np.shares_memory(again['TotalCharges'].to_numpy(),
+                                         first['TotalCharges'].to_numpy()))
+
+    def test_sessions_cannot_change_each_others_frame(self) -> None:
+        """Edits to one caller's frame should not reach another's."""
+        first, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        first['x'] = 1
+        first.loc[0, 'TotalCharges'] = -1.0
+        first.drop(columns='Contract', inplace=True)
+        again, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        self.assertNotIn('x', again.columns)
+        self.assertIn('Contract', again.columns)
+        self.assertEqual(again.loc[0, 'TotalCharges'], 29.85)
+
+    def test_reload_from_disk_after_restart(self) -> None:
+        """After a restart the stored copy should be read instead of the CSV."""
+        first, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        dataset_store._frames.clear()
+        with patch('dataset_store.read_csv_chunked') as parse:
+            again, _ = dataset_store.load_dataset(io.BytesIO(CSV))
+        parse.assert_not_called()
+        pd.testing.assert_frame_equal(again, first, check_categorical=False)
+
+    def test_evicts_oldest_files(self) -> None:
+        """Only DATASET_STORE_MAX_FILES stored copies should be kept."""
+        with patch.object(dataset_store, 'DATASET_STORE_MAX_FILES', 2):
+            for i in range(4):
+                dataset_store.load_dataset(io.BytesIO(CSV + f'9{i},0,x,1\n'.encode()))
+        files = [n for n in os.listdir(self.tmp) if n.endswith(dataset_store._EXT)]
+        self.assertEqual(len(files), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for embed_cache.py — uses a throwaway SQLite file."""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import embed_cache
+
+
+def _close_conn() -> None:
+    if embed_cache._conn is not None:
+        embed_cache._conn.close()
+
+
+class TestEmbedCache(unittest.TestCase):
+    """Round-trip, model keying and LRU eviction of the on-disk cache."""
+
+    def setUp(self) -> None:
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(patch.object(embed_cache, '_path',
+                                       os.path.join(tmp, 'cache.sqlite3')))
+        self.enterContext(patch.object(embed_cache, '_conn', None))
+        self.addCleanup(_close_conn)
+
+    def test_round_trip(self) -> None:
+        """Stored vectors should come back for the same texts only."""
+        vecs = np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32)
+        embed_cache.put_many(['a', 'b'], vecs)
+        hits = embed_cache.get_many(['b', 'missing', 'a'])
+        self.assertEqual(sorted(hits), [0, 2])
+        self.assertEqual(hits[0].tolist(), [3.0, 4.0])
+        self.assertEqual(hits[2].tolist(), [1.0, 2.0])
+
+    def test_key_includes_model(self) -> None:
+        """The same text under another model should not collide."""
+        self.assertNotEqual(embed_cache._key('x', 'm1'),
+                            embed_cache._key('x', 'm2'))
+
+    def test_evicts_least_recently_used(self) -> None:
+        """Overflow should drop the entries that were used longest ago."""
+        with patch.object(embed_cache, '_max_entries', 10):
+            for i in range(10):
+                embed_cache.put_many([f't{i}'], np.ones((1, 2)))
+            embed_cache.get_many(['t0'])            # refresh t0
+            embed_cache.put_many(['t10'], np.ones((1, 2)))
+            hits = embed_cache.get_many([f't{i}' for i in range(11)])
+        self.assertLessEqual(len(hits), 10)
+        self.assertIn(0, hits)
+        self.assertIn(10, hits)
+        self.assertNotIn(1, hits)
+
+
+class TestQueryCache(unittest.TestCase):
+    """Question-embedding LRU: normalization, counters, bound, disk spill."""
+
+    def setUp(self) -> None:
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(patch.object(embed_cache, '_path',
+                                       os.path.join(tmp, 'cache.sqlite3')))
+        self.enterContext(patch.object(embed_cache, '_conn', None))
+        self.enterContext(patch.object(embed_cache, '_query_lru',
+                                       embed_cache.OrderedDict()))
+        self.enterContext(patch.object(embed_cache, '_query_stats',
+                                       {'hits': 0, 'disk_hits': 0, 'misses': 0}))
+        self.enterContext(patch.object(embed_cache, '_query_size', 2))
+        self.addCleanup(_close_conn)
+
+    def test_hit_on_normalized_question(self) -> None:
+        """Case and whitespace differences should share one entry."""
+        embed_cache.put_query('Churn  rate?', [1.0, 0.0])
+        vec = embed_cache.get_query('  churn rate? ')
+        self.assertEqual(vec.tolist(), [1.0, 0.0])
+        self.assertIsNone(embed_cache.get_query('tenure'))
+        stats = embed_cache.query_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_lru_bound_and_disk_spill(self) -> None:
+        """Evicted questions should still be served from the disk spill."""
+        for q in ('a', 'b', 'c'):
+            embed_cache.put_query(q, [1.0, 2.0])
+        self.assertEqual(embed_cache.query_stats()['size'], 2)
+        self.assertIsNotNone(embed_cache.get_query('a'))
+        self.assertEqual(embed_cache.query_stats()['disk_hits'], 1)
+
+    def test_no_spill_when_disabled(self) -> None:
+        """With spill off, evicted questions are plain misses."""
+        with patch.object(embed_cache, '_query_spill', False):
+            for q in ('a', 'b', 'c'):
+                embed_cache.put_query(q, [1.0, 2.0])
+            self.assertIsNone(embed_cache.get_query('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
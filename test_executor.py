@@ -0,0 +1,137 @@
+"""Tests for executor.py — sandboxed execution of generated code."""
+import time
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+import executor
+
+
+class TestRunCode(unittest.TestCase):
+    """In-process execution with restricted builtins."""
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'a': [1, 2, 3]})
+
+    def test_result_variable(self) -> None:
+        """The result variable should be returned."""
+        self.assertEqual(executor.run_code("result = df['a'].sum()", self.df), (6, None))
+
+    def test_last_assigned_variable(self) -> None:
+        """Without result, the last assigned variable should be returned."""
+        self.assertEqual(executor.run_code("total = df['a'].max()", self.df), (3, None))
+
+    def test_no_imports(self) -> None:
+        """Imports should fail without __import__."""
+        result, error = executor.run_code("import os\nresult = 1", self.df)
+        self.assertIsNone(result)
+        self.assertIn('__import__', error)
+
+
+class TestExecutorPool(unittest.TestCase):
+    """Worker processes: dataset reuse, limits and recovery."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        with patch.object(executor, 'EXEC_CPU_SECONDS', 2):
+            cls.pool = executor.ExecutorPool(size=1)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.pool.close()
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'a': range(10)})
+
+    def test_runs_in_worker(self) -> None:
+        """Code should run in a worker and return its result."""
+        self.assertEqual(self.pool.execute('k1', "result = df['a'].sum()", self.df), (45, None))
+
+    def test_typed_columns_look_plain(self) -> None:
+        """Category and int8 columns should reach the code as str and int64."""
+        df = pd.DataFrame({
+            'Churn': pd.Series(['Yes', 'No'] * 5, dtype='category'),
+            'SeniorCitizen': pd.Series([0, 1] * 5, dtype='int8'),
+        })
+        code = "result = df['Churn'].map({'Yes': 1, 'No': 0}).mean()"
+        self.assertEqual(self.pool.execute('k7', code, df), (0.5, None))
+        code = "result = (df['SeniorCitizen'] * 100 * 2).max()"
+        self.assertEqual(self.pool.execute('k7', code, df), (200, None))
+
+    def test_dataset_sent_once_per_worker(self) -> None:
+        """A worker should keep using the dataset it already holds."""
+        self.pool.execute('k2', 'result = len(df)', self.df)
+        # Same key: the worker keeps using the copy it already holds
+        result, _ = self.pool.execute('k2', 'result = len(df)', self.df.head(3))
+        self.assertEqual(result, 10)
+
+    def test_timeout_kills_and_replaces_worker(self) -> None:
+        """A hung query should be killed and its worker replaced."""
+        start = time.monotonic()
+        result, error = self.pool.execute('k3', 'while True: pass', self.df, timeout=0.5)
+        self.assertIsNone(result)
+        self.assertIn('longer than', error)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(self.pool.execute('k3', 'result = 1', self.df), (1, None))
+
+    @unittest.skipIf(executor.resource is None, 'needs rlimits')
+    def test_cpu_limit(self) -> None:
+        """A query past its CPU allowance should be stopped."""
+        result, error = self.pool.execute('k4', 'while True: pass', self.df, timeout=20)
+        self.assertIsNone(result)
+        self.assertIn('CPU or memory limit', error)
+
+    def test_writes_do_not_leak_between_queries(self) -> None:
+        """Writes by one query should not be seen by the next."""
+        self.pool.execute('k6', "df['a'] = 0\nresult = 1", self.df)
+        self.assertEqual(self.pool.execute(
+            'k6', "df.loc[df['a'] > 5, 'a'] = 0\nresult = 1", self.df), (1, None))
+        self.assertEqual(self.pool.execute('k6', "result = df['a'].sum()", self.df), (45, None))
+
+    def test_falls_back_to_pickle_when_segment_released(self) -> None:
+        """A released shared segment should fall back to sending the frame."""
+        manifest = executor.shm_store.publish('k7', self.df)
+        executor.shm_store.release_all()
+        with patch.object(executor, '_payload', return_value=manifest):
+            self.assertEqual(self.pool.execute('k7', 'result = len(df)', self.df), (10, None))
+
+    def test_busy_pool_returns_error(self) -> None:
+        """With every worker taken, a query should give up after its timeout."""
+        worker = self.pool._idle.get()
+        try:
+            result, error = self.pool.execute('k8', 'result = 1', self.df, timeout=0.1)
+        finally:
+            self.pool._idle.put(worker)
+        self.assertIsNone(result)
+        self.assertIn('busy', error)
+
+    def test_unpicklable_result(self) -> None:
+        """An unpicklable result should become an error, not a crash."""
+        result, error = self.pool.execute('k5', 'result = (x for x in [1])', self.df)
+        self.assertIsNone(result)
+        self.assertIn('could not be returned', error)
+
+
+class TestExecute(unittest.TestCase):
+    """Dispatch between the pool and in-process execution."""
+
+    def test_in_process_when_isolation_off(self) -> None:
+        """With EXEC_ISOLATED off no worker should be used."""
+        with patch.object(executor, 'EXEC_ISOLATED', False), \
+             patch.object(executor, '_get_pool') as get_pool:
+            out = executor.execute('result = 2', pd.DataFrame(), 'k')
+        get_pool.assert_not_called()
+        self.assertEqual(out, (2, None))
+
+    def test_in_process_sees_plain_text(self) -> None:
+        """In-process runs should also turn categories back into strings."""
+        df = pd.DataFrame({'Churn': pd.Series(['Yes', 'No', 'No', 'No'],
+                                              dtype='category')})
+        code = "result = df['Churn'].replace({'Yes': 1, 'No': 0}).mean()"
+        with patch.object(executor, 'EXEC_ISOLATED', False):
+            self.assertEqual(executor.execute(code, df, 'k'), (0.25, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for ingest.py — chunked, downcasting CSV reads."""
+import io
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import ingest
+
+
+def _csv(df: pd.DataFrame) -> io.BytesIO:
+    return io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+
+
+class TestReadCsvChunked(unittest.TestCase):
+    """read_csv_chunked against a plain pd.read_csv of the same file."""
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        n = 2000
+        self.df = pd.DataFrame({
+            'customerID': [f'C{i:05d}' for i in range(n)],
+            'Contract': rng.choice(['Month-to-month', 'One year', 'Two year'], n),
+            'SeniorCitizen': rng.integers(0, 2, n),
+            'tenure': rng.integers(0, 73, n),
+            'MonthlyCharges': rng.uniform(18, 120, n).round(2),
+        })
+
+    def test_values_match_plain_read(self) -> None:
+        """Chunked reading should not change any values."""
+        out = ingest.read_csv_chunked(_csv(self.df), chunksize=300)
+        plain = pd.read_csv(_csv(self.df))
+        self.assertEqual(len(out), len(plain))
+        for col in plain.columns:
+            self.assertEqual(out[col].tolist(), plain[col].tolist(), col)
+
+    def test_downcasts_dtypes(self) -> None:
+        """Integers should shrink and repeated text become categorical."""
+        out = ingest.read_csv_chunked(_csv(self.df), chunksize=300)
+        self.assertIsInstance(out['Contract'].dtype, pd.CategoricalDtype)
+        self.assertEqual(out['SeniorCitizen'].dtype, np.int8)
+        self.assertEqual(out['tenure'].dtype, np.int64)
+        self.assertEqual(out['MonthlyCharges'].dtype, np.float64)
+        # Mostly-unique IDs stay plain strings
+        self.assertNotIsInstance(out['customerID'].dtype, pd.CategoricalDtype)
+
+    def test_arithmetic_does_not_overflow(self) -> None:
+        """Only 0/1 flags are narrowed, so sums and products stay exact."""
+        out = ingest.read_csv_chunked(_csv(self.df), chunksize=300)
+        self.assertEqual((out['tenure'] * 12).max(), self.df['tenure'].max() * 12)
+        self.assertTrue((out['tenure'] + out['tenure']).ge(0).all())
+
+    def test_uses_less_memory(self) -> None:
+        """The typed frame should be smaller than the default one."""
+        out = ingest.read_csv_chunked(_csv(self.df), chunksize=300)
+        plain = pd.read_csv(_csv(self.df))
+        self.assertLess(out.memory_usage(deep=True).sum(),
+                        plain.memory_usage(deep=True).sum())
+
+    def test_column_outgrowing_category_limit(self) -> None:
+        """A column exceeding INGEST_CATEGORY_MAX should revert to strings."""
+        df = pd.DataFrame({'code': [f'v{i % 50}' for i in range(40)]
+                                   + [f'w{i}' for i in range(60)]})
+        with patch.object(ingest, 'INGEST_CATEGORY_MAX', 20):
+            out = ingest.read_csv_chunked(_csv(df), chunksize=40)
+        self.assertNotIsInstance(out['code'].dtype, pd.CategoricalDtype)
+        self.assertEqual(out['code'].tolist(), df['code'].tolist())
+
+    def test_missing_text_survives_merge(self) -> None:
+        """Missing values should survive merging chunk categories."""
+        df = pd.DataFrame({'grade': ['a', 'b'] * 5 + [None] * 5 + ['c'] * 5})
+        out = ingest.read_csv_chunked(_csv(df), chunksize=5)
+        self.assertEqual(out['grade'].isna().sum(), 5)
+        self.assertEqual(out['grade'].dropna().tolist(), df['grade'].dropna().tolist())
+
+    def test_numeric_then_text_chunks(self) -> None:
+        """A column that turns to text in a later chunk should be all text."""
+        df = pd.DataFrame({'zip': ['12345'] * 5 + ['A1B2C'] * 5,
+                           'n': [1.0] * 4 + [None] + ['x'] * 5})
+        out = ingest.read_csv_chunked(_csv(df), chunksize=5)
+        plain = pd.read_csv(_csv(df))
+        self.assertEqual(out['zip'].tolist(), plain['zip'].tolist())
+        self.assertEqual(int((out['zip'] == '12345').sum()), 5)
+        self.assertEqual(out['n'].tolist()[:4], plain['n'].tolist()[:4])
+        self.assertTrue(pd.isna(out['n'][4]))
+
+    def test_numeric_then_text_without_seek(self) -> None:
+        """Unseekable sources should still get text for every part."""
+        df = pd.DataFrame({'zip': ['12345'] * 5 + ['A1B2C'] * 5})
+        with patch.object(ingest, '_tell', return_value=None):
+            out = ingest.read_csv_chunked(_csv(df), chunksize=5)
+        self.assertEqual(out['zip'].tolist(), df['zip'].tolist())
+
+    def test_reports_progress(self) -> None:
+        """Progress should be reported per chunk and end at 1.0."""
+        calls = []
+        ingest.read_csv_chunked(_csv(self.df), chunksize=500,
+                                progress=lambda done, rows: calls.append((done, rows)))
+        self.assertEqual([r for _, r in calls[:4]], [500, 1000, 1500, 2000])
+        self.assertEqual(calls[-1], (1.0, 2000))
+        self.assertTrue(all(0.0 <= d <= 1.0 for d, _ in calls))
+
+    def test_pyarrow_engine_falls_back_when_missing(self) -> None:
+        """Without pyarrow the C parser should be used instead."""
+        with patch.dict('sys.modules', {'pyarrow': None}):
+            out = ingest.read_csv_chunked(_csv(self.df), chunksize=300,
+                                          engine='pyarrow')
+        self.assertEqual(len(out), len(self.df))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,28 @@
 """Tests for llm_client.py — all external calls mocked."""
+import functools
 import unittest
 from unittest.mock import patch, MagicMock
 
 
+def patch_client(test):
+    """Route llm_client through one backend whose OpenAI client is a mock.
+
+    The mock client is passed to the test like @patch would.
+    """
+    @functools.wraps(test)
+    def wrapper(self, *args):
+        import llm_client
+        mock_client = MagicMock()
+        backend = llm_client.Backend('http://mock:1234/v1', client=mock_client)
+        with patch.object(llm_client, '_backends', [backend]):
+            return test(self, *args, mock_client)
+    return wrapper
+
+
 class TestCheckServerHealth(unittest.TestCase):
     """Tests for check_server_health function."""
 
-    @patch('llm_client.requests.get')
+    @patch('llm_client.http_client.get')
     def test_online_returns_models(self, mock_get: MagicMock) -> None:
         """Should return online status with model list on 200."""
         mock_get.return_value = MagicMock(
@@ -19,7 +35,7 @@ class TestCheckServerHealth(unittest.TestCase):
         self.assertIn('model-a', result['models'])
         self.assertIn('model-b', result['models'])
 
-    @patch('llm_client.requests.get')
+    @patch('llm_client.http_client.get')
     def test_error_status_on_non_200(self, mock_get: MagicMock) -> None:
         """Should return error status on non-200 response."""
         mock_get.return_value = MagicMock(status_code=500)
@@ -27,7 +43,7 @@ class TestCheckServerHealth(unittest.TestCase):
         result = check_server_health()
         self.assertEqual(result['status'], 'error')
 
-    @patch('llm_client.requests.get', side_effect=ConnectionError('refused'))
+    @patch('llm_client.http_client.get', side_effect=ConnectionError('refused'))
     def test_offline_on_exception(self, mock_get: MagicMock) -> None:
         """Should return offline status when server is unreachable."""
         from llm_client import check_server_health
@@ -36,10 +52,29 @@ class TestCheckServerHealth(unittest.TestCase):
         self.assertIn('error', result)
 
 
+class TestPoolStats(unittest.TestCase):
+    """Tests for the shared connection pool."""
+
+    def test_openai_client_uses_shared_pool(self) -> None:
+        """Completions/embeddings should go through the shared transport."""
+        import llm_client
+        for backend in llm_client._backends:
+            self.assertIs(backend.client._client, llm_client.http_client)
+
+    def test_stats_shape(self) -> None:
+        """pool_stats should report limits and connection counts."""
+        from llm_client import pool_stats
+        from config import LLM_MAX_CONNECTIONS
+        stats = pool_stats()
+        self.assertEqual(stats['max_connections'], LLM_MAX_CONNECTIONS)
+        for key in ('requests_sent', 'open_connections', 'idle_connections'):
+            self.assertGreaterEqual(stats[key], 0)
+
+
 class TestGetEmbedding(unittest.TestCase):
     """Tests for get_embedding function."""
 
-    @patch('llm_client.client')
+    @patch_client
     def test_returns_embedding_list(self, mock_client: MagicMock) -> None:
         """Should return the embedding vector from the API response."""
         fake_vec = [0.1] * 384
@@ -52,7 +87,7 @@ class TestGetEmbedding(unittest.TestCase):
         self.assertEqual(result, fake_vec)
         mock_client.embeddings.create.assert_called_once()
 
-    @patch('llm_client.client')
+    @patch_client
     def test_truncates_long_input(self, mock_client: MagicMock) -> None:
         """Should truncate input text to 2000 chars."""
         mock_resp = MagicMock()
@@ -67,10 +102,52 @@ class TestGetEmbedding(unittest.TestCase):
         self.assertTrue(len(call_args.kwargs.get('input', call_args[1].get('input', ''))) <= 2000)
 
 
+class TestGetEmbeddings(unittest.TestCase):
+    """Tests for the batched get_embeddings function."""
+
+    @staticmethod
+    def _fake_create(**kwargs) -> MagicMock:
+        """Echo one embedding per input, returned in reverse order."""
+        items = [
+            MagicMock(index=i, embedding=[float(len(t)), 1.0])
+            for i, t in enumerate(kwargs['input'])
+        ]
+        return MagicMock(data=list(reversed(items)))
+
+    @patch_client
+    def test_batches_requests(self, mock_client: MagicMock) -> None:
+        """Should issue one request per batch_size texts."""
+        mock_client.embeddings.create.side_effect = self._fake_create
+
+        from llm_client import get_embeddings
+        texts = [f'text {i}' for i in range(5)]
+        result = get_embeddings(texts, batch_size=2)
+        self.assertEqual(mock_client.embeddings.create.call_count, 3)
+        self.assertEqual(result.shape, (5, 2))
+        self.assertEqual(str(result.dtype), 'float32')
+
+    @patch_client
+    def test_preserves_input_order(self, mock_client: MagicMock) -> None:
+        """Rows should follow input order even if the server reorders."""
+        mock_client.embeddings.create.side_effect = self._fake_create
+
+        from llm_client import get_embeddings
+        result = get_embeddings(['a', 'bbb', 'cc'], batch_size=10)
+        self.assertEqual(result[:, 0].tolist(), [1.0, 3.0, 2.0])
+
+    @patch_client
+    def test_empty_input(self, mock_client: MagicMock) -> None:
+        """Should return an empty matrix without calling the server."""
+        from llm_client import get_embeddings
+        result = get_embeddings([])
+        self.assertEqual(result.shape[0], 0)
+        mock_client.embeddings.create.assert_not_called()
+
+
 class TestGenerateCode(unittest.TestCase):
     """Tests for generate_code function."""
 
-    @patch('llm_client.client')
+    @patch_client
     def test_returns_stripped_content(self, mock_client: MagicMock) -> None:
         """Should return stripped message content."""
         mock_msg = MagicMock()
@@ -89,7 +166,7 @@ class TestGenerateCode(unittest.TestCase):
 class TestGenerateExplanation(unittest.TestCase):
     """Tests for generate_explanation function."""
 
-    @patch('llm_client.client')
+    @patch_client
     def test_returns_explanation(self, mock_client: MagicMock) -> None:
         """Should return stripped explanation content."""
         mock_msg = MagicMock()
@@ -105,5 +182,320 @@ class TestGenerateExplanation(unittest.TestCase):
         self.assertEqual(result, 'The data shows a trend.')
 
 
+class TestStreamExplanation(unittest.TestCase):
+    """Tests for the streaming stream_explanation generator."""
+
+    @patch_client
+    def test_yields_non_empty_deltas(self, mock_client: MagicMock) -> None:
+        """Should yield each content delta and skip empty ones."""
+        def chunk(text):
+            return MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+
+        mock_client.chat.completions.create.return_value = iter(
+            [chunk('Churn '), chunk(None), chunk('is 26%.')]
+        )
+        from llm_client import stream_explanation
+        self.assertEqual(list(stream_explanation('s', 'u')), ['Churn ', 'is 26%.'])
+        self.assertTrue(mock_client.chat.completions.create.call_args.kwargs['stream'])
+
+
+class TestResilience(unittest.TestCase):
+    """Retries, deadlines and the circuit breaker around API calls."""
+
+    def setUp(self) -> None:
+        import llm_client
+        self.llm = llm_client
+        self.client = MagicMock()
+        self.backend = llm_client.Backend('http://a/v1', client=self.client)
+        self.backend.breaker = llm_client.CircuitBreaker(3, 30.0)
+        self.create = self.client.chat.completions.create
+        self.enterContext(patch.object(llm_client, '_backends', [self.backend]))
+        self.enterContext(patch('llm_client.time.sleep'))
+
+    @staticmethod
+    def _conn_error() -> Exception:
+        from openai import APIConnectionError
+        return APIConnectionError(request=MagicMock())
+
+    def test_retries_transient_errors(self) -> None:
+        """A connection error followed by success should return the result."""
+        self.create.side_effect = [self._conn_error(), 'ok']
+        self.assertEqual(self.llm._call('reasoning', 10.0, model='m'), 'ok')
+        self.assertEqual(self.create.call_count, 2)
+        self.assertLessEqual(self.create.call_args.kwargs['timeout'], 10.0)
+        self.assertEqual(self.backend.outstanding, 0)
+
+    def test_non_transient_error_not_retried(self) -> None:
+        """Programming errors should surface immediately."""
+        self.create.side_effect = ValueError('bad')
+        with self.assertRaises(ValueError):
+            self.llm._call('reasoning', 10.0)
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(self.backend.breaker.state, 'closed')
+
+    def test_breaker_opens_and_fails_fast(self) -> None:
+        """After repeated failures calls should be rejected without I/O."""
+        self.create.side_effect = self._conn_error()
+        with self.assertRaises(Exception):
+            self.llm._call('reasoning', 10.0)
+        self.assertEqual(self.backend.breaker.state, 'open')
+        calls = self.create.call_count
+        with self.assertRaises(self.llm.LLMUnavailableError):
+            self.llm._call('reasoning', 10.0)
+        self.assertEqual(self.create.call_count, calls)
+
+    def test_breaker_half_open_trial_closes(self) -> None:
+        """A successful trial after the cooldown should close the circuit."""
+        breaker = self.llm.CircuitBreaker(1, 0.0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())      # Only one trial at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_local_error_does_not_close_half_open_breaker(self) -> None:
+        """Only an HTTP answer should count as a successful trial."""
+        self.backend.breaker = self.llm.CircuitBreaker(1, 0.0)
+        self.backend.breaker.record_failure()
+        self.create.side_effect = ValueError('bad')
+        with self.assertRaises(ValueError):
+            self.llm._call('reasoning', 10.0)
+        self.assertEqual(self.backend.breaker._state, 'open')
+        self.assertTrue(self.backend.breaker.allow())   # Next caller retries the trial
+
+    def test_http_error_closes_half_open_breaker(self) -> None:
+        """A 4xx answer proves the server is up."""
+        from openai import BadRequestError
+        self.backend.breaker = self.llm.CircuitBreaker(1, 0.0)
+        self.backend.breaker.record_failure()
+        self.create.side_effect = BadRequestError(
+            'bad', response=MagicMock(status_code=400), body=None)
+        with self.assertRaises(BadRequestError):
+            self.llm._call('reasoning', 10.0)
+        self.assertEqual(self.backend.breaker.state, 'closed')
+
+    def test_stream_holds_slot_until_closed(self) -> None:
+        """A streaming call should count as running until it is closed."""
+        def running() -> int:
+            return self.llm._scheduler.stats()['interactive']['running']
+
+        self.create.return_value = iter(['a', 'b', 'c'])
+        before = running()
+        stream = self.llm._call('reasoning', 10.0, stream=True)
+        self.assertEqual(next(stream), 'a')
+        self.assertEqual(self.backend.outstanding, 1)
+        self.assertEqual(running(), before + 1)
+        stream.close()
+        self.assertEqual(self.backend.outstanding, 0)
+        self.assertEqual(running(), before)
+
+        self.create.return_value = iter(['a', 'b'])
+        self.assertEqual(list(self.llm._call('reasoning', 10.0, stream=True)),
+                         ['a', 'b'])
+        self.assertEqual(self.backend.outstanding, 0)
+        self.assertEqual(running(), before)
+
+    def test_broken_stream_counts_as_failure(self) -> None:
+        """A connection lost mid-stream should feed the breaker."""
+        def broken():
+            yield 'a'
+            raise self._conn_error()
+
+        self.backend.breaker = self.llm.CircuitBreaker(1, 30.0)
+        self.create.return_value = broken()
+        stream = self.llm._call('reasoning', 10.0, stream=True)
+        self.assertEqual(self.backend.breaker.state, 'closed')
+        with self.assertRaises(Exception):
+            list(stream)
+        self.assertEqual(self.backend.breaker.state, 'open')
+        self.assertEqual(self.backend.outstanding, 0)
+
+    @patch('llm_client.http_client.get', side_effect=ConnectionError('refused'))
+    def test_health_reports_circuit(self, _mock: MagicMock) -> None:
+        """check_server_health should expose the breaker state."""
+        self.assertEqual(self.llm.check_server_health()['circuit'], 'closed')
+
+
+class TestRouting(unittest.TestCase):
+    """Backend selection across several model servers."""
+
+    def setUp(self) -> None:
+        import llm_client
+        self.llm = llm_client
+        self.a = llm_client.Backend('http://a/v1', client=MagicMock())
+        self.b = llm_client.Backend('http://b/v1', client=MagicMock())
+        self.emb = llm_client.Backend('http://e/v1', pools=['embedding'],
+                                      client=MagicMock())
+        self.enterContext(patch.object(llm_client, '_backends',
+                                       [self.a, self.b, self.emb]))
+        self.enterContext(patch('llm_client.time.sleep'))
+        self.enterContext(patch('llm_client._maybe_probe'))
+
+    def test_least_outstanding(self) -> None:
+        """The backend with fewer requests in flight should be chosen."""
+        self.a.outstanding = 3
+        self.assertIs(self.llm._pick('reasoning'), self.b)
+        self.b.outstanding = 5
+        self.assertIs(self.llm._pick('reasoning'), self.a)
+
+    def test_separate_pools(self) -> None:
+        """Embedding-only backends should never get reasoning traffic."""
+        for _ in range(10):
+            self.assertIsNot(self.llm._pick('reasoning'), self.emb)
+        self.a.pools = self.b.pools = {'reasoning'}
+        self.assertIs(self.llm._pick('embedding'), self.emb)
+
+    def test_weighted_routing(self) -> None:
+        """Weighted routing should favor heavier backends."""
+        self.a.weight, self.b.weight = 9.0, 1.0
+        with patch('llm_client.LLM_ROUTING', 'weighted'):
+            picks = [self.llm._pick('reasoning') for _ in range(300)]
+        self.assertGreater(picks.count(self.a), picks.count(self.b) * 3)
+
+    def test_non_positive_weight_rejected(self) -> None:
+        """A zero or negative weight would break routing, so it's refused."""
+        for weight in (0, -1.0, float('nan')):
+            with self.assertRaises(ValueError):
+                self.llm.Backend('http://z/v1', weight=weight, client=MagicMock())
+
+    def test_unhealthy_backend_ejected(self) -> None:
+        """A failed health probe should take a backend out of rotation."""
+        def probe(url, timeout):
+            if url.startswith('http://a'):
+                raise ConnectionError('down')
+            return MagicMock(status_code=200, json=lambda: {'data': [{'id': 'm'}]})
+
+        self.b.outstanding = 10
+        with patch('llm_client.http_client.get', side_effect=probe):
+            health = self.llm.check_server_health()
+        self.assertEqual(health['status'], 'online')
+        self.assertFalse(self.a.healthy)
+        self.assertIs(self.llm._pick('reasoning'), self.b)
+
+    def test_retry_fails_over(self) -> None:
+        """A transient failure on one backend should retry on another."""
+        from openai import APIConnectionError
+        self.a.breaker = self.llm.CircuitBreaker(1, 30.0)
+        self.a.client.chat.completions.create.side_effect = \
+            APIConnectionError(request=MagicMock())
+        self.b.outstanding = 1          # Make a the first choice
+        self.b.client.chat.completions.create.return_value = 'from b'
+        self.assertEqual(self.llm._call('reasoning', 10.0), 'from b')
+
+
+class TestScheduler(unittest.TestCase):
+    """Priority classes and concurrency budgets for LLM calls."""
+
+    def test_priority_context(self) -> None:
+        """priority() should set and restore the caller's class."""
+        import llm_client
+        self.assertEqual(llm_client._priority.get(), 'interactive')
+        with llm_client.priority('reindex'):
+            self.assertEqual(llm_client._priority.get(), 'reindex')
+        self.assertEqual(llm_client._priority.get(), 'interactive')
+        with self.assertRaises(ValueError):
+            with llm_client.priority('urgent'):
+                pass
+
+    def test_higher_priority_admitted_first(self) -> None:
+        """When a slot frees up, interactive work should beat reindex."""
+        import threading
+        import time
+        import llm_client
+        sched = llm_client._Scheduler(1, {})
+        order = []
+
+        def worker(cls):
+            with sched.slot(cls, 5.0):
+                order.append(cls)
+
+        with sched.slot('insights', 5.0):
+            low = threading.Thread(target=worker, args=('reindex',))
+            low.start()
+            time.sleep(0.05)
+            high = threading.Thread(target=worker, args=('interactive',))
+            high.start()
+            time.sleep(0.05)
+        low.join()
+        high.join()
+        self.assertEqual(order, ['interactive', 'reindex'])
+
+    def test_class_budget_and_timeout(self) -> None:
+        """A class at its budget should wait, then time out."""
+        import llm_client
+        sched = llm_client._Scheduler(4, {'reindex': 1})
+        with sched.slot('reindex', 1.0):
+            with self.assertRaises(llm_client.LLMUnavailableError):
+                with sched.slot('reindex', 0.05):
+                    pass
+            with sched.slot('interactive', 0.05):   # Other classes unaffected
+                self.assertEqual(sched.stats()['interactive']['running'], 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Identical concurrent requests should share one HTTP call."""
+
+    @staticmethod
+    def _run_concurrently(fn, args_list: list) -> list:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(args_list)) as pool:
+            futures = [pool.submit(fn, *args) for args in args_list]
+            return [f.exception() or f.result() for f in futures]
+
+    @staticmethod
+    def _slow_completion(text: str):
+        def create(**kwargs):
+            import time
+            time.sleep(0.1)
+            msg = MagicMock(content=text)
+            return MagicMock(choices=[MagicMock(message=msg)])
+        return create
+
+    @patch_client
+    def test_identical_requests_coalesce(self, mock_client: MagicMock) -> None:
+        """Five identical generate_code calls should hit the server once."""
+        mock_client.chat.completions.create.side_effect = self._slow_completion('x = 1')
+        from llm_client import generate_code
+        results = self._run_concurrently(generate_code, [('s', 'u')] * 5)
+        self.assertEqual(results, ['x = 1'] * 5)
+        self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+
+    @patch_client
+    def test_different_requests_do_not_coalesce(self, mock_client: MagicMock) -> None:
+        """Different prompts should each get their own call."""
+        mock_client.chat.completions.create.side_effect = self._slow_completion('x = 1')
+        from llm_client import generate_code
+        self._run_concurrently(generate_code, [('s', 'u1'), ('s', 'u2')])
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+    @patch_client
+    def test_priorities_do_not_coalesce(self, mock_client: MagicMock) -> None:
+        """An interactive call must not wait on a lower-priority leader."""
+        mock_client.chat.completions.create.side_effect = self._slow_completion('x = 1')
+        from llm_client import generate_code, priority
+
+        def at(cls):
+            with priority(cls):
+                return generate_code('s', 'u')
+
+        self._run_concurrently(at, [('reindex',), ('interactive',)])
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+    def test_exception_shared_with_waiters(self) -> None:
+        """Waiters should receive the leader's exception."""
+        from llm_client import _SingleFlight
+        import time
+        flight = _SingleFlight()
+
+        def boom():
+            time.sleep(0.1)
+            raise ValueError('down')
+
+        results = self._run_concurrently(flight.do, [('k', boom)] * 3)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.coalesced, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
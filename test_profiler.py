@@ -0,0 +1,111 @@
+"""Tests for profiler.py — mergeable column statistics."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from profiler import ColumnProfile, DistinctCounter, Profile, QuantileSketch
+
+
+def _frame(n: int = 3000) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        'tenure': rng.integers(0, 72, n),
+        'charges': rng.normal(65, 30, n),
+        'contract': rng.choice(['Month-to-month', 'One year', 'Two year'], n),
+    })
+    df['total'] = df['tenure'] * df['charges'] + rng.normal(0, 50, n)
+    df.loc[::9, 'charges'] = np.nan
+    return df
+
+
+class TestColumnProfile(unittest.TestCase):
+    """Per-column statistics and merging partial profiles."""
+
+    def test_numeric_stats_match_pandas(self) -> None:
+        """Numeric statistics should agree with pandas."""
+        s = _frame()['charges']
+        col = ColumnProfile.from_series(s)
+        self.assertEqual(col.nulls, int(s.isnull().sum()))
+        self.assertAlmostEqual(col.mean, s.mean())
+        self.assertAlmostEqual(col.std, s.std())
+        self.assertEqual((col.min, col.max), (s.min(), s.max()))
+        self.assertAlmostEqual(col.median, s.median(), delta=s.std() * 0.02)
+
+    def test_merge_equals_whole(self) -> None:
+        """Merging two halves should equal profiling the whole column."""
+        s = _frame()['charges']
+        whole = ColumnProfile.from_series(s)
+        merged = ColumnProfile.from_series(s[:1000]).merge(
+            ColumnProfile.from_series(s[1000:]))
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.std, whole.std)
+        self.assertEqual(merged.max, whole.max)
+
+    def test_categorical_unique_and_sample(self) -> None:
+        """Distinct counts and samples should survive a merge."""
+        s = _frame()['contract']
+        merged = ColumnProfile.from_series(s[:10]).merge(
+            ColumnProfile.from_series(s[10:]))
+        self.assertEqual(merged.unique, 3)
+        self.assertEqual(merged.sample, s.dropna().unique()[:6].tolist())
+
+
+class TestSketches(unittest.TestCase):
+    """Quantile and distinct-count sketches."""
+
+    def test_quantiles_on_skewed_data(self) -> None:
+        """Merged t-digest quantiles should be within 1% on skewed data."""
+        x = np.random.default_rng(0).lognormal(size=200_000)
+        a = QuantileSketch.from_values(x[:50_000])
+        b = QuantileSketch.from_values(x[50_000:])
+        sketch = a.merge(b)
+        self.assertLessEqual(len(sketch.means), sketch.compression)
+        for q in (0.01, 0.5, 0.99):
+            self.assertAlmostEqual(sketch.quantile(q, x.min(), x.max()),
+                                   np.quantile(x, q), delta=np.quantile(x, q) * 0.01)
+
+    def test_small_input_is_exact(self) -> None:
+        """Small inputs should give exact quantiles."""
+        sketch = QuantileSketch.from_values(np.array([5.0, 1.0, 3.0, 2.0]))
+        self.assertEqual(sketch.quantile(0.5, 1.0, 5.0), 2.5)
+
+    def test_distinct_counter_switches_to_hll(self) -> None:
+        """Large distinct counts should switch to HyperLogLog within 3%."""
+        hashes = np.random.default_rng(1).integers(0, 2**64, 100_000, dtype=np.uint64)
+        small = DistinctCounter.from_hashes(hashes[:100])
+        self.assertEqual(small.count(), 100)
+        big = small.merge(DistinctCounter.from_hashes(hashes[100:]))
+        self.assertIsNone(big.exact)
+        self.assertAlmostEqual(big.count(), 100_000, delta=100_000 * 0.03)
+
+
+class TestProfile(unittest.TestCase):
+    """Whole-frame profiles: null counts and correlations."""
+
+    def test_frame_nulls_and_complete_block(self) -> None:
+        """Null totals and the complete-rows fast path should match pandas."""
+        df = _frame()
+        profile = Profile.from_frame(df, '')
+        self.assertEqual(profile.nulls, int(df.isnull().sum().sum()))
+        full = df.drop(columns='charges')
+        complete = Profile.from_frame(full, '')
+        self.assertAlmostEqual(complete.column('total').std, full['total'].std())
+        np.testing.assert_allclose(complete.corr().to_numpy(),
+                                   full[['tenure', 'total']].corr().to_numpy())
+
+    def test_correlations_match_pandas(self) -> None:
+        """Correlations of merged profiles should equal pandas'."""
+        df = _frame()
+        numeric = ['tenure', 'charges', 'total']
+        head = Profile.from_frame(df[:1200], '')
+        merged = head.merge(Profile.from_frame(df[1200:], '', head.shift), '')
+        np.testing.assert_allclose(merged.corr().to_numpy(),
+                                   df[numeric].corr().to_numpy(), atol=1e-9)
+        self.assertEqual(merged.rows, len(df))
+        self.assertEqual(merged.numeric, numeric)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests for prompt_builder.py — token counting and context budgets."""
+import unittest
+
+from prompt_builder import build_context, count_tokens
+
+
+class TestCountTokens(unittest.TestCase):
+    """Approximate token counts used for prompt budgeting."""
+
+    def test_words_and_punctuation(self) -> None:
+        """Each word and punctuation mark should count as one token."""
+        self.assertEqual(count_tokens('a, b c'), 4)
+
+    def test_long_runs_count_by_length(self) -> None:
+        """Long unbroken runs should count one token per four chars."""
+        self.assertEqual(count_tokens('x' * 40), 10)
+
+    def test_empty(self) -> None:
+        """An empty string should have no tokens."""
+        self.assertEqual(count_tokens(''), 0)
+
+
+class TestBuildContext(unittest.TestCase):
+    """Assembling ranked chunks into a token budget."""
+
+    def test_keeps_whole_chunks_within_budget(self) -> None:
+        """Chunks that fit should be kept whole and in order."""
+        text, n = build_context(['a b c', 'd e f'], budget=50)
+        self.assertEqual(text, 'a b c\n\nd e f')
+        self.assertEqual(n, count_tokens(text))
+
+    def test_respects_budget(self) -> None:
+        """The assembled context should never exceed the budget."""
+        chunks = ['\n'.join(f'line {i} value {i}' for i in range(40))] * 5
+        text, n = build_context(chunks, budget=120)
+        self.assertLessEqual(n, 120)
+        self.assertTrue(text.startswith('line 0 value 0'))
+
+    def test_truncates_first_overflowing_chunk_by_lines(self) -> None:
+        """The chunk that overflows should be cut at a line boundary."""
+        big = '\n'.join(f'row {i}' for i in range(100))
+        text, n = build_context(['head', big], budget=40)
+        self.assertTrue(text.startswith('head\n\nrow 0\nrow 1'))
+        self.assertTrue(text.endswith('…'))
+        self.assertLessEqual(n, 40)
+
+    def test_drops_rest_when_little_budget_left(self) -> None:
+        """Chunks after a too-small remainder should be dropped."""
+        text, _ = build_context(['a ' * 30, 'b ' * 30], budget=40)
+        self.assertNotIn('b', text)
+
+    def test_truncates_single_long_line(self) -> None:
+        """A single long line should be cut by characters."""
+        text, n = build_context(['col, ' * 200], budget=50)
+        self.assertTrue(text.endswith(' …'))
+        self.assertLessEqual(n, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests for query_cache.py — semantic answer cache."""
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import query_cache
+
+
+def _unit(*xs: float) -> np.ndarray:
+    v = np.array(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+class TestAnswerCache(unittest.TestCase):
+    """Similarity threshold, dataset scoping, TTL and size bound."""
+
+    def setUp(self) -> None:
+        self.enterContext(patch.object(query_cache, '_answers',
+                                       query_cache.OrderedDict()))
+
+    def test_similar_question_hits(self) -> None:
+        """A question above the threshold should reuse the answer."""
+        query_cache.store_answer('h1', 'churn by contract', _unit(1, 0), {'a': 1})
+        hit = query_cache.lookup_answer('h1', 'churn per contract', _unit(1, 0.01))
+        self.assertEqual(hit, {'a': 1})
+
+    def test_dissimilar_question_misses(self) -> None:
+        """A question below the threshold should not match."""
+        query_cache.store_answer('h1', 'churn by contract', _unit(1, 0), {'a': 1})
+        self.assertIsNone(query_cache.lookup_answer('h1', 'tenure', _unit(1, 1)))
+
+    def test_different_number_or_negation_misses(self) -> None:
+        """Near-identical vectors must not match across numbers or negations."""
+        query_cache.store_answer('h1', 'Top 5 customers by TotalCharges',
+                                 _unit(1, 0), {'a': 5})
+        self.assertIsNone(query_cache.lookup_answer(
+            'h1', 'top 10 customers by TotalCharges', _unit(1, 0.01)))
+        self.assertIsNone(query_cache.lookup_answer(
+            'h1', 'top 5 customers not by TotalCharges', _unit(1, 0.01)))
+        self.assertEqual(query_cache.lookup_answer(
+            'h1', 'top 5 customers ranked by TotalCharges', _unit(1, 0.01)),
+            {'a': 5})
+
+        query_cache.store_answer('h1', 'churn rate with phone service',
+                                 _unit(0, 1), {'a': 1})
+        self.assertIsNone(query_cache.lookup_answer(
+            'h1', 'churn rate without phone service', _unit(0.01, 1)))
+        self.assertIsNone(query_cache.lookup_answer(
+            'h1', "churn rate for customers who don't have phone service",
+            _unit(0.01, 1)))
+
+    def test_scoped_to_dataset(self) -> None:
+        """Answers for one dataset hash must not leak into another."""
+        query_cache.store_answer('h1', 'q', _unit(1, 0), {'a': 1})
+        self.assertIsNone(query_cache.lookup_answer('h2', 'q', _unit(1, 0)))
+        query_cache.invalidate('h1')
+        self.assertIsNone(query_cache.lookup_answer('h1', 'q', _unit(1, 0)))
+
+    def test_ttl_expiry(self) -> None:
+        """Entries older than ANSWER_CACHE_TTL should be ignored."""
+        query_cache.store_answer('h1', 'q', _unit(1, 0), {'a': 1})
+        with patch('query_cache.ANSWER_CACHE_TTL', -1):
+            self.assertIsNone(query_cache.lookup_answer('h1', 'q', _unit(1, 0)))
+
+    def test_size_bound(self) -> None:
+        """The least recently used entry should be evicted first."""
+        with patch('query_cache.ANSWER_CACHE_MAX_ENTRIES', 2):
+            query_cache.store_answer('h', 'a', _unit(1, 0), {'q': 'a'})
+            query_cache.store_answer('h', 'b', _unit(0, 1), {'q': 'b'})
+            query_cache.lookup_answer('h', 'a', _unit(1, 0))
+            query_cache.store_answer('h', 'c', _unit(1, 1), {'q': 'c'})
+        self.assertIsNotNone(query_cache.lookup_answer('h', 'a', _unit(1, 0)))
+        self.assertIsNone(query_cache.lookup_answer('h', 'b', _unit(0, 1)))
+
+
+class TestCodeCache(unittest.TestCase):
+    """Schema fingerprint and generated-code lookup."""
+
+    def setUp(self) -> None:
+        self.enterContext(patch.object(query_cache, '_code', query_cache.OrderedDict()))
+
+    def test_fingerprint_ignores_values(self) -> None:
+        """Same columns and dtypes should share a fingerprint."""
+        a = pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']})
+        b = pd.DataFrame({'x': [9], 'y': ['z']})
+        c = pd.DataFrame({'x': [1.5], 'y': ['a']})
+        self.assertEqual(query_cache.schema_fingerprint(a),
+                         query_cache.schema_fingerprint(b))
+        self.assertNotEqual(query_cache.schema_fingerprint(a),
+                            query_cache.schema_fingerprint(c))
+
+    def test_lookup_by_normalized_question(self) -> None:
+        """Code should be found regardless of case and spacing."""
+        query_cache.store_code('s', 'Churn  Rate', 'result = 1')
+        self.assertEqual(query_cache.lookup_code('s', 'churn rate'), 'result = 1')
+        self.assertIsNone(query_cache.lookup_code('other', 'churn rate'))
+
+
+if __name__ == '__main__':
+    unittest.main()
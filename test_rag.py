@@ -189,5 +189,182 @@ class TestBuildDocs(unittest.TestCase):
             self.assertIn('unique=', d)
 
 
+class TestRetrieval(unittest.TestCase):
+    """Test vectorized top-k retrieval in rag_engine (embeddings mocked)."""
+
+    def test_top_k_matches_full_sort(self) -> None:
+        """_top_k should agree with a full descending sort."""
+        import numpy as np
+        import rag_engine
+        scores = np.random.default_rng(0).random(500).astype(np.float32)
+        expected = np.argsort(-scores)[:7].tolist()
+        self.assertEqual(rag_engine._top_k(scores, 7).tolist(), expected)
+        self.assertEqual(len(rag_engine._top_k(scores, 1000)), 500)
+        self.assertEqual(len(rag_engine._top_k(scores, 0)), 0)
+
+    def test_normalize_handles_zero_rows(self) -> None:
+        """Zero vectors should stay zero instead of producing NaN."""
+        import numpy as np
+        import rag_engine
+        m = rag_engine._normalize(np.array([[3.0, 4.0], [0.0, 0.0]]))
+        self.assertEqual(m.dtype, np.float32)
+        self.assertAlmostEqual(float(m[0, 0]), 0.6, places=5)
+        self.assertFalse(np.isnan(m).any())
+
+    def test_retrieve_returns_most_similar_chunk(self) -> None:
+        """The chunk sharing the question's direction should rank first."""
+        import numpy as np
+        import rag_engine
+
+        def fake_embeddings(texts, batch_size=64):
+            return np.array(
+                [[1.0, 0.0] if t.startswith('Column tenure') else [0.0, 1.0] for t in texts],
+                dtype=np.float32,
+            )
+
+        df = pd.DataFrame({'tenure': [1, 2, 3], 'gender': ['M', 'F', 'M']})
+        with patch('rag_engine.get_embeddings', side_effect=fake_embeddings), \
+             patch('rag_engine.get_embedding', return_value=[2.0, 0.0]), \
+             patch('rag_engine.embed_cache.get_many', return_value={}), \
+             patch('rag_engine.embed_cache.put_many'), \
+             patch('rag_engine.embed_cache.get_query', return_value=None), \
+             patch('rag_engine.embed_cache.put_query'):
+            h = rag_engine.build_rag_index(df)
+            ctx = rag_engine.retrieve_context('how long is tenure?', n=1, index_id=h)
+        self.assertTrue(ctx.startswith('Column tenure'))
+
+
+class TestIndexRegistry(unittest.TestCase):
+    """Per-dataset indexes in rag_engine (embeddings mocked)."""
+
+    def setUp(self) -> None:
+        import numpy as np
+        import rag_engine
+        self.rag = rag_engine
+
+        def fake_embeddings(texts, batch_size=64):
+            return np.ones((len(texts), 2), dtype=np.float32)
+
+        self.enterContext(patch.object(rag_engine, '_indexes', rag_engine.OrderedDict()))
+        self.enterContext(patch('rag_engine.get_embeddings', side_effect=fake_embeddings))
+        self.enterContext(patch('rag_engine.get_embedding', return_value=[1.0, 1.0]))
+        self.enterContext(patch('rag_engine.embed_cache.get_many', return_value={}))
+        self.enterContext(patch('rag_engine.embed_cache.put_many'))
+        self.enterContext(patch('rag_engine.embed_cache.get_query', return_value=None))
+        self.enterContext(patch('rag_engine.embed_cache.put_query'))
+
+    def test_datasets_keep_separate_indexes(self) -> None:
+        """Building a second dataset should not replace the first."""
+        h1 = self.rag.build_rag_index(pd.DataFrame({'alpha': [1, 2]}))
+        h2 = self.rag.build_rag_index(pd.DataFrame({'beta': [3, 4]}))
+        self.assertNotEqual(h1, h2)
+        self.assertIn('alpha', self.rag.retrieve_context('q', n=10, index_id=h1))
+        self.assertNotIn('alpha', self.rag.retrieve_context('q', n=10, index_id=h2))
+
+    def test_missing_id_does_not_fall_back_to_another_dataset(self) -> None:
+        """A session without an index id must not see someone else's index."""
+        self.rag.build_rag_index(pd.DataFrame({'alpha': [1, 2]}))
+        self.assertIsNone(self.rag.get_index(None))
+        self.assertEqual(self.rag.retrieve_chunks('alpha', n=10), [])
+        self.assertEqual(self.rag.retrieve_context('alpha'), 'No dataset loaded yet.')
+
+    def test_missing_id_has_no_profile(self) -> None:
+        """get_profile(None) must not return another session's statistics."""
+        h = self.rag.build_rag_index(pd.DataFrame({'alpha': [1, None]}))
+        self.assertIsNotNone(self.rag.get_profile(h))
+        self.assertIsNone(self.rag.get_profile(None))
+
+    def test_rebuild_of_warm_index_skips_embedding(self) -> None:
+        """Re-indexing a known dataset should not call the embedder."""
+        df = pd.DataFrame({'alpha': [1, 2]})
+        self.rag.build_rag_index(df)
+        self.rag.build_rag_index(pd.DataFrame({'beta': [3, 4]}))
+        calls = self.rag.get_embeddings.call_count
+        self.rag.build_rag_index(df.copy())
+        self.assertEqual(self.rag.get_embeddings.call_count, calls)
+
+    def test_append_extends_previous_profile(self) -> None:
+        """Appending rows should only profile the new rows."""
+        df = pd.DataFrame({'n': range(50), 'c': ['x', 'y'] * 25})
+        self.rag.build_rag_index(df)
+        grown = pd.concat([df, pd.DataFrame({'n': [100], 'c': ['z']})],
+                          ignore_index=True)
+        with patch('rag_engine.Profile.from_frame',
+                   wraps=self.rag.Profile.from_frame) as from_frame:
+            h = self.rag.build_rag_index(grown)
+        self.assertEqual(len(from_frame.call_args.args[0]), 1)
+        docs = self.rag.get_index(h).docs
+        self.assertTrue(any('max=100' in d for d in docs))
+        self.assertTrue(any('unique=3' in d for d in docs))
+
+    def test_edited_rows_profiled_from_scratch(self) -> None:
+        """A changed prefix must not reuse the old profile."""
+        df = pd.DataFrame({'n': range(50)})
+        self.rag.build_rag_index(df)
+        edited = pd.concat([df.assign(n=df['n'] + 1), pd.DataFrame({'n': [7]})],
+                           ignore_index=True)
+        with patch('rag_engine.Profile.from_frame',
+                   wraps=self.rag.Profile.from_frame) as from_frame:
+            self.rag.build_rag_index(edited)
+        self.assertEqual(len(from_frame.call_args.args[0]), 51)
+
+    def test_matching_rows_join_context(self) -> None:
+        """A ready row index adds its best rows as one ranked chunk."""
+        from row_index import RowIndex
+        rows = MagicMock(spec=RowIndex)
+        rows.search.return_value = [('customerID=7590-VHVEG', 2.0)]
+        h = self.rag.build_rag_index(pd.DataFrame({'alpha': [1, 2]}))
+        with patch('rag_engine.get_row_index', return_value=rows) as get_rows:
+            chunks = self.rag.retrieve_chunks('customer 7590-VHVEG', n=2, index_id=h)
+        get_rows.assert_called_once_with(h)
+        self.assertEqual(chunks[0], 'Matching rows:\ncustomerID=7590-VHVEG')
+        self.assertEqual(len(chunks), 3)
+
+    def test_rows_embedded_without_chunk_cache(self) -> None:
+        """Row vectors should skip the shared chunk cache."""
+        import numpy as np
+        with patch('rag_engine.ROW_INDEX_ENABLED', True), \
+             patch('rag_engine.build_row_index') as build_rows:
+            self.rag.build_rag_index(pd.DataFrame({'alpha': [1, 2]}))
+        embed = build_rows.call_args.args[2]
+        self.rag.embed_cache.get_many.reset_mock()
+        self.rag.embed_cache.put_many.reset_mock()
+        vectors = embed(['alpha=1', 'alpha=2'])
+        self.assertEqual(vectors.shape, (2, 2))
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.rag.embed_cache.get_many.assert_not_called()
+        self.rag.embed_cache.put_many.assert_not_called()
+
+    def test_warm_rebuild_resubmits_row_index(self) -> None:
+        """Re-indexing a warm dataset should give a failed row build another go."""
+        df = pd.DataFrame({'alpha': [1, 2]})
+        with patch('rag_engine.ROW_INDEX_ENABLED', True), \
+             patch('rag_engine.build_row_index') as build_rows:
+            h = self.rag.build_rag_index(df)
+            self.rag.build_rag_index(df)
+        self.assertEqual(build_rows.call_count, 2)
+        self.assertEqual(build_rows.call_args.args[0], h)
+
+    def test_exact_column_name_breaks_vector_ties(self) -> None:
+        """When embeddings can't separate chunks, BM25 picks the named column."""
+        import numpy as np
+        df = pd.DataFrame({'alpha': [1, 2], 'TotalCharges': [3.0, 4.0]})
+        h = self.rag.build_rag_index(df)
+        with patch('rag_engine.embed_question',
+                   return_value=np.array([1.0, 0.0], dtype=np.float32)):
+            chunks = self.rag.retrieve_chunks('sum of total charges', n=1, index_id=h)
+        self.assertTrue(chunks[0].startswith('Column TotalCharges'))
+
+    def test_lru_bound(self) -> None:
+        """Only RAG_MAX_INDEXES indexes should stay warm."""
+        with patch('rag_engine.RAG_MAX_INDEXES', 2):
+            ids = [self.rag.build_rag_index(pd.DataFrame({'c': [i]}))
+                   for i in range(3)]
+        self.assertIsNone(self.rag.get_index(ids[0]))
+        self.assertIsNotNone(self.rag.get_index(ids[2]))
+        self.assertEqual(self.rag.retrieve_context('q', index_id=ids[0]),
+                         'No dataset loaded yet.')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+"""Tests for row_index.py — IVF search and row-index persistence."""
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+
+import row_index
+from row_index import IVFIndex
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32."""
+    return (m / np.linalg.norm(m, axis=1, keepdims=True)).astype(np.float32)
+
+
+class TestIVFIndex(unittest.TestCase):
+    """Approximate nearest-neighbour search over the IVF lists."""
+
+    def test_recall_against_brute_force(self) -> None:
+        """Recall@10 should stay above 85% of exact search."""
+        rng = np.random.default_rng(0)
+        centers = _unit(rng.normal(size=(40, 32)))
+        vectors = _unit(centers[rng.integers(0, 40, 20_000)]
+                        + rng.normal(scale=0.3, size=(20_000, 32)))
+        ivf = IVFIndex.build(vectors)
+        self.assertEqual(ivf.offsets[-1], len(vectors))
+        hits = 0
+        for q in vectors[rng.integers(0, len(vectors), 50)]:
+            truth = set(np.argsort(-(vectors @ q))[:10])
+            ids, scores = ivf.search(q, 10, nprobe=16)
+            hits += len(truth & set(ids))
+            self.assertTrue(np.all(np.diff(scores) <= 0))
+        self.assertGreater(hits / 500, 0.85)
+
+    def test_tiny_index(self) -> None:
+        """An index smaller than nprobe should still find exact matches."""
+        vectors = _unit(np.eye(3) + 0.01)
+        ids, _ = IVFIndex.build(vectors).search(vectors[1], 1)
+        self.assertEqual(ids.tolist(), [1])
+
+
+class TestRowIndex(unittest.TestCase):
+    """Building, loading and looking up per-dataset row indexes."""
+
+    def setUp(self) -> None:
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(patch.object(row_index, 'ROW_INDEX_DIR', tmp))
+        self.enterContext(patch.object(row_index, '_rows', OrderedDict()))
+        self.enterContext(patch.object(row_index, '_failed', OrderedDict()))
+        self.df = pd.DataFrame({
+            'customerID': ['7590-VHVEG', '5575-GNVDE', '3668-QPYBK'],
+            'tenure': [1, 34, None],
+        })
+
+    @staticmethod
+    def embed(texts: list[str]) -> np.ndarray:
+        """Deterministic unit vectors standing in for the embedding model."""
+        rng = np.random.default_rng(len(texts))
+        return _unit(rng.normal(size=(len(texts), 8)))
+
+    def test_row_texts_skip_missing(self) -> None:
+        """Row texts should omit missing values."""
+        self.assertEqual(row_index.row_texts(self.df),
+                         ['customerID=7590-VHVEG, tenure=1.0',
+                          'customerID=5575-GNVDE, tenure=34.0',
+                          'customerID=3668-QPYBK'])
+
+    def test_build_search_and_reload(self) -> None:
+        """A built index should be searchable and reload from disk unembedded."""
+        vectors = self.embed(row_index.row_texts(self.df))
+        row_index.build_row_index('abc', self.df, self.embed).result()
+        matches = row_index.get_row_index('abc').search(vectors[2], 1)
+        self.assertEqual(matches[0][0], 'customerID=3668-QPYBK')
+
+        row_index._rows.clear()
+        embed = Mock(side_effect=self.embed)
+        row_index.build_row_index('abc', self.df, embed).result()
+        embed.assert_not_called()   # Loaded from disk
+        self.assertEqual(len(row_index.get_row_index('abc').texts), 3)
+
+    def test_failed_build_logged_and_retried(self) -> None:
+        """A failed build should be logged and resubmitted later."""
+        embed = Mock(side_effect=[RuntimeError('server down'),
+                                  self.embed(row_index.row_texts(self.df))])
+        with self.assertLogs('row_index', 'ERROR') as logs:
+            row_index.build_row_index('f', self.df, embed).result()
+        self.assertIn('server down', logs.output[0])
+        self.assertIsNone(row_index.get_row_index('f'))   # Still cooling down
+        with patch.object(row_index, 'ROW_INDEX_RETRY_SECONDS', 0):
+            self.assertIsNone(row_index.get_row_index('f'))   # Resubmits
+        row_index._POOL.submit(lambda: None).result()         # Wait for it
+        self.assertEqual(len(row_index.get_row_index('f').texts), 3)
+        self.assertEqual(embed.call_count, 2)
+
+    def test_not_ready_until_built(self) -> None:
+        """Unknown or empty datasets should have no row index."""
+        self.assertIsNone(row_index.get_row_index('missing'))
+        self.assertIsNone(row_index.build_row_index('e', self.df.iloc[:0], self.embed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Tests for shm_store.py — dataframes shared through shared memory."""
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import shm_store
+
+
+class TestSharedFrames(unittest.TestCase):
+    """Publishing frames once and attaching to them from a reader."""
+
+    def tearDown(self) -> None:
+        shm_store.release_all()
+
+    def _roundtrip(self, df: pd.DataFrame, key: str = 't1') -> pd.DataFrame:
+        """Publish df and attach to it again, closing the segment afterwards."""
+        manifest = shm_store.publish(key, df)
+        out, shm = shm_store.attach(manifest)
+        self.addCleanup(shm.close)
+        return out
+
+    def test_roundtrip_dtypes(self) -> None:
+        """Every supported dtype should round-trip unchanged."""
+        df = pd.DataFrame({
+            'i': np.arange(5, dtype=np.int16),
+            'f': [1.5, np.nan, 3.0, 4.0, 5.0],
+            'b': [True, False, True, True, False],
+            'd': pd.date_range('2024-01-01', periods=5),
+            's': ['x', 'y', None, 'x', 'z'],
+            'c': pd.Categorical(['a', 'b', 'a', 'b', 'a']),
+        })
+        out = self._roundtrip(df)
+        pd.testing.assert_frame_equal(out, df)
+
+    def test_index_preserved(self) -> None:
+        """A non-range index should round-trip."""
+        df = pd.DataFrame({'a': [1, 2, 3]}, index=['r1', 'r2', 'r3'])
+        pd.testing.assert_frame_equal(self._roundtrip(df), df)
+
+    def test_numeric_columns_are_read_only_views(self) -> None:
+        """Numeric columns should be read-only views of the segment."""
+        df = pd.DataFrame({'a': np.arange(1000, dtype=np.float64)})
+        manifest = shm_store.publish('t2', df)
+        out, shm = shm_store.attach(manifest)
+        values = out['a'].to_numpy()
+        self.assertFalse(values.flags.writeable)
+        self.assertTrue(np.shares_memory(values, np.frombuffer(shm.buf, dtype=np.uint8)))
+        del out, values
+        shm.close()
+
+    def test_publish_once_per_key(self) -> None:
+        """Publishing the same key again should reuse the segment."""
+        df = pd.DataFrame({'a': [1, 2]})
+        first = shm_store.publish('t3', df)
+        self.assertIs(shm_store.publish('t3', df), first)
+
+    def test_least_recently_used_released(self) -> None:
+        """Segments past SHM_MAX_DATASETS should be unlinked."""
+        df = pd.DataFrame({'a': [1, 2]})
+        with patch.object(shm_store, 'SHM_MAX_DATASETS', 1):
+            old = shm_store.publish('t4', df)
+            shm_store.publish('t5', df)
+        self.assertEqual(list(shm_store._segments), ['t5'])
+        with self.assertRaises(FileNotFoundError):
+            shm_store.attach(old)
+
+    def test_no_space_raises(self) -> None:
+        """A dataset too big for /dev/shm should raise OSError."""
+        with patch.object(shm_store, '_fits', return_value=False):
+            with self.assertRaises(OSError):
+                shm_store.publish('t6', pd.DataFrame({'a': [1]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
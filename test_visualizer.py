@@ -0,0 +1,50 @@
+"""Tests for visualizer.py — chart choice for query results."""
+import unittest
+
+import pandas as pd
+
+from profiler import Profile
+from visualizer import auto_chart
+
+
+class TestAutoChart(unittest.TestCase):
+    """Chart types picked by auto_chart."""
+
+    def setUp(self) -> None:
+        self.df = pd.DataFrame({'tenure': [0, 12, 24, 72], 'plan': list('abab')})
+        self.profile = Profile.from_frame(self.df, '')
+
+    def test_scalar_gauge_uses_column_range(self) -> None:
+        """A scalar about a known column should get a gauge over its range."""
+        fig = auto_chart('What is the average tenure?', 27.0, self.df, self.profile)
+        indicator = fig.data[0]
+        self.assertEqual(indicator.mode, 'number+gauge')
+        self.assertEqual(tuple(indicator.gauge.axis.range), (0, 72))
+
+    def test_scalar_without_matching_column(self) -> None:
+        """A scalar not about any column should be a plain number."""
+        fig = auto_chart('How many customers?', 4, self.df, self.profile)
+        self.assertEqual(fig.data[0].mode, 'number')
+
+    def test_short_column_name_must_be_whole_word(self) -> None:
+        """A column named "a" should not match every question with an a."""
+        df = pd.DataFrame({'a': [0, 100], 'id': [1, 50]})
+        profile = Profile.from_frame(df, '')
+        fig = auto_chart('What is the average paid amount?', 40, df, profile)
+        self.assertEqual(fig.data[0].mode, 'number')
+        fig = auto_chart('What is the mean of a?', 40, df, profile)
+        self.assertEqual(fig.data[0].mode, 'number+gauge')
+
+    def test_scalar_without_profile(self) -> None:
+        """Without a profile a scalar should be a plain number."""
+        fig = auto_chart('What is the average tenure?', 27.0, self.df)
+        self.assertEqual(fig.data[0].mode, 'number')
+
+    def test_series_bar(self) -> None:
+        """A value-count series should be drawn as bars."""
+        fig = auto_chart('plans', self.df['plan'].value_counts(), self.df, self.profile)
+        self.assertEqual(fig.data[0].type, 'bar')
+
+
+if __name__ == '__main__':
+    unittest.main()
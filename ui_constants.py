@@ -12,6 +12,7 @@ LAYOUT_RATIO = [1.8, 5.4, 2.8]
 SESSION_DEFAULTS = {
     "df":             None,
     "rag_indexed":    False,
+    "rag_index_id":   None,
     "auto_insights":  [],
     "chat_history":   [],
     "current_chart":  None,
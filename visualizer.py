@@ -1,13 +1,17 @@
 # visualizer.py — auto-chart generation from query results
+import re
+
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
 
-def auto_chart(question: str, result, df: pd.DataFrame):
+def auto_chart(question: str, result, df: pd.DataFrame, profile=None):
     """Generate a Plotly figure from a query result.
     
     Accepts result as: pd.Series, pd.DataFrame, scalar, or None.
+    profile (the dataset's profiler.Profile, if known) lets scalars be
+    shown against the range of the column they came from.
     Returns a plotly Figure or None.
     """
     if result is None:
@@ -73,11 +77,21 @@ def auto_chart(question: str, result, df: pd.DataFrame):
 
         # ── Scalar result → indicator card ───────────────────
         if isinstance(result, (int, float)):
-            fig = go.Figure(go.Indicator(
-                mode="number",
-                value=result,
-                title={"text": question[:60]},
-            ))
+            col = _scalar_column(q, result, profile)
+            if col is not None:
+                fig = go.Figure(go.Indicator(
+                    mode="number+gauge",
+                    value=result,
+                    title={"text": question[:60]},
+                    gauge={"axis": {"range": [col.min, col.max]},
+                           "bar": {"color": "#6366f1"}},
+                ))
+            else:
+                fig = go.Figure(go.Indicator(
+                    mode="number",
+                    value=result,
+                    title={"text": question[:60]},
+                ))
             _style(fig, height=250)
             return fig
 
@@ -88,6 +102,22 @@ def auto_chart(question: str, result, df: pd.DataFrame):
         return None
 
 
+def _scalar_column(q: str, value, profile):
+    """Numeric column named in the question whose range contains value.
+
+    The name must appear as a whole word, so short names like "a" or
+    "id" don't match every question that happens to contain them.
+    """
+    if profile is None:
+        return None
+    for col in profile.columns.values():
+        if (col.numeric and col.count and col.min < col.max
+                and re.search(rf"(?<!\w){re.escape(col.name.lower())}(?!\w)", q)
+                and col.min <= value <= col.max):
+            return col
+    return None
+
+
 def _style(fig, height: int = 380):
     """Apply dark-mode chart styling."""
     fig.update_layout(